@@ -0,0 +1,94 @@
+#Benchmark of automatic employee assignment under parallel booking requests
+#run from the src folder against a seeded database (Postgres, so that row locks are real):
+#   python -m benchmarks.assign_employees --threads 16 --requests 400
+#it creates bookings with POST /bookings/?assign=true on one day, reports the throughput,
+#checks that no employee was booked twice at the same time, then deletes the bookings it created again
+#SQLite has no row locks, so there parallel requests can still book an employee twice
+import argparse
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from main import create_app
+from init import db
+from models.booking import Booking
+from models.pet import Pet
+from models.service import Service
+from utils.rollups import delete_bookings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Parallel booking requests with automatic employee assignment')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--service-id', type=int, default=4)
+    parser.add_argument('--days-ahead', type=int, default=90)
+    parser.add_argument('--email', default='admin@dogspa.com')
+    parser.add_argument('--password', default='Admin123!')
+    return parser.parse_args()
+
+#every (pet, start time) pair is used once, so the bookings never break the unique constraint
+def booking_payloads(pet_ids, booking_date, service_id, count):
+    times = [f'{hour:02d}:{minute:02d}' for hour in range(10, 19) for minute in (0, 30)]
+    payloads = []
+    for i in range(count):
+        pet_id = pet_ids[i % len(pet_ids)]
+        booking_time = times[(i // len(pet_ids)) % len(times)]
+        payloads.append({'pet_id': pet_id, 'service_id': service_id, 'date': booking_date.isoformat(), 'time': booking_time})
+    return payloads
+
+#employees with two bookings that overlap on the day
+def double_booked(booking_date):
+    stmt = db.select(Booking.employee_id, Booking.time, Service.duration).join(Service).where(
+        Booking.date == booking_date, Booking.employee_id.isnot(None))
+    intervals = defaultdict(list)
+    for employee_id, start, duration in db.session.execute(stmt):
+        minutes = start.hour * 60 + start.minute
+        intervals[employee_id].append((minutes, minutes + round(duration * 60)))
+
+    employees = set()
+    for employee_id, busy in intervals.items():
+        busy.sort()
+        for previous, current in zip(busy, busy[1:]):
+            if current[0] < previous[1]:
+                employees.add(employee_id)
+    return employees
+
+def main():
+    args = parse_args()
+    app = create_app()
+    booking_date = date.today() + timedelta(days=args.days_ahead)
+
+    with app.app_context():
+        pet_ids = db.session.scalars(db.select(Pet.id).order_by(Pet.id)).all()
+    payloads = booking_payloads(pet_ids, booking_date, args.service_id, args.requests)
+
+    client = app.test_client()
+    login = client.post('/auth/login/', json={'email': args.email, 'password': args.password})
+    headers = {'Authorization': f"Bearer {login.json['token']}"}
+
+    def send(payload):
+        started = time.perf_counter()
+        response = app.test_client().post('/bookings/?assign=true', json=payload, headers=headers)
+        booking_id = response.json.get('id') if response.status_code == 200 else None
+        return response.status_code, time.perf_counter() - started, booking_id
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(send, payloads))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency, _ in results)
+    print(f'{len(results)} requests with {args.threads} threads in {elapsed:.2f}s: {len(results) / elapsed:.1f} requests/s')
+    print(f'p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms')
+    print('status codes:', dict(Counter(status for status, _, _ in results)))
+    created = [booking_id for _, _, booking_id in results if booking_id is not None]
+
+    with app.app_context():
+        print('double-booked employees:', sorted(double_booked(booking_date)) or 'none')
+
+        #remove the bookings the benchmark created, the seeded bookings on the same day stay
+        delete_bookings(db.session, created)
+
+if __name__ == '__main__':
+    main()
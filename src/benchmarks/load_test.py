@@ -0,0 +1,250 @@
+#End-to-end load test of the API
+#run from the src folder against a seeded database, e.g. after 'flask db seed --clients 10000 --pets-per-client 2 --bookings 100000':
+#   python -m benchmarks.load_test --clients 32 --duration 30 --output report.json
+#it serves create_app() on a local port, replays a weighted mix of requests from concurrent clients over HTTP,
+#then writes a JSON report with requests/s, p50/p95/p99 latency and SQL queries per request for each endpoint
+#the query counts come from the Server-Timing header
+#two reports (e.g. of two versions of the code) can be compared with any JSON diff
+#the bookings the test creates are deleted at the end
+import argparse
+import http.client
+import json
+import logging
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from werkzeug.serving import make_server
+from main import create_app
+from init import db
+from models.pet import Pet
+from models.service import Service
+from models.user import User
+from utils.rollups import delete_bookings
+
+#default weight of each kind of request in the mix
+DEFAULT_MIX = 'login=1,list_bookings=5,create_booking=2,update_booking=2,search_booking=3'
+#password of the clients made by 'flask db seed --clients'
+CLIENT_PASSWORD = 'Seed123!'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Concurrent mixed traffic against the API, with a JSON report')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of traffic')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weights of the kinds of request, e.g. ' + DEFAULT_MIX)
+    parser.add_argument('--email', default='admin@dogspa.com', help='employee the clients act as')
+    parser.add_argument('--password', default='Admin123!')
+    parser.add_argument('--random-seed', type=int)
+    parser.add_argument('--output', help='file for the JSON report, standard output if not given')
+    return parser.parse_args()
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(','):
+        name, weight = item.split('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown request kind '{name}', the kinds are {', '.join(SCENARIOS)}")
+        weights[name] = float(weight)
+    return weights
+
+#query count from the Server-Timing header, e.g. 'db;dur=1.02;desc="3 queries", ...'
+def query_count(server_timing):
+    match = re.search(r'(?:^|, )db;[^,]*desc="(\d+) queries"', server_timing or '')
+    return int(match.group(1)) if match else 0
+
+#ids, phones and emails the requests are made with
+def load_fixtures():
+    client_emails = db.session.scalars(db.select(User.personal_email).where(User.personal_email.like('%@example.com')).limit(1000)).all()
+    phones = db.session.scalars(db.select(User.phone).where(User.type_id == 1).limit(1000)).all()
+    pet_ids = db.session.scalars(db.select(Pet.id).limit(10000)).all()
+    service_ids = db.session.scalars(db.select(Service.id)).all()
+    if not (phones and pet_ids and service_ids):
+        raise SystemExit('The database has no clients, pets or services, seed it first with flask db seed')
+    return {'client_emails': client_emails, 'phones': phones, 'pet_ids': pet_ids, 'service_ids': service_ids}
+
+
+class Client:
+    def __init__(self, port, token, fixtures, rng, created):
+        self.port = port
+        self.headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        self.fixtures = fixtures
+        self.rng = rng
+        self.created = created
+
+    #one HTTP request, returns the status, the parsed body and the query count
+    def request(self, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            connection.request(method, path, json.dumps(body) if body is not None else None, headers or self.headers)
+            response = connection.getresponse()
+            data = response.read()
+            queries = query_count(response.getheader('Server-Timing'))
+            try:
+                payload = json.loads(data) if data else None
+            except ValueError:
+                payload = None
+            return response.status, payload, queries
+        finally:
+            connection.close()
+
+    def login(self):
+        #generated clients if there are any, the employee otherwise
+        emails = self.fixtures['client_emails']
+        if emails:
+            body = {'email': self.rng.choice(emails), 'password': CLIENT_PASSWORD}
+        else:
+            body = self.fixtures['employee_login']
+        return 'POST /auth/login/', self.request('POST', '/auth/login/', body, {'Content-Type': 'application/json'})
+
+    def list_bookings(self):
+        return 'GET /bookings/', self.request('GET', '/bookings/')
+
+    #bookings far ahead, so they do not collide with the seeded ones
+    def create_booking(self):
+        booking_date = date.today() + timedelta(days=self.rng.randint(500, 3000))
+        body = {
+            'pet_id': self.rng.choice(self.fixtures['pet_ids']),
+            'service_id': self.rng.choice(self.fixtures['service_ids']),
+            'date': booking_date.isoformat(),
+            'time': f'{self.rng.randint(10, 19):02d}:{self.rng.choice([0, 30]):02d}'
+        }
+        result = self.request('POST', '/bookings/', body)
+        status, payload, _ = result
+        #the route answers 200 with the new booking
+        if status < 300 and payload and 'id' in payload:
+            self.created.append(payload['id'])
+        return 'POST /bookings/', result
+
+    #updates only touch bookings the test created
+    def update_booking(self):
+        if not self.created:
+            return self.create_booking()
+        booking_id = self.rng.choice(self.created)
+        body = {'status': self.rng.choice(['Pending', 'In-progress'])}
+        return 'PATCH /bookings/<booking_id>/', self.request('PATCH', f'/bookings/{booking_id}/', body)
+
+    def search_booking(self):
+        return 'GET /bookings/search/', self.request('GET', f"/bookings/search/?phone={self.rng.choice(self.fixtures['phones'])}")
+
+SCENARIOS = {
+    'login': Client.login,
+    'list_bookings': Client.list_bookings,
+    'create_booking': Client.create_booking,
+    'update_booking': Client.update_booking,
+    'search_booking': Client.search_booking
+}
+
+def percentile(values, fraction):
+    return values[max(0, int(len(values) * fraction + 0.5) - 1)]
+
+def summarize(results, elapsed):
+    endpoints = {}
+    by_endpoint = defaultdict(list)
+    for endpoint, status, latency, queries in results:
+        by_endpoint[endpoint].append((status, latency, queries))
+
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies = sorted(latency for _, latency, _ in rows)
+        queries = [count for _, _, count in rows]
+        endpoints[endpoint] = {
+            'requests': len(rows),
+            'requests_per_second': round(len(rows) / elapsed, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.5) * 1000, 1),
+                'p95': round(percentile(latencies, 0.95) * 1000, 1),
+                'p99': round(percentile(latencies, 0.99) * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1)
+            },
+            'queries_per_request': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+            'status_codes': dict(sorted(Counter(str(status) for status, _, _ in rows).items()))
+        }
+    return endpoints
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    args = parse_args()
+    weights = parse_mix(args.mix)
+    app = create_app()
+
+    app.config['SERVER_TIMING'] = True
+
+    with app.app_context():
+        fixtures = load_fixtures()
+    fixtures['employee_login'] = {'email': args.email, 'password': args.password}
+
+    #a threaded server on a free port
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    seed_rng = random.Random(args.random_seed)
+    created = []
+    login_client = Client(port, None, fixtures, seed_rng, created)
+    status, payload, _ = login_client.request('POST', '/auth/login/', fixtures['employee_login'], {'Content-Type': 'application/json'})
+    if status != 200:
+        raise SystemExit(f'Cannot log in as {args.email}: {status} {payload}')
+
+    results = []
+    deadline = time.perf_counter() + args.duration
+    names = list(weights)
+
+    def run_client(rng):
+        client = Client(port, payload['token'], fixtures, rng, created)
+        own_results = []
+        while time.perf_counter() < deadline:
+            scenario = SCENARIOS[rng.choices(names, [weights[name] for name in names])[0]]
+            started = time.perf_counter()
+            endpoint, (status, _, queries) = scenario(client)
+            own_results.append((endpoint, status, time.perf_counter() - started, queries))
+        results.extend(own_results)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run_client, args=(random.Random(seed_rng.random()),)) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    report = {
+        'revision': git_revision(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0],
+        'clients': args.clients,
+        'duration_s': round(elapsed, 1),
+        'mix': weights,
+        'requests': len(results),
+        'requests_per_second': round(len(results) / elapsed, 1),
+        'errors': sum(1 for _, status, _, _ in results if status >= 500),
+        'endpoints': summarize(results, elapsed)
+    }
+
+    with app.app_context():
+        delete_bookings(db.session, created)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    #a short summary for the terminal
+    for endpoint, stats in report['endpoints'].items():
+        latency = stats['latency_ms']
+        print(f"{endpoint:32} {stats['requests_per_second']:8.1f} req/s  p50 {latency['p50']:7.1f}ms  p95 {latency['p95']:7.1f}ms  "
+              f"p99 {latency['p99']:7.1f}ms  {stats['queries_per_request']['mean']:5.2f} queries", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
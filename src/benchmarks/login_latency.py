@@ -0,0 +1,50 @@
+#Benchmark of POST /auth/login/ under concurrent logins
+#run from the src folder against a seeded database, once with the passwords checked in the request threads
+#and once with the bcrypt process pool, e.g.:
+#   BCRYPT_WORKERS=0 python -m benchmarks.login_latency --threads 32 --requests 320
+#   BCRYPT_WORKERS=4 python -m benchmarks.login_latency --threads 32 --requests 320
+#503 responses are logins turned away because the password queue was full (BCRYPT_MAX_PENDING)
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from main import create_app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Concurrent logins, with the latency of each')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=320)
+    parser.add_argument('--email', default='admin@dogspa.com')
+    parser.add_argument('--password', default='Admin123!')
+    return parser.parse_args()
+
+def percentile(latencies, fraction):
+    return latencies[max(0, int(len(latencies) * fraction) - 1)]
+
+def main():
+    args = parse_args()
+    app = create_app()
+    payload = {'email': args.email, 'password': args.password}
+
+    def send(_):
+        started = time.perf_counter()
+        response = app.test_client().post('/auth/login/', json=payload)
+        return response.status_code, time.perf_counter() - started
+
+    #one login first, so a rehash to the configured work factor and the pool start-up are not measured
+    send(None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(send, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    print(f"bcrypt work factor {app.config['BCRYPT_LOG_ROUNDS']}, {app.config['BCRYPT_WORKERS']} bcrypt processes")
+    print(f'{len(results)} logins with {args.threads} threads in {elapsed:.2f}s: {len(results) / elapsed:.1f} logins/s')
+    print(f'p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p95 {percentile(latencies, 0.95) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms')
+    print('status codes:', dict(Counter(status for status, _ in results)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#Benchmark of the read-only routes with ORM objects (CORE_READS=false) and with read models built from result rows
+#run from the src folder against a seeded database, e.g. after 'flask db seed --clients 10000 --pets-per-client 2 --bookings 100000':
+#   python -m benchmarks.read_models --requests 50 --limit 1000
+#each route is requested the same way both ways, the responses are checked to be the same,
+#and the report gives the median latency and the peak memory allocated by one request (tracemalloc)
+import argparse
+import statistics
+import time
+import tracemalloc
+from main import create_app
+from init import db
+from models.employee import Employee
+from models.user import User
+from controllers.auth_controller import create_user_token
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Read-only routes with ORM objects and with read models')
+    parser.add_argument('--requests', type=int, default=50, help='requests of each route each way')
+    parser.add_argument('--limit', type=int, default=1000, help='page size of the list routes')
+    return parser.parse_args()
+
+#an admin's token, and the phone of the client with the most bookings on the first page
+def fixtures(app):
+    with app.app_context():
+        admin = db.session.scalar(db.select(User).join(Employee, Employee.id == User.id).where(Employee.is_admin == True))
+        phone = db.session.scalar(db.select(User.phone).where(User.type_id == 1).order_by(User.id))
+        if admin is None or phone is None:
+            raise SystemExit('The database has no admin or client, seed it first with flask db seed')
+        return {'Authorization': 'Bearer ' + create_user_token(admin, True)}, phone
+
+#median seconds of a request, peak bytes allocated while handling one, and the last body
+def measure(client, path, headers, requests):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit(f'{path} answered {response.status_code}')
+
+    tracemalloc.start()
+    body = client.get(path, headers=headers).data
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(latencies), peak, body
+
+def main():
+    args = parse_args()
+    app = create_app()
+    app.config['SERVER_TIMING'] = False
+    headers, phone = fixtures(app)
+    client = app.test_client()
+    paths = [f'/bookings/?limit={args.limit}', f'/bookings/pending/?limit={args.limit}', f'/pets/?limit={args.limit}',
+             f'/bookings/search/?phone={phone}']
+
+    print(f"{'route':40} {'ORM ms':>9} {'rows ms':>9} {'speed-up':>9} {'ORM MB':>8} {'rows MB':>8}")
+    for path in paths:
+        results = {}
+        for core_reads in (False, True):
+            app.config['CORE_READS'] = core_reads
+            #one request first, so the first read of the catalog cache and the token version is not measured
+            client.get(path, headers=headers)
+            results[core_reads] = measure(client, path, headers, args.requests)
+        (orm_latency, orm_peak, orm_body), (core_latency, core_peak, core_body) = results[False], results[True]
+        if orm_body != core_body:
+            raise SystemExit(f'{path} answered differently with read models')
+        print(f'{path:40} {orm_latency * 1000:9.1f} {core_latency * 1000:9.1f} {orm_latency / core_latency:8.1f}x '
+              f'{orm_peak / 2 ** 20:8.1f} {core_peak / 2 ** 20:8.1f}')
+
+if __name__ == '__main__':
+    main()
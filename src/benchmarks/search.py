@@ -0,0 +1,53 @@
+#Benchmark of the name search of /clients/search/?q= and /pets/search/?q=
+#run from the src folder against a seeded database, e.g. after 'flask db seed --clients 1000000 --pets-per-client 1':
+#   python -m benchmarks.search --requests 50 Ol Olivia 'olivia sm' Bel
+#the search index is the FTS5 tables on SQLite and the trigram indexes on Postgres (flask db migrate builds them)
+#the report gives the rows each query matches and the median latency of the first page and of its SQL alone
+import argparse
+import statistics
+import time
+from main import create_app
+from init import db
+from models.user import User
+from models.pet import Pet
+from utils.search import name_matches
+from benchmarks.read_models import fixtures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Latency of the client and pet name search')
+    parser.add_argument('queries', nargs='*', default=['Ol', 'Olivia', 'olivia sm', 'Bel', 'Bella'], help='search queries')
+    parser.add_argument('--requests', type=int, default=50, help='requests of each query')
+    parser.add_argument('--limit', type=int, default=100, help='page size')
+    return parser.parse_args()
+
+def median_ms(function, requests):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+def main():
+    args = parse_args()
+    app = create_app()
+    app.config['SERVER_TIMING'] = False
+    headers, _ = fixtures(app)
+    client = app.test_client()
+
+    print(f"{'route':16} {'query':16} {'matches':>9} {'page ms':>9} {'SQL ms':>9}")
+    for route, model, criteria in (('/clients/search/', User, [User.type_id == 1]), ('/pets/search/', Pet, [])):
+        for query in args.queries:
+            path = f'{route}?q={query}&limit={args.limit}&fields=id'
+            with app.test_request_context(path):
+                matches, order_by = name_matches(model, query, *criteria)
+                count = db.session.scalar(db.select(db.func.count()).select_from(matches.subquery()))
+                page = matches.order_by(*order_by).limit(args.limit + 1)
+                sql_ms = median_ms(lambda: db.session.execute(page).all(), args.requests)
+            #the If-None-Match of the ETag is not sent, so every request is answered in full
+            page_ms = median_ms(lambda: client.get(path, headers=headers), args.requests)
+            print(f'{route:16} {query:16} {count:9} {page_ms:9.1f} {sql_ms:9.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#Micro-benchmark of dumping bookings to JSON, marshmallow and the json module against the compiled serializer and orjson
+#run from the src folder, no database is needed:
+#   python -m benchmarks.serializers --bookings 10000 --repeat 5
+#the bookings are built in memory with their pet, client, user, service and employee, as a list route loads them
+import argparse
+import json
+import random
+import time
+from datetime import date, time as time_of_day, timedelta
+from main import create_app
+from models.booking import Booking, BookingSchema
+from models.client import Client
+from models.employee import Employee
+from models.pet import Pet
+from models.pet_type import PetType
+from models.service import Service
+from models.size import Size
+from models.user import User
+from models.user_type import UserType
+from utils.serializers import dump
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Time of dumping bookings to JSON')
+    parser.add_argument('--bookings', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each way, the fastest is reported')
+    parser.add_argument('--random-seed', type=int, default=1)
+    return parser.parse_args()
+
+#a pet for every ten bookings, and ten employees
+def make_bookings(rng, count):
+    client_type = UserType(id=1, name='Client')
+    employee_type = UserType(id=2, name='Employee')
+    pet_types = [PetType(id=1, name='Dog'), PetType(id=2, name='Cat')]
+    sizes = [Size(id=1, name='Small', weight='0-10kg'), Size(id=2, name='Medium', weight='10-25kg')]
+    services = [Service(id=1, name='Full Groom', duration=2, price=150), Service(id=2, name='Nails Only', duration=0.5, price=30)]
+    employees = []
+    for id in range(1, 11):
+        user = User(id=id, f_name=f'Employee{id}', l_name='Staff', phone=f'{id:06d}', type=employee_type)
+        employees.append(Employee(id=id, email=f'employee{id}@dogspa.com', is_admin=False, user=user))
+    pets = []
+    for id in range(1, count // 10 + 2):
+        user = User(id=100 + id, f_name=f'Client{id}', l_name='Owner', phone=f'{100000 + id}', personal_email=f'client{id}@example.com', type=client_type)
+        client = Client(id=100 + id, user=user)
+        pets.append(Pet(id=id, name=f'Pet{id}', breed='Poodle', year=2020, type=rng.choice(pet_types), size=rng.choice(sizes), client=client,
+                        type_id=1, size_id=1, client_id=client.id))
+
+    bookings = []
+    today = date.today()
+    for id in range(1, count + 1):
+        pet = rng.choice(pets)
+        service = rng.choice(services)
+        employee = rng.choice(employees + [None])
+        bookings.append(Booking(id=id, pet=pet, pet_id=pet.id, service=service, service_id=service.id, employee=employee,
+                                employee_id=employee and employee.id, date=today + timedelta(days=rng.randint(0, 90)),
+                                time=time_of_day(rng.randint(10, 19), rng.choice([0, 30])), status='Pending', date_created=today))
+    return bookings
+
+#fastest of several runs, in seconds, and the last result
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    args = parse_args()
+    app = create_app()
+    bookings = make_bookings(random.Random(args.random_seed), args.bookings)
+    schema = BookingSchema(many=True)
+
+    with app.app_context():
+        timings = {}
+        timings['marshmallow dump'], dumped = best_time(lambda: schema.dump(bookings), args.repeat)
+        timings['compiled dump'], compiled = best_time(lambda: dump(schema, bookings), args.repeat)
+        if compiled != dumped or json.dumps(compiled) != json.dumps(dumped):
+            raise SystemExit('The compiled serializer gave another result than marshmallow')
+
+        compact = {'separators': (',', ':')}
+        timings['json module encode'], _ = best_time(lambda: json.dumps(dumped, **compact), args.repeat)
+        timings['orjson encode'], _ = best_time(lambda: app.json.dumps(dumped, **compact), args.repeat)
+        timings['marshmallow dump + json module'] = timings['marshmallow dump'] + timings['json module encode']
+        timings['compiled dump + orjson'] = timings['compiled dump'] + timings['orjson encode']
+
+    print(f'{args.bookings} bookings, fastest of {args.repeat} runs, the same output both ways')
+    for name, seconds in timings.items():
+        print(f'{name:32} {seconds * 1000:9.1f}ms')
+    print(f"dump speed-up {timings['marshmallow dump'] / timings['compiled dump']:.1f}x, "
+          f"encode speed-up {timings['json module encode'] / timings['orjson encode']:.1f}x, "
+          f"total speed-up {timings['marshmallow dump + json module'] / timings['compiled dump + orjson']:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, abort
-from init import db, bcrypt
+from init import db, jwt
 from sqlalchemy.exc import IntegrityError
 from models.employee import Employee
 from models.user import User, UserSchema
@@ -8,10 +8,42 @@ from models.booking import Booking
 from models.pet import Pet
 from datetime import timedelta
 from marshmallow import EXCLUDE
-from flask_jwt_extended import create_access_token, get_jwt_identity
+from flask_jwt_extended import create_access_token, get_jwt_identity, get_jwt
+from utils.token_versions import current_token_version
+from utils.passwords import hash_password, check_password, needs_rehash
+from utils.serializers import dump
 
 auth_bp = Blueprint('auth', __name__, url_prefix = '/auth')
 
+#user type and admin flag are stored in the token, so authorization does not need the database
+def create_user_token(user, is_admin):
+    claims = {
+        'type_id': user.type_id,
+        'is_admin': is_admin,
+        'ver': user.token_version or 0
+    }
+    return create_access_token(identity=user.id, additional_claims=claims, expires_delta=timedelta(days=1))
+
+#a token is revoked when the user's token version has changed since it was issued
+@jwt.token_in_blocklist_loader
+def check_token_version(jwt_header, jwt_payload):
+    version = current_token_version(jwt_payload['sub'])
+    return version is None or jwt_payload.get('ver') != version
+
+#check the user type from the token
+def is_employee():
+    return get_jwt().get('type_id') == 2
+
+#check the admin flag from the token
+def is_admin():
+    return get_jwt().get('is_admin') is True
+
+#replace a hash made with another work factor, while the password is at hand
+def upgrade_password_hash(record, password):
+    if needs_rehash(record.password):
+        record.password = hash_password(password)
+        db.session.commit()
+
 #route for online registration of a client
 @auth_bp.route('/register/', methods=['POST'])
 def auth_register_client():
@@ -40,7 +72,7 @@ def auth_register_client():
         #create a new client instance with the user.id from the new user
         new_client = Client(
             id = user.id,
-            password = bcrypt.generate_password_hash(data['password']).decode('utf8')
+            password = hash_password(data['password'])
         )
 
         #add the new client to the database and commit
@@ -48,7 +80,7 @@ def auth_register_client():
         db.session.commit()
 
         #respond to the user
-        return ClientSchema(exclude = ['pets', 'password']).dump(new_client), 201
+        return dump(ClientSchema(exclude = ['pets', 'password']), new_client), 201
 
     #catch IntegrityError when phone number already exists
     except IntegrityError:
@@ -67,9 +99,10 @@ def auth_login():
     employee = db.session.scalar(employee_stmt)
 
     #if the user or employee exists and password matches the hash
-    if employee and bcrypt.check_password_hash(employee.password, request.json['password']):
+    if employee and check_password(employee.password, request.json['password']):
+        upgrade_password_hash(employee, request.json['password'])
         # generate token
-        token = create_access_token(identity=employee.id, expires_delta=timedelta(days=1))
+        token = create_user_token(employee.user, employee.is_admin)
 
         return {'email': employee.email, 'token': token, 'is_admin': employee.is_admin}
     
@@ -77,9 +110,10 @@ def auth_login():
         client_stmt = db.select(Client).filter_by(id = user.id)
         client = db.session.scalar(client_stmt)
 
-        if bcrypt.check_password_hash(client.password, request.json['password']):
+        if check_password(client.password, request.json['password']):
+            upgrade_password_hash(client, request.json['password'])
             # generate token
-            token = create_access_token(identity=user.id, expires_delta=timedelta(days=1))
+            token = create_user_token(user, False)
             return {'email': user.personal_email, 'token': token, 'is_admin': 'false'}
         else:
             return {"error": "Invalid email or password"}, 401 #401 Unauthorized
@@ -88,27 +122,13 @@ def auth_login():
 
 
 def authorize_admin():
-    #extract the employee identity from the token
-    employee_id = get_jwt_identity() 
-
-    #retrieve the employee from the id
-    stmt = db.select(Employee).filter_by(id = employee_id)
-    employee = db.session.scalar(stmt)
-
-    #if the employee is not admin, abort with 401 error
-    if not employee or employee.is_admin is False:
+    #if the admin flag in the token is not set, abort with 401 error
+    if not is_admin():
         abort(401)
 
 def authorize_employee():
-    #extract the user identity from the token
-    user_id = get_jwt_identity()
-
-    #get the employee from the id
-    stmt = db.select(Employee).filter_by(id = user_id)
-    employee = db.session.scalar(stmt)
-
-    #if the employee with such id does not exist, abort with 401 error
-    if not employee:
+    #if the user type in the token is not employee, abort with 401 error
+    if not is_employee():
         abort(401)
 
 #this function is used when accessing and editing client's info
@@ -116,10 +136,6 @@ def authorize_employee_or_account_owner_search(args):
     #extract the user identity from the token
     user_id = get_jwt_identity()
 
-    #get user from the token (to access type_id later)
-    token_stmt = db.select(User).filter_by(id = user_id)
-    token_user = db.session.scalar(token_stmt)
-
     #get the user from the provided id
     stmt = db.select(User).where(db.and_(User.type_id == 1),(User.phone == args.get('phone')))
     user = db.session.scalar(stmt)
@@ -130,7 +146,7 @@ def authorize_employee_or_account_owner_search(args):
 
     #if the id from the token does not match looked up id,
     #or the user is not an employee, abort with 401 error
-    elif not user or (not user.id == user_id and not token_user.type_id == 2):
+    elif not user or (not user.id == user_id and not is_employee()):
         abort(401)
 
 #this function is used when accessing and editing client's info
@@ -138,10 +154,6 @@ def authorize_employee_or_account_owner_id(client_id):
     #extract the user identity from the token
     user_id = get_jwt_identity()
 
-    #get user from the token (to access type_id later)
-    token_stmt = db.select(User).filter_by(id = user_id)
-    token_user = db.session.scalar(token_stmt)
-
     #get the user from the provided id
     stmt = db.select(Client).filter_by(id = client_id)
     client = db.session.scalar(stmt)
@@ -152,7 +164,7 @@ def authorize_employee_or_account_owner_id(client_id):
 
     #if the id from the token does not match looked up id,
     #or the user is not an employee, abort with 401 error
-    elif not client or (not client.id == user_id and not token_user.type_id == 2):
+    elif not client or (not client.id == user_id and not is_employee()):
         abort(401)
     
 #this function is used when accessing and editing an employee's info
@@ -160,19 +172,15 @@ def authorize_admin_or_account_owner_search(args):
     #extract the user identity from the token
     user_id = get_jwt_identity()
 
-    #get employee from the token
-    token_stmt = db.select(Employee).filter_by(id = user_id)
-    token_user = db.session.scalar(token_stmt)
-
     #get the user from the provided phone
     stmt = db.select(User).filter_by(phone = args.get('phone'))
     user = db.session.scalar(stmt)
 
     #if the id from the token does not match looked up id,
-    #if the user is not employee, token_user is None
+    #if the user is not employee
     #or the user is not an admin, abort with 401 error
     try:
-        if  not token_user or (not user.id == user_id and token_user.is_admin is False):
+        if  not is_employee() or (not user.id == user_id and not is_admin()):
                 abort(401)
     except AttributeError:
         return {'message': 'Cannot find employee with provided info'}, 404
@@ -182,19 +190,15 @@ def authorize_admin_or_account_owner_id(employee_id):
     #extract the user identity from the token
     user_id = get_jwt_identity()
 
-    #get employee from the token
-    token_stmt = db.select(Employee).filter_by(id = user_id)
-    token_user = db.session.scalar(token_stmt)
-
     #get the user from the provided id
     stmt = db.select(User).filter_by(id = employee_id)
     user = db.session.scalar(stmt)
 
     #if the id from the token does not match looked up id,
-    #if the user is not employee, token_user is None
+    #if the user is not employee
     #or the user is not an admin, abort with 401 error
     try:
-        if  not token_user or (not user.id == user_id and token_user.is_admin is False):
+        if  not is_employee() or (not user.id == user_id and not is_admin()):
                 abort(401)
     except AttributeError:
         return {'message': 'Cannot find employee with provided info'}, 404
@@ -204,10 +208,6 @@ def authorize_employee_or_owner_booking(booking_id):
     #get user_id from jwt token
     user_id = get_jwt_identity()
 
-    #get type_id from the user to check if they are an employee
-    user_stmt = db.select(User).filter_by(id=user_id)
-    user = db.session.scalar(user_stmt)
-
     #get pet_id from the booking_id
     booking_stmt = db.select(Booking).filter_by(id=booking_id)
     booking = db.session.scalar(booking_stmt)
@@ -219,7 +219,7 @@ def authorize_employee_or_owner_booking(booking_id):
         pet = db.session.scalar(pet_stmt)
 
         #checks if the user_id from token matches client_id from pet
-        if user_id != pet.client_id and user.type_id != 2:
+        if user_id != pet.client_id and not is_employee():
             abort(401)
 
 #this function is used in pet routes
@@ -227,10 +227,6 @@ def authorize_employee_or_pet_owner(pet_id):
     #get user_id from token
     user_id = get_jwt_identity()
 
-    #get the user to access type_id
-    user_stmt = db.select(User).filter_by(id=user_id)
-    user = db.session.scalar(user_stmt)
-
     #get the pet whose id matches input and client_id matches user_id from token
     pet_stmt = db.select(Pet).where(db.and_(Pet.id==pet_id))
     pet = db.session.scalar(pet_stmt)
@@ -240,7 +236,7 @@ def authorize_employee_or_pet_owner(pet_id):
         return {'message': 'Cannot find pet with provided info'}, 404
 
     #if the pet's client_id is different from user_id and user is not employee abort with 401 response
-    if pet.client_id != user_id and user.type_id != 2:
+    if pet.client_id != user_id and not is_employee():
         abort(401)
 
 
@@ -1,18 +1,48 @@
 from flask import Blueprint, request, abort
+from datetime import datetime, date, timedelta
 from init import db
 from sqlalchemy.exc import IntegrityError
-from models.booking import Booking, BookingSchema, validate_date_time
+from models.booking import Booking, BookingSchema, VALID_STATUSES, OPENING_TIME, CLOSING_TIME, validate_date_time, parse_date_time
 from models.user import User
 from models.pet import Pet
 from models.client import Client, ClientSchema
 from models.employee import Employee
 from models.service import Service
-from controllers.auth_controller import authorize_employee, authorize_employee_or_owner_booking
+from controllers.auth_controller import authorize_employee, authorize_employee_or_owner_booking, is_employee
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from marshmallow.exceptions import ValidationError
+from utils.pagination import paginate
+from utils.loading import with_loader_plan
+from utils.validation import referenced, to_id
+from utils.assignment import assign_employee
+from utils.etags import check_etag, mark_tables_changed
+from utils.fieldsets import sparse_schema, split_names
+from utils.bulk import insert_many
+from utils.rollups import add_to_rollups
+from utils.catalog_cache import catalog_row
+from utils.read_models import read_one
+from utils.availability import build_interval_index, free_starts, to_minutes
+from utils.serializers import dump
 
 
 bookings_bp = Blueprint('Bookings', __name__, url_prefix = '/bookings')
 
+#maximum number of bookings in one bulk request
+MAX_BULK_BOOKINGS = 1000
+BULK_REQUIRED_FIELDS = ('pet_id', 'service_id', 'date', 'time')
+BOOKING_CONFLICT = 'The combination of pet\'s id, date and time already exists'
+
+#filters of GET /bookings/query/ on a column of the booking, each one takes an id or a comma separated list of ids
+BOOKING_ID_FILTERS = {
+    'employee_id': Booking.employee_id,
+    'service_id': Booking.service_id,
+    'pet_id': Booking.pet_id
+}
+
+#availability is given in steps of SLOT_MINUTES, for up to MAX_AVAILABILITY_DAYS days
+SLOT_MINUTES = 15
+MAX_AVAILABILITY_DAYS = 7
+
 #Route to return all bookings
 @bookings_bp.route('/')
 @jwt_required()
@@ -20,10 +50,13 @@ def get_all_bookings():
     #verify that the user is an employee
     authorize_employee()
 
-    #get all records of the Booking model
-    stmt = db.select(Booking).order_by(Booking.date)
-    bookings = db.session.scalars(stmt)
-    return BookingSchema(many=True).dump(bookings)
+    schema = sparse_schema(BookingSchema(many=True))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Booking, schema)
+
+    #get one page of the Booking model, ordered by date, time and id
+    stmt = db.select(Booking)
+    return paginate(stmt, [Booking.date, Booking.time, Booking.id], schema, read_model=True)
 
 #Route to get one booking by id
 @bookings_bp.route('/<int:booking_id>/')
@@ -32,12 +65,16 @@ def get_one_booking(booking_id):
     #verify that the user is an employee or owner of the booking
     authorize_employee_or_owner_booking(booking_id)
 
-    #get one booking whose id matches API endpoint
-    stmt = db.select(Booking).filter_by(id = booking_id)
+    schema = sparse_schema(BookingSchema())
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Booking, schema)
+
+    #get one booking whose id matches API endpoint, with its nested info loaded eagerly
+    stmt = with_loader_plan(db.select(Booking).filter_by(id = booking_id), schema)
     booking = db.session.scalar(stmt)
     # check if the booking exists, if they do, return the BookingSchema
     if booking:
-        return BookingSchema().dump(booking)
+        return dump(schema, booking)
     #if booking with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find booking with id {booking_id}'}, 404
@@ -49,37 +86,113 @@ def get_booking_by_status(status):
     #verify that the user is an employee
     authorize_employee()
 
+    schema = sparse_schema(BookingSchema(many=True))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Booking, schema)
+
     #get all bookings whose status matches API endpoint
     stmt = db.select(Booking).filter_by(status=status.capitalize())
-    bookings = db.session.scalars(stmt)
 
-    # respond to the user
-    return BookingSchema(many=True).dump(bookings)
+    # respond to the user with one page of bookings
+    return paginate(stmt, [Booking.date, Booking.time, Booking.id], schema, read_model=True)
+
+#ids of a comma separated query parameter, 400 if one of them is not a number
+def id_list(name):
+    try:
+        return [int(value) for value in split_names(request.args[name])]
+    except ValueError:
+        abort(400, description=f"'{name}' must be an id or a comma separated list of ids")
+
+#date of a query parameter, 400 if it is not in 'YYYY-MM-DD' format
+def date_arg(name):
+    try:
+        return datetime.strptime(request.args[name], '%Y-%m-%d').date()
+    except ValueError:
+        abort(400, description=f"'{name}' must be a date in 'YYYY-MM-DD' format")
+
+#criteria of the filters in the query parameters, all of them have to match
+#from and to are an inclusive date range, status is one status or a comma separated list of them (in any case)
+#client_id matches the bookings of the client's pets
+def booking_filters(args):
+    criteria = []
+    if 'from' in args:
+        criteria.append(Booking.date >= date_arg('from'))
+    if 'to' in args:
+        criteria.append(Booking.date <= date_arg('to'))
+    if 'from' in args and 'to' in args and date_arg('from') > date_arg('to'):
+        abort(400, description="'from' must not be after 'to'")
+
+    for name, column in BOOKING_ID_FILTERS.items():
+        if name in args:
+            criteria.append(column.in_(id_list(name)))
+    if 'client_id' in args:
+        criteria.append(Booking.pet_id.in_(db.select(Pet.id).where(Pet.client_id.in_(id_list('client_id')))))
+
+    if 'status' in args:
+        statuses = {status.lower(): status for status in VALID_STATUSES}
+        names = split_names(args['status'])
+        if not names:
+            abort(400, description="'status' must be a status or a comma separated list of statuses")
+        invalid = [name for name in names if name.lower() not in statuses]
+        if invalid:
+            abort(400, description=f"Invalid status '{', '.join(invalid)}', the statuses are {', '.join(VALID_STATUSES)}")
+        criteria.append(Booking.status.in_({statuses[name.lower()] for name in names}))
+    return criteria
+
+#Route to query bookings by any combination of filters, e.g. the pending and in-progress bookings of an employee in a week:
+#?employee_id=10&from=2022-12-05&to=2022-12-11&status=pending,in-progress
+#filters: from, to, employee_id, service_id, pet_id, client_id, status
+#the filters make one select, which the indexes on (employee_id | service_id | status, date, time, id) and the
+#pet_id unique constraint serve in the keyset order, and it is paginated like the other list routes
+@bookings_bp.route('/query/')
+@jwt_required()
+def query_bookings():
+    #verify that the user is an employee
+    authorize_employee()
+
+    args = request.args
+    criteria = booking_filters(args)
+    schema = sparse_schema(BookingSchema(many=True))
+    #answer 304 Not Modified if nothing the response depends on has changed,
+    #the client_id filter reads the pets table, which moving a pet to another client changes
+    check_etag(Booking, schema, tables=['pets'] if 'client_id' in args else ())
+
+    stmt = db.select(Booking).where(*criteria)
+    return paginate(stmt, [Booking.date, Booking.time, Booking.id], schema, read_model=True)
     
 #Route to create new booking
 @bookings_bp.route('/', methods = ['POST'])
 @jwt_required()
 def create_booking():
     # #load request on to BookingSchema to apply validations
-    data = BookingSchema().load(request.json, partial=True)
+    schema = BookingSchema()
+    data = schema.load(request.json, partial=True)
 
     #validate booking date and time have not passed
     validate_date_time(data)
 
-    #get the user object from the token id
-    user_stmt = db.select(User).filter_by(id=get_jwt_identity())
-    user = db.session.scalar(user_stmt)
-
-    #retrieve pet_id from data to check if it exists
-    pet_stmt = db.select(Pet).filter_by(id = data['pet_id'])
-    pet = db.session.scalar(pet_stmt)
+    #reuse the pet that was loaded when validating pet_id
+    pet = referenced(schema, 'pet_id', data)
 
     #create a new booking instance from the provided data
     #ifthe user is employee or the user is the owner of the pet, a booking can be made
-    if pet.client_id == get_jwt_identity() or user.type_id == 2:
+    if pet.client_id == get_jwt_identity() or is_employee():
+        employee_id = data.get('employee_id')
+
+        #?assign=true picks the least-loaded employee who is free for the whole service
+        if request.args.get('assign') == 'true':
+            try:
+                booking_date, booking_time = parse_date_time(data)
+            except (ValueError, TypeError):
+                return {'message': "Input date and time must be in 'YYYY-MM-DD' and 'HH:MM' format"}, 400
+            service = referenced(schema, 'service_id', data)
+            employee_id = assign_employee(booking_date, booking_time, service['duration'])
+            if not employee_id:
+                return {'message': 'No employee is free at this date and time'}, 409
+
         booking = Booking(
             pet_id = data['pet_id'],
-            employee_id = data.get('employee_id'),
+            employee_id = employee_id,
             date = data['date'],
             time = data['time'],
             service_id = data['service_id'],
@@ -89,7 +202,7 @@ def create_booking():
             #add the booking and commit if no conflicts
             db.session.add(booking)
             db.session.commit()
-            return BookingSchema().dump(booking)
+            return dump(BookingSchema(), booking)
 
         #catch IntegrityError if the combination of pet_id, date and time already exists
         except IntegrityError:
@@ -97,10 +210,99 @@ def create_booking():
             'The combination of pet\'s id, date and time already exists'}
   
     #if the pet's owner is not the user or user is not an employee, abort 401 with a message
-    elif pet.client_id != get_jwt_identity() and user.type_id != 2:
+    elif pet.client_id != get_jwt_identity() and not is_employee():
         return {'message': f"You are not the owner of pet id {data.get('pet_id')}"}, 401
 
 
+#result of a booking of a bulk request that was not created
+#errors is always {field: [messages]} as marshmallow reports them, with the errors of the whole booking under '_schema'
+def bulk_failure(index, status, errors):
+    return {'index': index, 'status': status, 'errors': errors}
+
+#Route to create many bookings in one transaction
+@bookings_bp.route('/bulk/', methods = ['POST'])
+@jwt_required()
+def create_bookings_bulk():
+    items = request.json
+    if not isinstance(items, list) or not 0 < len(items) <= MAX_BULK_BOOKINGS:
+        return {'message': f'Request body must be a list of 1 to {MAX_BULK_BOOKINGS} bookings'}, 400
+
+    #load every booking at once, pets, employees and services are checked with one query per table
+    #invalid bookings are reported, the others are still created
+    schema = BookingSchema(many=True)
+    try:
+        data = schema.load(items, partial=True)
+        errors = {}
+    except ValidationError as err:
+        data = err.valid_data
+        errors = err.messages
+
+    results = [None] * len(items)
+    rows = []
+    keys = set()
+    for index, item in enumerate(data):
+        if index in errors:
+            results[index] = bulk_failure(index, 'invalid', errors[index])
+            continue
+
+        #same checks as creating one booking
+        missing = {field: ['Missing data for required field.'] for field in BULK_REQUIRED_FIELDS if field not in item}
+        if missing:
+            results[index] = bulk_failure(index, 'invalid', missing)
+            continue
+        try:
+            message = validate_date_time(item)
+            if message:
+                raise ValidationError(message['message'])
+            booking_date, booking_time = parse_date_time(item)
+        except TypeError:
+            results[index] = bulk_failure(index, 'invalid', {'_schema': ["Input date and time must be in 'YYYY-MM-DD' and 'HH:MM' format"]})
+            continue
+        except ValidationError as err:
+            results[index] = bulk_failure(index, 'invalid', err.normalized_messages())
+            continue
+        pet = referenced(schema, 'pet_id', item)
+
+        #a client can only book their own pets
+        if pet.client_id != get_jwt_identity() and not is_employee():
+            results[index] = bulk_failure(index, 'unauthorized', {'pet_id': [f"You are not the owner of pet id {item.get('pet_id')}"]})
+            continue
+
+        #the same pet, date and time twice in the request
+        key = (pet.id, booking_date, booking_time)
+        if key in keys:
+            results[index] = bulk_failure(index, 'conflict', {'_schema': [BOOKING_CONFLICT]})
+            continue
+        keys.add(key)
+
+        rows.append({
+            'pet_id': pet.id,
+            'employee_id': item.get('employee_id'),
+            'service_id': item['service_id'],
+            'date': booking_date,
+            'time': booking_time,
+            'status': item.get('status', VALID_STATUSES[0])
+        })
+        results[index] = key
+
+    #one multi-row insert, bookings that already exist are skipped instead of aborting the transaction
+    inserted = insert_many(Booking, rows, [Booking.id, Booking.pet_id, Booking.date, Booking.time])
+    booking_ids = {(pet_id, booking_date, booking_time): id for id, pet_id, booking_date, booking_time in inserted}
+    #the insert does not go through the unit of work, so the rollups are updated here
+    add_to_rollups(db.session, [row for row in rows if (row['pet_id'], row['date'], row['time']) in booking_ids])
+    mark_tables_changed(db.session, ['bookings'])
+    db.session.commit()
+
+    #bookings that were not returned by the insert hit the unique constraint
+    for index, result in enumerate(results):
+        if isinstance(result, tuple):
+            if result in booking_ids:
+                results[index] = {'index': index, 'status': 'created', 'id': booking_ids[result]}
+            else:
+                results[index] = bulk_failure(index, 'conflict', {'_schema': [BOOKING_CONFLICT]})
+
+    return {'created': len(booking_ids), 'results': results}, 201 if booking_ids else 200
+
 #Route to delete a booking
 @bookings_bp.route('/<int:booking_id>/', methods = ['DELETE'])
 @jwt_required()
@@ -128,10 +330,6 @@ def update_booking(booking_id):
     #verify that the user is an employee or owner of the booking
     authorize_employee_or_owner_booking(booking_id)
 
-    #get the user object from the token to check if they are an employee
-    user_stmt = db.select(User).filter_by(id=get_jwt_identity())
-    user = db.session.scalar(user_stmt)
-
     #get one booking whose id matches API endpoint
     stmt = db.select(Booking).filter_by(id = booking_id)
     booking = db.session.scalar(stmt)
@@ -146,6 +344,24 @@ def update_booking(booking_id):
             if data.get('date') or data.get('time'): 
                 validate_date_time(data)
 
+            #?assign=true picks the least-loaded employee who is free for the updated date, time and service
+            if request.args.get('assign') == 'true':
+                try:
+                    booking_date, booking_time = parse_date_time({
+                        'date': data.get('date', booking.date.strftime('%Y-%m-%d')),
+                        'time': data.get('time', booking.time.strftime('%H:%M'))
+                    })
+                except (ValueError, TypeError):
+                    return {'message': "Input date and time must be in 'YYYY-MM-DD' and 'HH:MM' format"}, 400
+                service_id = data.get('service_id', booking.service_id)
+                service = catalog_row(Service, to_id(service_id))
+                if not service:
+                    return {'message': f'Cannot find service with id {service_id}'}, 404
+                employee_id = assign_employee(booking_date, booking_time, service['duration'], booking.id)
+                if not employee_id:
+                    return {'message': 'No employee is free at this date and time'}, 409
+                data['employee_id'] = employee_id
+
             #get the info from the request, if not provided, keep as it is
             booking.service_id = data.get('service_id', booking.service_id)
             booking.employee_id = data.get('employee_id', booking.employee_id)
@@ -155,11 +371,11 @@ def update_booking(booking_id):
 
             #if the user wants to change pet_id in a booking
             #only an employee can do so
-            if data.get('pet_id') and user.type_id == 2:
+            if data.get('pet_id') and is_employee():
                 booking.pet_id = data.get('pet_id')
 
             #if the user is not an employee: send a message with 401 response
-            elif data.get('pet_id') and user.type_id != 2:
+            elif data.get('pet_id') and not is_employee():
                 return {'message': 'Only employee can edit pet_id in a booking'}, 401
 
             #if pet_id is not in the request, keep as it is
@@ -168,7 +384,7 @@ def update_booking(booking_id):
 
 
             db.session.commit() #commit the changes
-            return BookingSchema().dump(booking)
+            return dump(BookingSchema(), booking)
         #catch IntegrityError when the updated info already exist in the database
         except IntegrityError:
             return {'message': 'The combination of pet\'s id, date and time already exists'}
@@ -177,6 +393,75 @@ def update_booking(booking_id):
     else:
         return {'message': f'Cannot find booking with id {booking_id}'}, 404
 
+#Route to get the free start times of each employee for a service
+#?date=YYYY-MM-DD&service_id=1, optional &days=7 for a week and &employee_id=10
+@bookings_bp.route('/availability/')
+@jwt_required()
+def get_availability():
+    args = request.args
+    try:
+        start_date = datetime.strptime(args['date'], '%Y-%m-%d').date()
+    except ValueError:
+        return {'message': "Date must be in 'YYYY-MM-DD' format"}, 400
+    days = max(1, min(args.get('days', 1, type=int), MAX_AVAILABILITY_DAYS))
+    end_date = start_date + timedelta(days=days - 1)
+
+    if not args.get('service_id'):
+        return {'message': 'service_id is required'}, 400
+    for name in ('service_id', 'employee_id'):
+        if args.get(name) and to_id(args[name]) is None:
+            return {'message': f'{name} must be an integer'}, 400
+
+    #the service and its duration come from the cache
+    service = catalog_row(Service, to_id(args['service_id']))
+    if not service:
+        return {'message': f"Cannot find service with id {args['service_id']}"}, 404
+    duration = round(service['duration'] * 60)
+
+    #answer 304 Not Modified if nothing the response depends on has changed,
+    #today's free starts also change as the day goes on, once a slot
+    now = datetime.now()
+    check_etag(Booking, None, tables=['employees', 'services', 'users'],
+               depends_on=[date.today(), -(-to_minutes(now.time()) // SLOT_MINUTES)])
+
+    #the employees to check
+    employee_stmt = db.select(Employee.id, User.f_name, User.l_name).join(User, Employee.id == User.id).order_by(Employee.id)
+    if args.get('employee_id'):
+        employee_stmt = employee_stmt.where(Employee.id == to_id(args['employee_id']))
+    employees = db.session.execute(employee_stmt).all()
+
+    #one query for every assigned booking in the date range, with the duration of its service
+    booking_stmt = db.select(Booking.employee_id, Booking.date, Booking.time, Service.duration).join(Service).where(
+        Booking.employee_id.isnot(None), Booking.date.between(start_date, end_date))
+    index = build_interval_index(db.session.execute(booking_stmt).all())
+
+    #a service must start from opening time and finish by closing time
+    opening = to_minutes(OPENING_TIME)
+    last = to_minutes(CLOSING_TIME) - duration
+
+    dates = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+
+        #no bookings in the past
+        if day < date.today():
+            first = last + 1
+        elif day == date.today():
+            first = max(opening, -(-to_minutes(now.time()) // SLOT_MINUTES) * SLOT_MINUTES)
+        else:
+            first = opening
+
+        dates.append({
+            'date': day.isoformat(),
+            'employees': [{
+                'employee_id': employee_id,
+                'name': f'{f_name} {l_name}',
+                'free': free_starts(index.get((employee_id, day)), first, last, duration, SLOT_MINUTES)
+            } for employee_id, f_name, l_name in employees]
+        })
+
+    return {'service_id': service['id'], 'duration': service['duration'], 'dates': dates}
+
 #search booking with client's phone
 @bookings_bp.route('/search/')
 @jwt_required()
@@ -184,29 +469,28 @@ def search_booking():
     args = request.args
     user_id = get_jwt_identity()
 
-    #get the user from user_id to access type_id
-    token_user_stmt = db.select(User).filter_by(id=user_id)
-    token_user = db.session.scalar(token_user_stmt)
-
     #get the user from the phone number because phone is stored in users table
     user_stmt = db.select(User).filter_by(phone = args['phone'])
     user = db.session.scalar(user_stmt)
 
     #if the user exist, means phone number exist in the database
     if user:
-        #get the client from the user
-        client_stmt = db.select(Client).filter_by(id=user.id)
-        client = db.session.scalar(client_stmt)
-
-        #if the client from phone number matches the user id, 
-        #or if the user is an employee, return ClientSchema, where booking info is nested
-        if user_id == client.id or token_user.type_id == 2:
-            return ClientSchema(exclude=['password']).dump(client)
-
         #if the client from the phone number does not match the user's id
         #and the user is not an employee abort 401
-        elif user_id != client.id and token_user.type_id != 2:
+        if user_id != user.id and not is_employee():
             abort(401)
+
+        schema = sparse_schema(ClientSchema(exclude=['password']))
+        #answer 304 Not Modified if nothing the response depends on has changed,
+        #the client is found by the phone in the users table, which the schema may not dump
+        check_etag(Client, schema, tables=['users'])
+
+        #get the client from the user, with pets and bookings read from result rows
+        #if the client from phone number matches the user id, 
+        #or if the user is an employee, return ClientSchema, where booking info is nested
+        client_stmt = db.select(Client).filter_by(id=user.id)
+        #an employee's phone has no client, which dumps as an empty object
+        return read_one(client_stmt, schema) or {}
     #if no user can be found from the provided phone number, return a message
     else:
         return {'message': 'Phone number not found'}, 404
@@ -1,6 +1,9 @@
+import click
+import random
+import time
 from datetime import date
-from flask import Blueprint
-from init import db, bcrypt
+from flask import Blueprint, current_app
+from init import db
 from models.user import User
 from models.client import Client
 from models.employee import Employee
@@ -11,44 +14,127 @@ from models.user_type import UserType
 from models.user import User
 from models.service import Service
 from models.booking import Booking
+from utils.migrations import apply_migrations, stamp_migrations
+from utils.explain import explain, route_queries
+from utils.passwords import hash_password, hash_passwords
+from utils.synthetic import seed_synthetic, SEED_PASSWORD
+from utils.pooling import worker_connection_limit, open_connections
+from utils.rollups import rebuild_booking_rollups
+from utils.etags import bump_table_versions
 
 
 db_commands = Blueprint('db', __name__)
 
 #function to generate client or employee object based on user info
+#the passwords are hashed in parallel and the records committed together
 def generate_record():
     stmt = db.select(User)
-    records = db.session.scalars(stmt)
-    for record in records:
+    records = db.session.scalars(stmt).all()
+    passwords = [record.f_name[:2] + record.f_name[-2:] + record.l_name[0] + record.l_name[-1] + 'ds123!' for record in records]
+    for record, password_hash in zip(records, hash_passwords(passwords)):
         email = record.f_name.lower() + '.' + record.l_name.lower()
-        password = record.f_name[:2] + record.f_name[-2:] + record.l_name[0] + record.l_name[-1] + 'ds123!'
         if record.type_id == 1:
             new_record = Client(
                 id = record.id,
-                password = bcrypt.generate_password_hash(password).decode('utf8')
+                password = password_hash
             )
         else:
             new_record = Employee(
                 id = record.id,
                 email = email + '@dogspa.com',
-                password = bcrypt.generate_password_hash(password).decode('utf8')
+                password = password_hash
             )
         db.session.add(new_record)
-        db.session.commit()
+    db.session.commit()
      
 @db_commands.cli.command('create')
 def create_table():
     db.create_all()
+    #the tables and indexes come from the models, which already include every migration
+    stamp_migrations(db.engine)
     print('Tables created!')
 
+#apply the migrations in utils/migrations.py that the database does not have yet
+@db_commands.cli.command('migrate')
+def migrate():
+    applied = 0
+    for version, function in apply_migrations(db.engine):
+        print(f'Applying migration {version}: {function.__name__}')
+        applied += 1
+    print(f'{applied} migrations applied!' if applied else 'Database is up to date!')
+
+#count every booking into the report rollups again, after bookings were changed without the app
+#(e.g. by hand in psql, or by the previous release while 'flask db migrate' added the rollups)
+@db_commands.cli.command('rollups')
+def rebuild_rollups():
+    with db.engine.begin() as connection:
+        rebuild_booking_rollups(connection)
+    bump_table_versions(db.engine, ['booking_rollups'])
+    print('Booking rollups rebuilt!')
+
+#print the query plan of each route's main query, to spot missing indexes and plan regressions
+#with --analyze the queries are run and the actual timings are shown (Postgres only)
+@db_commands.cli.command('explain')
+@click.option('--analyze', is_flag=True, help='Run the queries and show actual row counts and timings')
+def explain_queries(analyze):
+    for route, stmt in route_queries():
+        print(f'--- {route}')
+        for line in explain(stmt, analyze):
+            print(line)
+        print()
+
+#print the app's open Postgres connections and the most the server may open with --workers workers
+#with --watch the count is read every second for that many seconds, e.g. while a load test runs,
+#and the command fails if the count ever goes over the limit
+@db_commands.cli.command('connections')
+@click.option('--workers', default=1, help='Worker processes the server runs (WEB_CONCURRENCY)')
+@click.option('--watch', default=0, help='Seconds to keep reading the count')
+def count_connections(workers, watch):
+    per_worker = worker_connection_limit(current_app)
+    if per_worker is None:
+        raise click.ClickException('The database has no connection pool to check (SQLite)')
+    limit = workers * per_worker
+    highest = count = open_connections(db.engine)
+    print(f'{count} connections open, the limit is {limit} ({workers} workers * {per_worker})')
+    for _ in range(watch):
+        time.sleep(1)
+        count = open_connections(db.engine)
+        highest = max(highest, count)
+        print(f'{count} connections open, {highest} at most')
+    if highest > limit:
+        raise click.ClickException(f'{highest} connections were open, over the limit of {limit}')
 
 @db_commands.cli.command('drop')
 def drop_table():
     db.drop_all()
     print('Tables dropped!')
 
+#seed the sample rows, then optionally generated clients, pets and bookings for load testing, e.g.
+#flask db seed --clients 100000 --pets-per-client 2 --bookings 1000000
+#when the sample rows are already there only the generated rows are added, so a dataset can be grown
 @db_commands.cli.command('seed')
-def seed_table():
+@click.option('--clients', 'client_count', default=0, type=click.IntRange(min=0), help='Generated clients to add')
+@click.option('--pets-per-client', default=0, type=click.IntRange(min=0), help='Generated pets for each generated client')
+@click.option('--bookings', 'booking_count', default=0, type=click.IntRange(min=0), help='Generated bookings to add, for all pets and employees')
+@click.option('--employees', 'employee_count', default=0, type=click.IntRange(min=0), help='Generated employees to add')
+@click.option('--random-seed', type=int, help='Seed of the random generator, to generate the same data again')
+def seed_table(client_count, pets_per_client, booking_count, employee_count, random_seed):
+    if db.session.scalar(db.select(UserType).limit(1)) is None:
+        seed_sample_rows()
+        print('Table seeded!')
+
+    if client_count or booking_count or employee_count:
+        started = time.perf_counter()
+        password_hash = hash_password(SEED_PASSWORD)
+        try:
+            counts = seed_synthetic(db.engine, random.Random(random_seed), password_hash, client_count, employee_count, pets_per_client, booking_count)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="'--bookings'")
+        for table_name, count in counts.items():
+            print(f'{count} {table_name} generated')
+        print(f'Generated data seeded in {time.perf_counter() - started:.1f}s, the password of every generated user is {SEED_PASSWORD}')
+
+def seed_sample_rows():
     user_types = [
     UserType(
         name = 'Client'
@@ -186,7 +272,7 @@ def seed_table():
     admin_employee = Employee(
         id = admin.id,
         email = 'admin@dogspa.com',
-        password = bcrypt.generate_password_hash('Admin123!').decode('utf8'),
+        password = hash_password('Admin123!'),
         is_admin = True
     )
 
@@ -335,4 +421,3 @@ def seed_table():
 
     db.session.add_all(bookings)
     db.session.commit()
-    print('Table seeded!')
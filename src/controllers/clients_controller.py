@@ -1,11 +1,19 @@
 from flask import Blueprint, request
-from init import db, bcrypt
+from init import db
 from sqlalchemy.exc import IntegrityError
 from models.client import Client, ClientSchema
 from models.user import User, UserSchema
 from controllers.auth_controller import authorize_employee, authorize_employee_or_account_owner_search, authorize_employee_or_account_owner_id
 from marshmallow import EXCLUDE
 from flask_jwt_extended import jwt_required
+from utils.pagination import paginate
+from utils.token_versions import bump_token_version, forget_token_version
+from utils.loading import with_loader_plan
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.passwords import hash_password
+from utils.search import name_matches, search_page
+from utils.serializers import dump
 
 
 clients_bp = Blueprint('Clients', __name__, url_prefix = '/clients')
@@ -17,10 +25,13 @@ def get_all_clients():
     #verify if the user is an employee
     authorize_employee()
 
-    #get all records of the Client model
+    schema = sparse_schema(ClientSchema(many=True, exclude=['password']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Client, schema)
+
+    #get one page of the Client model
     stmt = db.select(Client)
-    clients = db.session.scalars(stmt)
-    return ClientSchema(many=True, exclude=['password']).dump(clients)
+    return paginate(stmt, [Client.id], schema)
 
 #Route to get one client by id
 @clients_bp.route('/<int:client_id>/')
@@ -29,12 +40,16 @@ def get_one_client(client_id):
     #verify that the user is an employee or account owner
     authorize_employee_or_account_owner_id(client_id)
 
-    #get one client whose id matches API endpoint
-    stmt = db.select(Client).filter_by(id = client_id)
+    schema = sparse_schema(ClientSchema(exclude=['password']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Client, schema)
+
+    #get one client whose id matches API endpoint, with pets and bookings loaded eagerly
+    stmt = with_loader_plan(db.select(Client).filter_by(id = client_id), schema)
     client = db.session.scalar(stmt)
     # check if the client exists, if they do, return the UserSchema
     if client:
-        return ClientSchema(exclude=['password']).dump(client)
+        return dump(schema, client)
     #if client with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find client with id {client_id}'}, 404
@@ -44,10 +59,19 @@ def get_one_client(client_id):
 @jwt_required()
 def search_client():
     args = request.args
+
+    #?q= searches the clients by name instead, e.g. 'Rach' (see utils/search.py)
+    if 'q' in args:
+        return search_clients_by_name(args.get('q'))
    
     #verify the user is an employee or the owner of the account
     authorize_employee_or_account_owner_search(args)
 
+    schema = sparse_schema(ClientSchema(exclude=['password']))
+    #answer 304 Not Modified if nothing the response depends on has changed,
+    #the client is found by the phone in the users table, which the schema may not dump
+    check_etag(Client, schema, tables=['users'])
+
     #get one user whose id matches API endpoint
     #user.type_id == 1 to ensure user is a client
     #have to search in the users table because it is where the info is stored
@@ -56,18 +80,31 @@ def search_client():
 
     #if the user exists user the user id to retrieve the client
     try:
-        #get the client whose id matches the user id
-        client_stmt = db.select(Client).filter_by(id=user.id)
+        #get the client whose id matches the user id, with pets and bookings loaded eagerly
+        client_stmt = with_loader_plan(db.select(Client).filter_by(id=user.id), schema)
         client = db.session.scalar(client_stmt)
 
         #respond to the user
-        return ClientSchema(exclude=['password']).dump(client)
+        return dump(schema, client)
 
     #if user with the provided id does not exist, return an error message
     except AttributeError:
         return {'message': 'Cannot find client with provided info'}, 404
 
 
+#clients whose first or last name match the query, best match first, paginated like the list routes
+def search_clients_by_name(query):
+    #verify the user is an employee
+    authorize_employee()
+
+    schema = sparse_schema(ClientSchema(many=True, exclude=['password']))
+    #the names searched are in the users table, so a change to it changes the ETag too
+    check_etag(Client, schema, tables=['users'])
+
+    #only the users who are clients
+    matches, order_by = name_matches(User, query, User.type_id == 1)
+    return search_page(Client, matches, order_by, schema)
+
 #Route to create new client (onsite) - autogenerated password, 
 #or they can use auth/register/ route to sign up online and use their password of choice
 @clients_bp.route('/', methods = ['POST'])
@@ -103,7 +140,7 @@ def create_client():
         #create a new client instance with the user.id from the new user
         new_client = Client(
             id = user.id,
-            password = bcrypt.generate_password_hash(auto_password).decode('utf8')
+            password = hash_password(auto_password)
         )
 
         #add the new client to the database and commit
@@ -111,7 +148,7 @@ def create_client():
         db.session.commit()
 
         #respond to the user
-        return ClientSchema(exclude = ['pets', 'password']).dump(new_client), 201
+        return dump(ClientSchema(exclude = ['pets', 'password']), new_client), 201
 
     #catch IntegrityError when phone number already exists
     except IntegrityError:
@@ -131,6 +168,7 @@ def delete_client(client_id):
     if client:
         db.session.delete(client)
         db.session.commit()
+        forget_token_version(client_id)
         return {'message': 'Client deleted successfully'}
     #if client with the provided id does not exist, return an error message
     else:
@@ -168,14 +206,16 @@ def update_client(client_id):
         ClientSchema().load(request.json, partial=True, unknown=EXCLUDE)
 
         #handles password in the request
+        #a new password invalidates the tokens issued with the old one
         if request.json.get('password'):
-            client.password = bcrypt.generate_password_hash(request.json.get('password')).decode('utf8')
+            client.password = hash_password(request.json.get('password'))
+            bump_token_version(user)
         else: 
             client.password = client.password
         
         #commit the changes and response to the user
         db.session.commit()
-        return ClientSchema(exclude=['password']).dump(client)
+        return dump(ClientSchema(exclude=['password']), client)
 
     #if employee with the provided id does not exist, return an error message
     else:
@@ -1,12 +1,18 @@
 from flask import Blueprint, request, json
-from init import db, bcrypt
+from init import db
 from sqlalchemy.exc import IntegrityError
 from models.employee import Employee, EmployeeSchema
 from models.user import User, UserSchema
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from controllers.auth_controller import authorize_admin_or_account_owner_search, authorize_admin, authorize_admin_or_account_owner_id
+from flask_jwt_extended import jwt_required
+from controllers.auth_controller import authorize_admin_or_account_owner_search, authorize_admin, authorize_admin_or_account_owner_id, is_admin
 from marshmallow import EXCLUDE
-from init import bcrypt
+from utils.pagination import paginate
+from utils.token_versions import bump_token_version, forget_token_version
+from utils.loading import with_loader_plan
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.passwords import hash_password
+from utils.serializers import dump
 
 employees_bp = Blueprint('Employee', __name__, url_prefix = '/employees')
 
@@ -17,10 +23,13 @@ def get_all_employee():
     #verify that the user is an admin
     authorize_admin()
 
-    #get all records of the Employee model
+    schema = sparse_schema(EmployeeSchema(many=True, exclude=['password', 'bookings']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Employee, schema)
+
+    #get one page of the Employee model
     stmt = db.select(Employee)
-    employees = db.session.scalars(stmt)
-    return EmployeeSchema(many=True, exclude=['password', 'bookings']).dump(employees)
+    return paginate(stmt, [Employee.id], schema)
 
 #Route to get one employee's info by phone
 @employees_bp.route('/search/')
@@ -31,6 +40,11 @@ def search_employee():
     #verify the user is an admin or the owner of the account
     authorize_admin_or_account_owner_search(args)
 
+    schema = sparse_schema(EmployeeSchema(exclude = ['password']))
+    #answer 304 Not Modified if nothing the response depends on has changed,
+    #the employee is found by the phone in the users table, which the schema may not dump
+    check_etag(Employee, schema, tables=['users'])
+
     #get one user whose id matches API endpoint
     #user.type_id == 2 to ensure user is an employee
     #have to search in the users table because it is where the info is stored
@@ -39,12 +53,12 @@ def search_employee():
 
     #if the user exists user the user id to retrieve the client
     try:
-        #get the client whose id matches the user id
-        employee_stmt = db.select(Employee).filter_by(id=user.id)
+        #get the employee whose id matches the user id, with their bookings loaded eagerly
+        employee_stmt = with_loader_plan(db.select(Employee).filter_by(id=user.id), schema)
         employee = db.session.scalar(employee_stmt)
 
         #respond to the user
-        return EmployeeSchema(exclude = ['password']).dump(employee)
+        return dump(schema, employee)
 
     #if employee with the provided id does not exist, return an error message
     except AttributeError:
@@ -58,12 +72,16 @@ def get_one_employee(employee_id):
     #verify the user is an admin or the owner of the account
     authorize_admin_or_account_owner_id(employee_id)
 
+    schema = sparse_schema(EmployeeSchema(exclude=['password', 'bookings']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Employee, schema)
+
     #get one employee whose id matches API endpoint
     stmt = db.select(Employee).filter_by(id = employee_id)
     employee = db.session.scalar(stmt)
     # check if the employee exists, if they do, return the EmployeeSchema
     if employee:
-        return EmployeeSchema(exclude=['password', 'bookings']).dump(employee)
+        return dump(schema, employee)
     #if employee with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find employee with id {employee_id}'}, 404
@@ -105,7 +123,7 @@ def create_employee():
         #create a new employee instance with the id from the new user
         new_employee = Employee(
             id = user.id,
-            password = bcrypt.generate_password_hash(auto_password).decode('utf-8'),
+            password = hash_password(auto_password),
             email = user.f_name.lower() + '.' + user.l_name.lower() + '@dog_spa.com',
             is_admin = json.loads(request.json.get('is_admin'))
         )
@@ -119,7 +137,7 @@ def create_employee():
         db.session.commit()
 
         #respond to the user
-        return EmployeeSchema(exclude=['password', 'bookings']).dump(new_employee), 201
+        return dump(EmployeeSchema(exclude=['password', 'bookings']), new_employee), 201
 
     #catch IntegrityError when phone number already exists
     except IntegrityError:
@@ -139,6 +157,7 @@ def delete_employee(employee_id):
     if employee:
         db.session.delete(employee)
         db.session.commit()
+        forget_token_version(employee_id)
         return {'message': 'Employee deleted successfully'}
     #if employee with the provided id does not exist, return an error message
     else:
@@ -176,35 +195,31 @@ def update_employee(employee_id):
         EmployeeSchema().load(request.json, partial = True, unknown = EXCLUDE)
 
         #handles password in the request
+        #a new password invalidates the tokens issued with the old one
         if request.json.get('password'):
-            employee.password = bcrypt.generate_password_hash(request.json.get('password', employee.password)).decode('utf8')
-        
-        def check_if_admin():
-            #extract the employee identity from the token
-            employee_id = get_jwt_identity() 
-
-            #retrieve the employee from the id
-            stmt = db.select(Employee).filter_by(id = employee_id)
-            employee = db.session.scalar(stmt)
-
-            #return if the user is admin
-            return employee.is_admin
+            employee.password = hash_password(request.json.get('password'))
+            bump_token_version(user)
 
         #only admin can update 'is_admin' field
-        if request.json.get('is_admin') and not check_if_admin():
+        if request.json.get('is_admin') and not is_admin():
             return {'message': "Only admin can update 'is_admin' field"}, 401
-        elif request.json.get('is_admin') and check_if_admin():
-            employee.is_admin = json.loads(request.json.get('is_admin', str(employee.is_admin)).lower())
+        elif request.json.get('is_admin') and is_admin():
+            new_is_admin = json.loads(request.json.get('is_admin', str(employee.is_admin)).lower())
+
+            #tokens carry the admin flag, so they are invalidated when it changes
+            if new_is_admin != employee.is_admin:
+                bump_token_version(user)
+            employee.is_admin = new_is_admin
         
         #only admin can update 'email' field
-        if request.json.get('email') and not check_if_admin():
+        if request.json.get('email') and not is_admin():
             return {'message': "Only admin can update 'email' field"}, 401
-        elif request.json.get('email') and check_if_admin():
+        elif request.json.get('email') and is_admin():
             employee.email = request.json.get('email')
 
         #commit the changes and response to the user
         db.session.commit()
-        return EmployeeSchema(exclude=['password', 'bookings']).dump(employee)
+        return dump(EmployeeSchema(exclude=['password', 'bookings']), employee)
     #if employee with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find employee with id {employee_id}'}, 404
\ No newline at end of file
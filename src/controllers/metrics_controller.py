@@ -0,0 +1,20 @@
+import hmac
+from flask import Blueprint, current_app, request, abort
+from utils.metrics import render_metrics, CONTENT_TYPE
+
+
+metrics_bp = Blueprint('Metrics', __name__, url_prefix = '/metrics')
+
+#Route for Prometheus to scrape this worker's request, database pool, password queue and cache metrics
+#the scraper has to send METRICS_TOKEN as a bearer token, without a token the route only exists in debug or testing mode
+#Prometheus asks for /metrics without the slash by default
+@metrics_bp.route('/', strict_slashes = False)
+def get_metrics():
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        if not (current_app.debug or current_app.testing):
+            abort(404)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401, description='A valid metrics token is required')
+
+    return render_metrics(), 200, {'Content-Type': CONTENT_TYPE}
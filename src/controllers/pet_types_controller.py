@@ -3,6 +3,10 @@ from init import db
 from models.pet_type import PetType, PetTypeSchema
 from controllers.auth_controller import authorize_admin
 from flask_jwt_extended import jwt_required
+from utils.catalog_cache import catalog_rows, catalog_row
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.serializers import dump
 
 
 pet_types_bp = Blueprint('PetTypes', __name__, url_prefix = '/pet_types')
@@ -10,20 +14,26 @@ pet_types_bp = Blueprint('PetTypes', __name__, url_prefix = '/pet_types')
 #Route to return all pet_types
 @pet_types_bp.route('/')
 def get_all_pet_types():
-    #get all records of the PetType model
-    stmt = db.select(PetType)
-    pet_types = db.session.scalars(stmt)
-    return PetTypeSchema(many=True, exclude=['pets']).dump(pet_types)
+    schema = sparse_schema(PetTypeSchema(many=True, exclude=['pets']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(PetType, schema)
+
+    #get all records of the PetType model from the cache
+    pet_types = catalog_rows(PetType)
+    return dump(schema, pet_types)
 
 #Route to get one pet_type by id
 @pet_types_bp.route('/<int:pet_type_id>/')
 def get_one_pet_type(pet_type_id):
-    #get one pet_type whose id matches API endpoint
-    stmt = db.select(PetType).filter_by(id = pet_type_id)
-    pet_type = db.session.scalar(stmt)
+    schema = sparse_schema(PetTypeSchema(exclude=['pets']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(PetType, schema)
+
+    #get one pet_type whose id matches API endpoint from the cache
+    pet_type = catalog_row(PetType, pet_type_id)
     # check if the pet_type exists, if they do, return the PetTypeSchema
     if pet_type:
-        return PetTypeSchema(exclude=['pets']).dump(pet_type)
+        return dump(schema, pet_type)
     #if pet_type with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find pet_type with id {pet_type_id}'}, 404
@@ -48,7 +58,7 @@ def create_pet_type():
     db.session.commit()
 
     #respond to the user
-    return PetTypeSchema().dump(new_pet_type)
+    return dump(PetTypeSchema(), new_pet_type)
 
 #Route to delete a pet_type
 @pet_types_bp.route('/<int:pet_type_id>/', methods = ['DELETE'])
@@ -90,7 +100,7 @@ def update_pet_type(pet_type_id):
         pet_type.name = data.get('name', pet_type.name).title()
 
         db.session.commit() #commit the changes
-        return PetTypeSchema().dump(pet_type)
+        return dump(PetTypeSchema(), pet_type)
         
     #if pet_type with the provided id does not exist, return an error message
     else:
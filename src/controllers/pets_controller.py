@@ -5,7 +5,14 @@ from models.pet import Pet, PetSchema
 from models.client import Client, ClientSchema
 from models.user import User
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from controllers.auth_controller import authorize_employee, authorize_employee_or_pet_owner, authorize_employee_or_account_owner_search
+from controllers.auth_controller import authorize_employee, authorize_employee_or_pet_owner, authorize_employee_or_account_owner_search, is_employee
+from utils.pagination import paginate
+from utils.loading import with_loader_plan
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.search import name_matches, search_page
+from utils.serializers import dump
+from utils.instrumentation import serialize_timing
 
 
 pets_bp = Blueprint('Pets', __name__, url_prefix = '/pets')
@@ -17,10 +24,13 @@ def get_all_pets():
     #verify that the user is an employee
     authorize_employee()
 
-    #get all records of the Pet model
+    schema = sparse_schema(PetSchema(many=True))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Pet, schema)
+
+    #get one page of the Pet model
     stmt = db.select(Pet)
-    pets = db.session.scalars(stmt)
-    return PetSchema(many=True).dump(pets)
+    return paginate(stmt, [Pet.id], schema, read_model=True)
 
 #Route to get one pet's info using pet's id
 @pets_bp.route('/<int:pet_id>/')
@@ -29,12 +39,16 @@ def get_one_pet(pet_id):
     #verify the user is pet's owner or employee
     authorize_employee_or_pet_owner(pet_id)
 
-    #get one pet whose id matches API endpoint
-    stmt = db.select(Pet).filter_by(id = pet_id)
+    schema = sparse_schema(PetSchema())
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Pet, schema)
+
+    #get one pet whose id matches API endpoint, with its nested info loaded eagerly
+    stmt = with_loader_plan(db.select(Pet).filter_by(id = pet_id), schema)
     pet = db.session.scalar(stmt)
     # check if the pet exists, if they do, return the PetSchema
     if pet:
-        return PetSchema().dump(pet)
+        return dump(schema, pet)
     #if pet with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find pet with id {pet_id}'}, 404
@@ -45,25 +59,48 @@ def get_one_pet(pet_id):
 def search_pet():
     args = request.args
 
+    #?q= searches the pets by name instead (see utils/search.py)
+    if 'q' in args:
+        return search_pets_by_name(args.get('q'))
+
     #verify that the user is an employee or account owner
     authorize_employee_or_account_owner_search(args)
 
+    schema = sparse_schema(ClientSchema(only=['pets']))
+    #answer 304 Not Modified if nothing the response depends on has changed,
+    #the client is found by the phone in the users table, which the schema may not dump
+    check_etag(Client, schema, tables=['users'])
+
     #get the user associated with the provided phone number
     stmt = db.select(User).filter_by(phone = args.get('phone'))
     user = db.session.scalar(stmt)
 
-    #get the id from the user, and use it to get the client
-    client_stmt = db.select(Client).filter_by(id = user.id)
+    #get the id from the user, and use it to get the client with their pets loaded eagerly
+    client_stmt = with_loader_plan(db.select(Client).filter_by(id = user.id), schema)
     client = db.session.scalar(client_stmt)
 
     # check if the pet exists, if they do, return the PetSchema
     if client:
-        return ClientSchema(only=['pets']).dumps(client)
+        with serialize_timing():
+            return schema.dumps(client)
     #if pet with the provided id does not exist, return an error message
     else:
         return {'message': 'Cannot find pet with the provided phone number'}, 404
 
 
+#pets whose name matches the query, best match first, paginated like the list routes
+def search_pets_by_name(query):
+    #verify the user is an employee
+    authorize_employee()
+
+    schema = sparse_schema(PetSchema(many=True))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Pet, schema)
+
+    matches, order_by = name_matches(Pet, query)
+    return search_page(Pet, matches, order_by, schema)
+
+
 #Route to create new pet
 @pets_bp.route('/', methods = ['POST'])
 @jwt_required()
@@ -71,13 +108,12 @@ def create_pet():
     #load info from the request to PetSchema to apply validation methods
     data = PetSchema().load(request.json)
 
-    #get the user object from the token
-    user_stmt = db.select(User).filter_by(id = get_jwt_identity())
-    user = db.session.scalar(user_stmt)
+    #get the user id from the token
+    user_id = get_jwt_identity()
 
     #an employee can add any pets to the system but a client can only add pets
     #to their own client_id
-    if user.type_id == 2 or data['client_id'] == user.id:
+    if is_employee() or data['client_id'] == user_id:
     
         #create a new pet instance from the provided data
         #breed is optional so use request.json.get
@@ -96,7 +132,7 @@ def create_pet():
             db.session.commit()
 
             #respond to the user
-            return PetSchema().dump(pet), 201
+            return dump(PetSchema(), pet), 201
 
         #catch IntegrityError if the same pet name already exists with the same client's number
         except IntegrityError:
@@ -104,8 +140,8 @@ def create_pet():
 
     #if the user try to create a pet with client_id other than their own
     #return error message
-    elif user.type_id != 2 and data['client_id'] != user.id:
-        return {'message': f'Client_id must be {user.id}'}, 401
+    elif not is_employee() and data['client_id'] != user_id:
+        return {'message': f'Client_id must be {user_id}'}, 401
 
 #Route to delete a pet
 @pets_bp.route('/<int:pet_id>/', methods = ['DELETE'])
@@ -156,12 +192,8 @@ def update_pet(pet_id):
             #only an employee can change client_id info for a pet
             if request.json.get('client_id'):
 
-                #get the user object using user_id from jwt token
-                user_stmt = db.select(User).filter_by(id=get_jwt_identity())
-                user = db.session.scalar(user_stmt)
-
                 #if the user is an employee, update client_id
-                if user.type_id == 2:
+                if is_employee():
                     pet.client_id = request.json.get('client_id')
 
                 #if the user is not an employee, return a message
@@ -173,7 +205,7 @@ def update_pet(pet_id):
                 pet.client_id = pet.client_id
                 
             db.session.commit() #commit the changes
-            return PetSchema().dump(pet)
+            return dump(PetSchema(), pet)
         #catch IntegrityError when the updated info already exist in the database
         except IntegrityError:
             return {'message': 'The combination of pet\'s name, client\'s id and pet type already exists'}
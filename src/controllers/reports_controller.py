@@ -0,0 +1,103 @@
+from flask import Blueprint, request, abort
+from datetime import date, timedelta
+from init import db
+from models.booking_rollup import BookingRollup
+from models.employee import Employee
+from controllers.auth_controller import authorize_admin
+from controllers.bookings_controller import date_arg
+from flask_jwt_extended import jwt_required
+from utils.etags import check_etag
+from utils.reports import WORKING_HOURS, period_days, revenue_query, employee_hours_query, period_hours_query
+
+
+reports_bp = Blueprint('Reports', __name__, url_prefix = '/reports')
+
+#groupings of the reports, days, months and years are strings such as '2022-12-01', '2022-12' and '2022'
+REVENUE_GROUPS = ('day', 'month', 'year', 'service', 'employee')
+UTILISATION_GROUPS = ('day', 'month', 'year', 'employee')
+#longest date range of a report
+MAX_REPORT_DAYS = 3660
+
+
+#inclusive date range of a report, the current month by default
+def report_range():
+    today = date.today()
+    start = date_arg('from') if 'from' in request.args else today.replace(day=1)
+    end = date_arg('to') if 'to' in request.args else (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    if start > end:
+        abort(400, description="'from' must not be after 'to'")
+    if (end - start).days >= MAX_REPORT_DAYS:
+        abort(400, description=f'A report covers at most {MAX_REPORT_DAYS} days')
+    return start, end
+
+def report_group(groups, default):
+    group = request.args.get('by', default)
+    if group not in groups:
+        abort(400, description=f"'by' must be one of {', '.join(groups)}")
+    return group
+
+#report rows as dicts, with the employee's name in one field and the amounts rounded to cents
+def report_rows(stmt):
+    rows = []
+    for row in db.session.execute(stmt).mappings():
+        row = dict(row)
+        if 'f_name' in row:
+            first_name, last_name = row.pop('f_name'), row.pop('l_name')
+            row['employee'] = ' '.join(name for name in (first_name, last_name) if name) or None
+        for name in ('revenue', 'completed_revenue', 'booked_hours'):
+            if name in row:
+                row[name] = round(row[name] or 0, 2)
+        rows.append(row)
+    return rows
+
+#available hours of a utilisation row, and the share of them that is booked
+def add_utilisation(row, available_hours):
+    row['available_hours'] = round(available_hours, 2)
+    row['utilisation'] = round(row['booked_hours'] / available_hours, 3) if available_hours else 0
+
+#Route to report the bookings and revenue of a date range, by day, month, year, service or employee, e.g.
+#/reports/revenue/?from=2022-01-01&to=2022-12-31&by=month
+#revenue is the services' current prices, of all bookings and of the completed ones,
+#summed in SQL from the daily rollups, so a year is a few thousand rows whatever the number of bookings
+@reports_bp.route('/revenue/')
+@jwt_required()
+def get_revenue_report():
+    #verify that the user is an admin
+    authorize_admin()
+
+    start, end = report_range()
+    group = report_group(REVENUE_GROUPS, 'day')
+    check_etag(BookingRollup, None, tables=['services', 'employees', 'users'])
+
+    return report_rows(revenue_query(start, end, group))
+
+#Route to report how much of the employees' working hours are booked in a date range, by day, month, year or employee
+#/reports/utilisation/?from=2022-12-01&to=2022-12-31&by=employee
+#available hours are the opening hours of every day of the range for every employee there is now,
+#booked hours are the services' durations of the bookings assigned to them, in any status
+#every period of the range and every employee is reported, the ones without bookings too
+@reports_bp.route('/utilisation/')
+@jwt_required()
+def get_utilisation_report():
+    #verify that the user is an admin
+    authorize_admin()
+
+    start, end = report_range()
+    group = report_group(UTILISATION_GROUPS, 'employee')
+    check_etag(BookingRollup, None, tables=['services', 'employees', 'users'])
+
+    if group == 'employee':
+        rows = report_rows(employee_hours_query(start, end))
+        available_hours = ((end - start).days + 1) * WORKING_HOURS
+        for row in rows:
+            add_utilisation(row, available_hours)
+        return rows
+
+    booked = {row[group]: row['booked_hours'] for row in report_rows(period_hours_query(start, end, group))}
+    employees = db.session.scalar(db.select(db.func.count()).select_from(Employee))
+    rows = []
+    for name, days in period_days(group, start, end).items():
+        row = {group: name, 'booked_hours': booked.get(name, 0)}
+        add_utilisation(row, days * employees * WORKING_HOURS)
+        rows.append(row)
+    return rows
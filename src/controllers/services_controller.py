@@ -3,6 +3,10 @@ from init import db
 from models.service import Service, ServiceSchema
 from controllers.auth_controller import authorize_admin
 from flask_jwt_extended import jwt_required
+from utils.catalog_cache import catalog_rows, catalog_row
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.serializers import dump
 
 
 services_bp = Blueprint('Services', __name__, url_prefix = '/services')
@@ -10,20 +14,26 @@ services_bp = Blueprint('Services', __name__, url_prefix = '/services')
 #Route to return all services
 @services_bp.route('/')
 def get_all_services():
-    #get all records of the Service model
-    stmt = db.select(Service)
-    services = db.session.scalars(stmt)
-    return ServiceSchema(many=True, exclude=['bookings']).dump(services)
+    schema = sparse_schema(ServiceSchema(many=True, exclude=['bookings']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Service, schema)
+
+    #get all records of the Service model from the cache
+    services = catalog_rows(Service)
+    return dump(schema, services)
 
 #Route to get one service by id
 @services_bp.route('/<int:service_id>/')
 def get_one_service(service_id):
-    #get one service whose id matches API endpoint
-    stmt = db.select(Service).filter_by(id = service_id)
-    service = db.session.scalar(stmt)
+    schema = sparse_schema(ServiceSchema(exclude=['bookings']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Service, schema)
+
+    #get one service whose id matches API endpoint from the cache
+    service = catalog_row(Service, service_id)
     # check if the service exists, if they do, return the ServiceSchema
     if service:
-        return ServiceSchema(exclude=['bookings']).dump(service)
+        return dump(schema, service)
     #if service with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find service with id {service_id}'}, 404
@@ -50,7 +60,7 @@ def create_service():
     db.session.commit()
 
     #respond to the user
-    return ServiceSchema().dump(new_service)
+    return dump(ServiceSchema(), new_service)
 
 #Route to delete a service
 @services_bp.route('/<int:service_id>/', methods = ['DELETE'])
@@ -94,7 +104,7 @@ def update_service(service_id):
         service.price = data.get('price', service.price)
 
         db.session.commit() #commit the changes
-        return ServiceSchema().dump(service)
+        return dump(ServiceSchema(), service)
         
     #if service with the provided id does not exist, return an error message
     else:
@@ -3,6 +3,10 @@ from init import db
 from models.size import Size, SizeSchema
 from controllers.auth_controller import authorize_admin
 from flask_jwt_extended import jwt_required
+from utils.catalog_cache import catalog_rows, catalog_row
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.serializers import dump
 
 
 sizes_bp = Blueprint('Sizes', __name__, url_prefix = '/sizes')
@@ -10,24 +14,30 @@ sizes_bp = Blueprint('Sizes', __name__, url_prefix = '/sizes')
 #Route to return all sizes
 @sizes_bp.route('/')
 def get_all_sizes():
-    #get all records of the Size model
-    stmt = db.select(Size)
-    sizes = db.session.scalars(stmt)
-    return SizeSchema(many=True, exclude=['pets']).dump(sizes)
+    schema = sparse_schema(SizeSchema(many=True, exclude=['pets']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Size, schema)
+
+    #get all records of the Size model from the cache
+    sizes = catalog_rows(Size)
+    return dump(schema, sizes)
 
 #Route to get one sizes by id
 @sizes_bp.route('/<int:sizes_id>/')
 def get_one_sizes(sizes_id):
-    #get one size whose id matches API endpoint
-    stmt = db.select(Size).filter_by(id = sizes_id)
-    size = db.session.scalar(stmt)
+    schema = sparse_schema(SizeSchema(exclude=['pets']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(Size, schema)
+
+    #get one size whose id matches API endpoint from the cache
+    size = catalog_row(Size, sizes_id)
 
     # check if the size exists, if they do, return the SizeSchema
     if size:
-        return SizeSchema(exclude=['pets']).dump(size)
+        return dump(schema, size)
     #if size with the provided id does not exist, return an error message
     else:
-        return {'message': f'Cannot find sizes with id {size_id}'}, 404
+        return {'message': f'Cannot find sizes with id {sizes_id}'}, 404
 
 #Route to create new size
 @sizes_bp.route('/', methods = ['POST'])
@@ -50,7 +60,7 @@ def create_sizes():
     db.session.commit()
 
     #respond to the user
-    return SizeSchema().dump(new_size)
+    return dump(SizeSchema(), new_size)
 
 #Route to delete a size
 @sizes_bp.route('/<int:size_id>/', methods = ['DELETE'])
@@ -94,7 +104,7 @@ def update_size(size_id):
         size.weight = data.get('weight', size.weight)
 
         db.session.commit() #commit the changes
-        return SizeSchema().dump(size)
+        return dump(SizeSchema(), size)
         
     #if size with the provided id does not exist, return an error message
     else:
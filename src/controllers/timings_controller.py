@@ -0,0 +1,17 @@
+from flask import Blueprint
+from controllers.auth_controller import authorize_admin
+from flask_jwt_extended import jwt_required
+from utils.instrumentation import timings_snapshot
+
+
+timings_bp = Blueprint('Timings', __name__, url_prefix = '/timings')
+
+#Route to return the histograms of handler time, database time, serialization time
+#and query count of every endpoint, since this worker started
+@timings_bp.route('/')
+@jwt_required()
+def get_timings():
+    #verify that the user is an admin
+    authorize_admin()
+
+    return timings_snapshot()
@@ -3,6 +3,10 @@ from init import db
 from models.user_type import UserType, UserTypeSchema
 from controllers.auth_controller import authorize_admin, authorize_employee
 from flask_jwt_extended import jwt_required
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.loading import with_loader_plan
+from utils.serializers import dump
 
 
 user_types_bp = Blueprint('UserTypes', __name__, url_prefix = '/user_types')
@@ -14,10 +18,15 @@ def get_all_user_types():
     #verify that the user is an employee
     authorize_employee()
 
-    #get all records of the UserType model
-    stmt = db.select(UserType)
+    schema = sparse_schema(UserTypeSchema(many=True))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(UserType, schema)
+
+    #get all records of the UserType model, with the users, employees and clients the schema dumps loaded
+    #in one query per relationship instead of one per user
+    stmt = with_loader_plan(db.select(UserType), schema)
     user_types = db.session.scalars(stmt)
-    return UserTypeSchema(many=True).dump(user_types)
+    return dump(schema, user_types)
 
 #Route to get one user_type by id
 @user_types_bp.route('/<int:user_type_id>/')
@@ -26,12 +35,16 @@ def get_one_user_type(user_type_id):
     #verify that the user is an employee
     authorize_employee()
 
-    #get one user_type whose id matches API endpoint
-    stmt = db.select(UserType).filter_by(id = user_type_id)
+    schema = sparse_schema(UserTypeSchema())
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(UserType, schema)
+
+    #get one user_type whose id matches API endpoint, with what the schema dumps loaded
+    stmt = with_loader_plan(db.select(UserType).filter_by(id = user_type_id), schema)
     user_type = db.session.scalar(stmt)
     # check if the user_type exists, if they do, return the UserTypeSchema
     if user_type:
-        return UserTypeSchema().dump(user_type)
+        return dump(schema, user_type)
     #if user_type with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find user_type with id {user_type_id}'}, 404
@@ -56,7 +69,7 @@ def create_user_type():
     db.session.commit()
 
     #respond to the user
-    return UserTypeSchema().dump(new_user_type)
+    return dump(UserTypeSchema(), new_user_type)
 
 #Route to delete a user_type
 @user_types_bp.route('/<int:user_type_id>/', methods = ['DELETE'])
@@ -97,7 +110,7 @@ def update_user_type(user_type_id):
         user_type.name = data.get('name', user_type.name).capitalize()
 
         db.session.commit() #commit the changes
-        return UserTypeSchema().dump(user_type)
+        return dump(UserTypeSchema(), user_type)
         
     #if user_type with the provided id does not exist, return an error message
     else:
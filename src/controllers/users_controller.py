@@ -3,6 +3,10 @@ from init import db
 from models.user import User, UserSchema
 from controllers.auth_controller import authorize_employee
 from flask_jwt_extended import jwt_required
+from utils.pagination import paginate
+from utils.etags import check_etag
+from utils.fieldsets import sparse_schema
+from utils.serializers import dump
 
 
 users_bp = Blueprint('Users', __name__, url_prefix = '/users')
@@ -17,10 +21,13 @@ def get_all_users():
     #checks if the user is an employee
     authorize_employee()
 
-    #get all records of the User model
+    schema = sparse_schema(UserSchema(many=True, exclude=['employee']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(User, schema)
+
+    #get one page of the User model
     stmt = db.select(User)
-    users = db.session.scalars(stmt)
-    return UserSchema(many=True, exclude=['employee']).dump(users)
+    return paginate(stmt, [User.id], schema)
 
 #Route to get one user by id
 @users_bp.route('/<int:user_id>/')
@@ -29,12 +36,16 @@ def get_one_user(user_id):
     #checks if the user is an employee
     authorize_employee()
 
+    schema = sparse_schema(UserSchema(exclude=['employee']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(User, schema)
+
     #get one user whose id matches API endpoint
     stmt = db.select(User).filter_by(id = user_id)
     user = db.session.scalar(stmt)
     # check if the user exists, if they do, return the UserSchema
     if user:
-        return UserSchema(exclude=['employee']).dump(user)
+        return dump(schema, user)
     #if user with the provided id does not exist, return an error message
     else:
         return {'message': f'Cannot find user with id {user_id}'}, 404
@@ -48,9 +59,13 @@ def search_user():
     #checks if the user is an employee
     authorize_employee()
 
+    schema = sparse_schema(UserSchema(exclude = ['employee']))
+    #answer 304 Not Modified if nothing the response depends on has changed
+    check_etag(User, schema)
+
     #get one user whose id matches API endpoint
     stmt = db.select(User).filter_by(phone=args.get('phone'))
     user = db.session.scalar(stmt)
 
     #respond to the user
-    return UserSchema(exclude = ['employee']).dump(user)
+    return dump(schema, user)
@@ -0,0 +1,25 @@
+#gunicorn settings of the production entry point in wsgi.py, run from the src folder:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#each worker opens at most DB_POOL_SIZE + DB_MAX_OVERFLOW database connections,
+#so the server opens at most WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW), check it under load with
+#   flask db connections --workers $WEB_CONCURRENCY --watch 60
+import os
+from utils.pooling import warm_up_worker
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+#the app shares out its bcrypt processes between the workers (see BCRYPT_WORKERS in main.py)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+#a thread per pooled connection, so a request rarely waits for one
+threads = int(os.environ.get('WEB_THREADS', os.environ.get('DB_POOL_SIZE', 5)))
+worker_class = 'gthread'
+#create the app in the master, the workers are forked with it already built
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+#restart workers now and then, staggered, so they do not all restart at once
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+#a forked worker must not use the master's database connections, it opens its own pool instead
+def post_fork(server, worker):
+    warm_up_worker(worker.app.wsgi())
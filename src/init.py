@@ -2,8 +2,10 @@ from flask_marshmallow import Marshmallow
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+from utils.replicas import RoutingSession
 
-db = SQLAlchemy()
+#reads go to the replicas in SQLALCHEMY_BINDS when there are any (see utils/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 ma = Marshmallow()
 bcrypt = Bcrypt()
 jwt = JWTManager()
@@ -14,14 +14,77 @@ from controllers.services_controller import services_bp
 from controllers.pet_types_controller import pet_types_bp
 from controllers.auth_controller import auth_bp
 from controllers.sizes_controller import sizes_bp
+from controllers.timings_controller import timings_bp
+from controllers.metrics_controller import metrics_bp
+from controllers.reports_controller import reports_bp
+from utils.etags import add_etag
+from utils.compression import compress_response
+from utils.instrumentation import start_request_timing, add_server_timing
+from utils.metrics import TimedQueuePool
+from utils.pooling import pool_options
+from utils.replicas import replica_binds, stick_to_primary
+from utils.json_provider import OrjsonProvider
+from utils.serializers import compile_serializers
+from utils.read_models import compile_read_models
+from models.booking import Booking, BookingSchema
+from models.pet import Pet, PetSchema
+from models.client import Client, ClientSchema
+from models.employee import EmployeeSchema
+from models.user import UserSchema
 
 def create_app():
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI')
+    #comma separated URIs of read replicas of DATABASE_URI, the requests' reads go to them (see utils/replicas.py)
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(os.environ.get('DATABASE_REPLICA_URIS', ''))
+    #seconds a replica may be behind the primary before it is taken out of rotation, and seconds between checks
+    app.config['REPLICA_MAX_LAG'] = float(os.environ.get('REPLICA_MAX_LAG', 10))
+    app.config['REPLICA_CHECK_INTERVAL'] = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+    #seconds a client's reads go to the primary after it writes, long enough for any replica in rotation to have the write
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.environ.get('REPLICA_STICKY_SECONDS',
+                                                                app.config['REPLICA_MAX_LAG'] + app.config['REPLICA_CHECK_INTERVAL']))
     app.config['JWT_SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    #seconds a user's token version is cached before it is read again
+    app.config['JWT_VERSION_TTL'] = int(os.environ.get('JWT_VERSION_TTL', 60))
+    #seconds the services, sizes, pet types and user types are cached before they are read again
+    app.config['CATALOG_CACHE_TTL'] = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+    #bcrypt work factor, passwords hashed with another one are rehashed at the next login
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    #processes that hash and check passwords in this web worker, 0 to do it in the request thread
+    #by default the server's BCRYPT_PROCESSES (one per CPU) are shared out between its WEB_CONCURRENCY web workers,
+    #at least one each, so the server starts about as many bcrypt processes as it has CPUs whatever its number of workers
+    web_workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    bcrypt_processes = int(os.environ.get('BCRYPT_PROCESSES', os.cpu_count() or 1))
+    app.config['BCRYPT_WORKERS'] = int(os.environ.get('BCRYPT_WORKERS', max(1, bcrypt_processes // web_workers)))
+    #password jobs that may wait or run at once, and seconds a request waits for a place before 503
+    app.config['BCRYPT_MAX_PENDING'] = int(os.environ.get('BCRYPT_MAX_PENDING', 4 * (os.cpu_count() or 1)))
+    app.config['BCRYPT_QUEUE_TIMEOUT'] = float(os.environ.get('BCRYPT_QUEUE_TIMEOUT', 2))
+    #add a Server-Timing header with the query count and the database, serialization and handler times
+    app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', 'true').lower() == 'true'
+    #also show the slowest statement's SQL in the header, for development
+    app.config['SERVER_TIMING_SQL'] = os.environ.get('SERVER_TIMING_SQL', 'false').lower() == 'true'
+    #bearer token the /metrics route asks for, without it the route answers 404 unless debug or testing is on
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    #pool size, overflow, timeout, recycle and pre-ping from the environment (see utils/pooling.py),
+    #with a pool that records how long requests wait for a connection, SQLite does not use a queue pool
+    if not (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': TimedQueuePool, **pool_options()}
+    #read-only list and search routes build their responses from result rows instead of ORM objects
+    app.config['CORE_READS'] = os.environ.get('CORE_READS', 'true').lower() == 'true'
     app.config['JSON_SORT_KEYS'] = False
+    #gzip (and brotli when it is installed) responses for clients that accept it
+    app.config['COMPRESS'] = os.environ.get('COMPRESS', 'true').lower() == 'true'
+    #bodies smaller than this many bytes are sent uncompressed, streamed bodies are always compressed
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    #bytes of compressed bodies kept to send again for the same ETag, e.g. the services catalog
+    app.config['COMPRESS_CACHE_SIZE'] = int(os.environ.get('COMPRESS_CACHE_SIZE', 16 * 2 ** 20))
 
     db.init_app(app)
+    #the list routes' schemas, compiled to plain functions before the first request
+    compile_serializers(BookingSchema(), PetSchema(), ClientSchema(exclude=['password']),
+                        EmployeeSchema(exclude=['password', 'bookings']), UserSchema(exclude=['employee']))
+    compile_read_models((Booking, BookingSchema()), (Pet, PetSchema()), (Client, ClientSchema(exclude=['password'])))
     ma.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
@@ -41,6 +104,22 @@ def create_app():
     app.register_blueprint(services_bp)
     app.register_blueprint(pet_types_bp)
     app.register_blueprint(sizes_bp)
+    app.register_blueprint(timings_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(reports_bp)
+
+    #time the request and its queries, registered before the other hooks so it sees all of their work
+    app.before_request(start_request_timing)
+    app.after_request(add_server_timing)
+
+    #compress the body, registered between the two so it runs after the ETag is added and is timed
+    app.after_request(compress_response)
+
+    #send the reads of a client that just wrote to the primary
+    app.after_request(stick_to_primary)
+
+    #add the ETag computed by check_etag to GET responses
+    app.after_request(add_etag)
 
     @app.errorhandler(404)
     def not_found(err):
@@ -54,6 +133,11 @@ def create_app():
     def unauthorize(err):
         return {'Error': str(err)}, 401
 
+    #the client may retry after a second, when the password queue has room again
+    @app.errorhandler(503)
+    def service_unavailable(err):
+        return {'Error': str(err)}, 503, {'Retry-After': '1'}
+
     @app.errorhandler(KeyError)
     def key_error(err):
         return {'Error': f'The field {err} is required'}, 400
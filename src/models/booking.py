@@ -3,12 +3,24 @@ from models.pet import Pet
 from models.employee import Employee
 from models.service import Service
 from datetime import datetime, date as dt
-from marshmallow import fields, validates
+from marshmallow import fields, validates_schema
 from marshmallow.validate import OneOf
 from marshmallow.exceptions import ValidationError
+from utils.validation import check_references
 
 VALID_STATUSES = ['Pending', 'In-progress', 'Completed']
 
+#opening hours, bookings can start from OPENING_TIME until CLOSING_TIME
+OPENING_TIME = datetime.strptime('10:00', '%H:%M').time()
+CLOSING_TIME = datetime.strptime('20:00', '%H:%M').time()
+
+#foreign keys of a booking, their model and the error message if they do not exist
+BOOKING_REFERENCES = {
+    'pet_id': (Pet, 'Pet does not exist'),
+    'employee_id': (Employee, 'Employee does not exist'),
+    'service_id': (Service, 'Service does not exist')
+}
+
 class Booking(db.Model):
     __tablename__ = 'bookings'
 
@@ -23,7 +35,15 @@ class Booking(db.Model):
     status = db.Column(db.String, default = VALID_STATUSES[0])
     date_created = db.Column(db.Date, default = datetime.now(), nullable=False)
    
-    __table_args__ = (db.UniqueConstraint('pet_id', 'date', 'time'),)
+    #the unique constraint also serves lookups by pet_id, so pet_id has no index of its own
+    #the indexes match the list queries' filter and keyset ordering, see utils/migrations.py
+    __table_args__ = (
+        db.UniqueConstraint('pet_id', 'date', 'time'),
+        db.Index('ix_bookings_date_time_id', 'date', 'time', 'id'),
+        db.Index('ix_bookings_status_date_time_id', 'status', 'date', 'time', 'id'),
+        db.Index('ix_bookings_employee_id_date_time_id', 'employee_id', 'date', 'time', 'id'),
+        db.Index('ix_bookings_service_id_date_time_id', 'service_id', 'date', 'time', 'id'),
+    )
 
     pet = db.relationship('Pet', back_populates = 'bookings')
     employee = db.relationship('Employee')
@@ -35,32 +55,11 @@ class BookingSchema(ma.Schema):
     employee = fields.Nested('EmployeeSchema', only = ['user'])
     status = fields.String(validate = OneOf(VALID_STATUSES))
 
-    @validates('pet_id')
-    def validate_pet(self, pet_id):
-        #get the employee object from the request to check if they exist
-        pet_stmt = db.select(Pet).filter_by(id=pet_id)
-        pet = db.session.scalar(pet_stmt)
-
-        if not pet:
-            raise ValidationError('Pet does not exist')
-
-    @validates('employee_id')
-    def validate_employee(self, employee_id):
-        #get the employee object from the request to check if they exist
-        employee_stmt = db.select(Employee).filter_by(id=employee_id)
-        employee = db.session.scalar(employee_stmt)
-
-        if not employee:
-            raise ValidationError('Employee does not exist')
-
-    @validates('service_id')
-    def validate_service(self, service_id):
-        #get the service object from the request to check if it exists
-        service_stmt = db.select(Service).filter_by(id=service_id)
-        service = db.session.scalar(service_stmt)
-
-        if not service:
-            raise ValidationError('Service does not exist')
+    #check that the pet, employee and service exist, with one query per table for one or many bookings
+    #the loaded objects are kept in self.references
+    @validates_schema(pass_many=True, skip_on_field_errors=False)
+    def validate_references(self, data, many, **kwargs):
+        check_references(self, data, many, BOOKING_REFERENCES)
 
 
     class Meta:
@@ -68,20 +67,21 @@ class BookingSchema(ma.Schema):
         'pet', 'employee_id', 'employee', 'date_created')
         ordered = True
 
+#convert booking date and time from request to python date and time objects
+def parse_date_time(input_data):
+    date_obj = datetime.strptime(input_data.get('date'), '%Y-%m-%d').date()
+    time_obj = datetime.strptime(input_data.get('time'), '%H:%M').time()
+    return date_obj, time_obj
+
 #validate date and time when updating existing booking
 def validate_date_time(input_data):
     #convert booking date and time from request, opening and closing time to python date and time object
     #catch ValueError if input is invalid
     try:
-        time_obj = datetime.strptime(input_data.get('time'), '%H:%M').time()
-        date_obj = datetime.strptime(input_data.get('date'), '%Y-%m-%d').date()
+        date_obj, time_obj = parse_date_time(input_data)
     except ValueError:
         return {'message': "Input date and time must be in 'YYYY-MM-DD' and 'HH:MM' format"}
 
-    open = datetime.strptime('10:00', '%H:%M').time()
-    close = datetime.strptime('20:00', '%H:%M').time()
-
-
     #raise ValidationError if booking date already passed
     if date_obj < dt.today():
         raise ValidationError('Booking date must be in the future')
@@ -93,6 +93,6 @@ def validate_date_time(input_data):
             raise ValidationError('Booking time must be in the future')
 
     #raise ValidationError if booking time is outside opening hours
-    if time_obj < open or time_obj > close:
+    if time_obj < OPENING_TIME or time_obj > CLOSING_TIME:
         raise ValidationError('Booking must be from 10am to 8pm')
 
@@ -0,0 +1,14 @@
+from init import db
+
+class BookingRollup(db.Model):
+    __tablename__ = 'booking_rollups'
+
+    #one row per day, service, employee and status, with the number of bookings that have them
+    #kept current with every change to the bookings (see utils/rollups.py), so reports read these rows instead of the bookings
+    #employee_id is 0 for bookings without an employee, so every combination has exactly one row
+    #there are no foreign keys, a row of a deleted service or employee is left behind with 0 bookings or reported as unassigned
+    date = db.Column(db.Date, primary_key=True)
+    service_id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
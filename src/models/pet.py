@@ -2,9 +2,16 @@ from init import db, ma
 from models.client import Client
 from models.pet_type import PetType
 from models.size import Size
-from marshmallow import fields, validates
+from marshmallow import fields, validates_schema
 from marshmallow.validate import Length
-from marshmallow.exceptions import ValidationError
+from utils.validation import check_references
+
+#foreign keys of a pet, their model and the error message if they do not exist
+PET_REFERENCES = {
+    'client_id': (Client, 'Client id does not exist'),
+    'type_id': (PetType, 'Type id does not exist'),
+    'size_id': (Size, 'Size id does not exist')
+}
 
 class Pet(db.Model):
     __tablename__ = 'pets'
@@ -18,7 +25,10 @@ class Pet(db.Model):
     size_id = db.Column(db.Integer, db.ForeignKey('sizes.id'), nullable=False)
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'))
 
-    __table_args__ = (db.UniqueConstraint('name', 'client_id', 'type_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('name', 'client_id', 'type_id'),
+        db.Index('ix_pets_client_id', 'client_id'),
+    )
 
     client = db.relationship('Client', back_populates = 'pets')
     bookings = db.relationship('Booking', back_populates = 'pet', cascade = 'all, delete')
@@ -33,32 +43,11 @@ class PetSchema(ma.Schema):
 
     name = fields.String(required=True, validate=Length(min=2))
 
-    @validates('client_id')
-    def validate_client(self, client_id):
-        #get the client object from the request to check if they exist
-        client_stmt = db.select(Client).filter_by(id=client_id)
-        client = db.session.scalar(client_stmt)
-
-        if not client:
-            raise ValidationError('Client id does not exist')
-
-    @validates('type_id')
-    def validate_type(self, type_id):
-        #get the pettype object from the request to check if they exist
-        type_stmt = db.select(PetType).filter_by(id=type_id)
-        type = db.session.scalar(type_stmt)
-
-        if not type:
-            raise ValidationError('Type id does not exist')
-
-    @validates('size_id')
-    def validate_size(self, size_id):
-        #get the size object from the request to check if they exist
-        size_stmt = db.select(Size).filter_by(id=size_id)
-        size = db.session.scalar(size_stmt)
-
-        if not size:
-            raise ValidationError('Size id does not exist')
+    #check that the client, type and size exist, with one query per table for one or many pets
+    #the loaded objects are kept in self.references
+    @validates_schema(pass_many=True, skip_on_field_errors=False)
+    def validate_references(self, data, many, **kwargs):
+        check_references(self, data, many, PET_REFERENCES)
 
     class Meta:
         fields = ('id', 'name', 'breed', 'year', 'type', 'size', 'client', 'bookings', 'type_id', 'size_id', 'client_id')
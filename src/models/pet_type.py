@@ -1,8 +1,10 @@
 from init import db, ma
 from marshmallow import fields, validates
 from marshmallow.exceptions import ValidationError
+from utils.catalog_cache import cached_catalog, catalog_name_exists
 
 
+@cached_catalog
 class PetType(db.Model):
     __tablename__ = 'pet_types'
 
@@ -20,12 +22,8 @@ class PetTypeSchema(ma.Schema):
         if len(value) < 2:
             raise ValidationError('Type name must be longer than 2 characters')
         
-        #get the pet type whose name matches requested name
-        stmt = db.select(PetType).filter_by(name = value.capitalize())
-        type_name = db.session.scalar(stmt)
-
-        #if pet type already exists, raise ValidationError
-        if type_name:
+        #if pet type already exists in the cached pet types, raise ValidationError
+        if catalog_name_exists(PetType, value.capitalize()):
             raise ValidationError('Pet type already exists')
 
     class Meta:
@@ -0,0 +1,9 @@
+from init import db
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+
+    #one row per migration in utils/migrations.py that has been applied to the database
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False)
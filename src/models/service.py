@@ -2,7 +2,9 @@ from init import db, ma
 from marshmallow import fields, validates
 from marshmallow.validate import Range
 from marshmallow.exceptions import ValidationError
+from utils.catalog_cache import cached_catalog, catalog_name_exists
 
+@cached_catalog
 class Service(db.Model):
     __tablename__ = 'services'
 
@@ -24,12 +26,8 @@ class ServiceSchema(ma.Schema):
         if len(value) < 2:
             raise ValidationError('Type name must be longer than 2 characters')
         
-        #get a service whose name matches requested name
-        stmt = db.select(Service).filter_by(name = value.title())
-        type_name = db.session.scalar(stmt)
-
-        #if service name already exists, raise ValidationError
-        if type_name:
+        #if service name already exists in the cached services, raise ValidationError
+        if catalog_name_exists(Service, value.title()):
             raise ValidationError('Service already exists')
     
     class Meta:
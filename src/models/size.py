@@ -1,7 +1,9 @@
 from init import db, ma
 from marshmallow import fields, validates
 from marshmallow.exceptions import ValidationError
+from utils.catalog_cache import cached_catalog, catalog_name_exists
 
+@cached_catalog
 class Size(db.Model):
     __tablename__ = 'sizes'
 
@@ -17,12 +19,8 @@ class SizeSchema(ma.Schema):
     @validates('name')
     def validate_name(self, value):
         
-        #get a size whose name matches requested name
-        stmt = db.select(Size).filter_by(name = value.capitalize())
-        size = db.session.scalar(stmt)
-
-        #if size name already exists, raise ValidationError
-        if size:
+        #if size name already exists in the cached sizes, raise ValidationError
+        if catalog_name_exists(Size, value.capitalize()):
             raise ValidationError('Pet size already exists')
 
     class Meta:
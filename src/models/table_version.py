@@ -0,0 +1,8 @@
+from init import db
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+
+    #one row per table, its version goes up every time a change to the table is committed
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -12,7 +12,9 @@ class User(db.Model):
     l_name = db.Column(db.String(15))
     date_created = db.Column(db.Date, default = date.today())
     phone = db.Column(db.String, nullable=False, unique=True)
-    personal_email = db.Column(db.String)
+    personal_email = db.Column(db.String, index = True)
+    #bumped when the user's role or password changes, so tokens issued before stop working
+    token_version = db.Column(db.Integer, default = 0, nullable = False)
 
     type_id = db.Column(db.Integer, db.ForeignKey('user_types.id'))
     
@@ -1,7 +1,9 @@
 from init import db, ma
 from marshmallow import fields, validates
 from marshmallow.exceptions import ValidationError
+from utils.catalog_cache import cached_catalog, catalog_name_exists
 
+@cached_catalog
 class UserType(db.Model):
     __tablename__ = 'user_types'
 
@@ -17,11 +19,9 @@ class UserTypeSchema(ma.Schema):
     def validate_name(self, value):
         if len(value) < 2:
             raise ValidationError('Type name must be longer than 2 characters')
-            
-        stmt = db.select(UserType).filter_by(name = value.capitalize())
-        type_name = db.session.scalar(stmt)
 
-        if type_name:
+        #check the cached user types for the same name
+        if catalog_name_exists(UserType, value.capitalize()):
             raise ValidationError('User type already exists')
             
     class Meta:
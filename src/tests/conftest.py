@@ -0,0 +1,33 @@
+import os
+import sys
+import bcrypt
+import pytest
+
+#the app's modules are imported from the src folder, as 'flask run' does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#password of the users the tests insert, hashed with a low work factor so the tests stay fast
+PASSWORD = 'Admin123!'
+PASSWORD_HASH = bcrypt.hashpw(PASSWORD.encode('utf8'), bcrypt.gensalt(4)).decode('utf8')
+
+
+#environment of create_app for an SQLite database file of the test's own, returns the file's path
+#passwords are hashed in the request thread, with the work factor of PASSWORD_HASH
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = tmp_path / 'spa.db'
+    monkeypatch.setenv('DATABASE_URI', f'sqlite:///{path}')
+    monkeypatch.setenv('SECRET_KEY', 'test secret')
+    monkeypatch.setenv('BCRYPT_WORKERS', '0')
+    monkeypatch.setenv('BCRYPT_LOG_ROUNDS', '4')
+    #the catalog cache is kept by the process, rows cached from another test's database are dropped
+    from utils import catalog_cache
+    for model in catalog_cache._catalogs:
+        catalog_cache.invalidate_catalog(model)
+    return path
+
+#log in with an employee's work email or a client's personal email, returns the headers that authenticate as them
+def login(client, email):
+    response = client.post('/auth/login/', json={'email': email, 'password': PASSWORD})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {'Authorization': f"Bearer {response.json['token']}"}
@@ -0,0 +1,50 @@
+import sqlite3
+from init import db
+from main import create_app
+from models.pet_type import PetType
+from models.service import Service
+from models.size import Size
+
+
+#the catalog routes dump the cached rows, which are dicts, with every field of the schema
+def test_catalog_routes_dump_cached_rows(database):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Service(id=1, name='Full Groom', duration=2, price=150), Size(id=1, name='S', weight='1-10kg'),
+                            PetType(id=1, name='Dog')])
+        db.session.commit()
+    client = app.test_client()
+
+    expected = {
+        '/services/': {'id': 1, 'name': 'Full Groom', 'duration': 2.0, 'price': 150.0},
+        '/sizes/': {'id': 1, 'weight': '1-10kg', 'name': 'S'},
+        '/pet_types/': {'id': 1, 'name': 'Dog'}
+    }
+    for path, row in expected.items():
+        #twice, the second response is built from the cache
+        for _ in range(2):
+            response = client.get(path)
+            assert response.status_code == 200
+            assert response.json == [row]
+            response = client.get(f'{path}1/')
+            assert response.status_code == 200
+            assert response.json == row
+        assert client.get(f'{path}?fields=name').json == [{'name': row['name']}]
+
+#a service another worker created is seen once it bumped the table's version, before the cache expires
+def test_catalog_cache_reads_changes_of_other_workers(database):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(Service(id=1, name='Full Groom', duration=2, price=150))
+        db.session.commit()
+    client = app.test_client()
+    assert [row['id'] for row in client.get('/services/').json] == [1]
+
+    #the other worker's commit, its after_commit hooks only reach its own cache
+    with sqlite3.connect(database) as connection:
+        connection.execute("INSERT INTO services (id, name, duration, price) VALUES (2, 'Nails Only', 0.5, 30)")
+        connection.execute("UPDATE table_versions SET version = version + 1 WHERE table_name = 'services'")
+    assert [row['id'] for row in client.get('/services/').json] == [1, 2]
+    assert client.get('/services/2/').json['name'] == 'Nails Only'
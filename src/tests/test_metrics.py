@@ -0,0 +1,19 @@
+from main import create_app
+
+
+#without METRICS_TOKEN the metrics are hidden, unless the app is in debug or testing mode
+def test_metrics_need_a_token(database, monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    app = create_app()
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 404
+    app.testing = True
+    assert client.get('/metrics').status_code == 200
+
+    monkeypatch.setenv('METRICS_TOKEN', 'scraper token')
+    app = create_app()
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scraper token'})
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds' in response.get_data(as_text=True)
@@ -0,0 +1,79 @@
+import sqlite3
+from sqlalchemy import inspect
+from init import db
+from main import create_app
+from tests.conftest import PASSWORD_HASH, login
+
+#the tables of a database made before the migrations, by 'flask db create' from the first release's models
+BASELINE_SCHEMA = '''
+CREATE TABLE pet_types (id INTEGER NOT NULL, name VARCHAR(10), PRIMARY KEY (id));
+CREATE TABLE sizes (id INTEGER NOT NULL, name VARCHAR(5) NOT NULL, weight VARCHAR(20) NOT NULL, PRIMARY KEY (id));
+CREATE TABLE user_types (id INTEGER NOT NULL, name VARCHAR(10), PRIMARY KEY (id));
+CREATE TABLE services (id INTEGER NOT NULL, name VARCHAR(50) NOT NULL, duration FLOAT NOT NULL, price FLOAT NOT NULL, PRIMARY KEY (id));
+CREATE TABLE users (
+    id INTEGER NOT NULL, f_name VARCHAR(15) NOT NULL, l_name VARCHAR(15), date_created DATE, phone VARCHAR NOT NULL,
+    personal_email VARCHAR, type_id INTEGER,
+    PRIMARY KEY (id), UNIQUE (phone), FOREIGN KEY(type_id) REFERENCES user_types (id)
+);
+CREATE TABLE clients (id INTEGER NOT NULL, password VARCHAR, PRIMARY KEY (id), FOREIGN KEY(id) REFERENCES users (id));
+CREATE TABLE employees (
+    id INTEGER NOT NULL, email VARCHAR(50) NOT NULL, password VARCHAR NOT NULL, is_admin BOOLEAN,
+    PRIMARY KEY (id), FOREIGN KEY(id) REFERENCES users (id), UNIQUE (email)
+);
+CREATE TABLE pets (
+    id INTEGER NOT NULL, name VARCHAR(15) NOT NULL, breed VARCHAR(50), year INTEGER NOT NULL, type_id INTEGER NOT NULL,
+    size_id INTEGER NOT NULL, client_id INTEGER,
+    PRIMARY KEY (id), UNIQUE (name, client_id, type_id), FOREIGN KEY(type_id) REFERENCES pet_types (id),
+    FOREIGN KEY(size_id) REFERENCES sizes (id), FOREIGN KEY(client_id) REFERENCES clients (id)
+);
+CREATE TABLE bookings (
+    id INTEGER NOT NULL, pet_id INTEGER NOT NULL, employee_id INTEGER, service_id INTEGER NOT NULL, date DATE NOT NULL,
+    time TIME NOT NULL, status VARCHAR, date_created DATE NOT NULL,
+    PRIMARY KEY (id), UNIQUE (pet_id, date, time), FOREIGN KEY(pet_id) REFERENCES pets (id),
+    FOREIGN KEY(employee_id) REFERENCES employees (id) ON DELETE SET NULL, FOREIGN KEY(service_id) REFERENCES services (id)
+);
+'''
+
+BASELINE_ROWS = f'''
+INSERT INTO user_types (id, name) VALUES (1, 'Client'), (2, 'Employee');
+INSERT INTO users (id, f_name, l_name, phone, personal_email, type_id) VALUES
+    (1, 'Rachel', 'Green', '100001', 'rachel.green@friends.com', 1), (2, 'Admin', 'Admin', '200002', NULL, 2);
+INSERT INTO clients (id, password) VALUES (1, '{PASSWORD_HASH}');
+INSERT INTO employees (id, email, password, is_admin) VALUES (2, 'admin@dogspa.com', '{PASSWORD_HASH}', 1);
+INSERT INTO services (id, name, duration, price) VALUES (1, 'Full Groom', 2, 150);
+'''
+
+
+#'flask db migrate' brings a database of the first release up to the models, after which users can log in and write
+def test_migrate_upgrades_baseline_database(database):
+    with sqlite3.connect(database) as connection:
+        connection.executescript(BASELINE_SCHEMA + BASELINE_ROWS)
+    app = create_app()
+
+    result = app.test_cli_runner().invoke(args=['db', 'migrate'])
+    assert result.exception is None, result.output
+    assert 'migrations applied' in result.output
+
+    #every table and column of the models is in the migrated database
+    with app.app_context():
+        inspector = inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            assert {column.name for column in table.columns} <= columns, table.name
+
+    client = app.test_client()
+    headers = login(client, 'admin@dogspa.com')
+    response = client.patch('/clients/1/', json={'f_name': 'Rachelle'}, headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert login(client, 'rachel.green@friends.com')
+
+    #the write was committed and changed the ETag of the client
+    response = client.get('/clients/1/', headers=headers)
+    assert response.json['user']['f_name'] == 'Rachelle'
+    etag = response.headers['ETag']
+    client.patch('/clients/1/', json={'l_name': 'Geller'}, headers=headers)
+    assert client.get('/clients/1/', headers={**headers, 'If-None-Match': etag}).status_code == 200
+
+    #running it again finds nothing to do
+    result = app.test_cli_runner().invoke(args=['db', 'migrate'])
+    assert 'Database is up to date!' in result.output
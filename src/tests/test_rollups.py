@@ -0,0 +1,83 @@
+from datetime import date, time, timedelta
+from init import db
+from main import create_app
+from models.booking import Booking
+from models.booking_rollup import BookingRollup
+from models.client import Client
+from models.employee import Employee
+from models.pet import Pet
+from models.pet_type import PetType
+from models.service import Service
+from models.size import Size
+from models.user import User
+from models.user_type import UserType
+from tests.conftest import PASSWORD_HASH, login
+from utils import bulk
+from utils.rollups import NO_EMPLOYEE, rebuild_booking_rollups
+
+
+#a client with a pet, an admin and another employee, two services and one booking of them, in a new database
+def create_bookings(app):
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([UserType(id=1, name='Client'), UserType(id=2, name='Employee'), PetType(id=1, name='Dog'),
+                            Size(id=1, name='S', weight='1-10kg')])
+        db.session.add_all([User(id=1, f_name='Rachel', phone='100001', type_id=1), User(id=10, f_name='Admin', phone='200010', type_id=2),
+                            User(id=11, f_name='Jim', phone='200011', type_id=2)])
+        db.session.flush()
+        db.session.add_all([Client(id=1, password=PASSWORD_HASH), Employee(id=10, email='admin@dogspa.com', password=PASSWORD_HASH, is_admin=True),
+                            Employee(id=11, email='jim@dogspa.com', password=PASSWORD_HASH, is_admin=False),
+                            Service(id=1, name='Full Groom', duration=2, price=150), Service(id=2, name='Nails Only', duration=0.5, price=30)])
+        db.session.flush()
+        db.session.add(Pet(id=1, name='Rex', year=2020, type_id=1, size_id=1, client_id=1))
+        db.session.flush()
+        db.session.add(Booking(id=1, pet_id=1, employee_id=10, service_id=1, date=date.today() + timedelta(days=3), time=time(11, 0)))
+        db.session.commit()
+
+#rollup rows that count bookings, the rows a booking left are kept with 0
+def rollups():
+    return sorted(db.session.execute(db.select(BookingRollup.date, BookingRollup.service_id, BookingRollup.employee_id,
+                                                BookingRollup.status, BookingRollup.bookings).where(BookingRollup.bookings != 0)).all())
+
+
+#ids sent as strings move the booking to the rollup row of the integer ids, as a rebuild counts it
+def test_patch_booking_with_string_ids_updates_rollups(database):
+    app = create_app()
+    create_bookings(app)
+    client = app.test_client()
+    headers = login(client, 'admin@dogspa.com')
+
+    for payload in ({'service_id': '2'}, {'employee_id': '11'}):
+        response = client.patch('/bookings/1/', json=payload, headers=headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    with app.app_context():
+        booking = db.session.get(Booking, 1)
+        assert (booking.service_id, booking.employee_id) == (2, 11)
+        updated = rollups()
+        assert [row[1:] for row in updated] == [(2, 11, 'Pending', 1)]
+        with db.engine.begin() as connection:
+            rebuild_booking_rollups(connection)
+        assert rollups() == updated
+
+#on a database without ON CONFLICT the rollups are upserted with an UPDATE and an INSERT
+def test_rollups_without_on_conflict(database, monkeypatch):
+    monkeypatch.setattr(bulk, 'dialect_insert', lambda model, dialect: None)
+    app = create_app()
+    create_bookings(app)
+    client = app.test_client()
+    headers = login(client, 'admin@dogspa.com')
+
+    day = (date.today() + timedelta(days=3)).isoformat()
+    response = client.post('/bookings/bulk/', json=[{'pet_id': 1, 'service_id': 1, 'date': day, 'time': '15:00'},
+                                                    {'pet_id': 1, 'service_id': 1, 'date': day, 'time': '11:00'}], headers=headers)
+    assert [result['status'] for result in response.json['results']] == ['created', 'conflict']
+    response = client.patch('/bookings/1/', json={'service_id': 2}, headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    with app.app_context():
+        updated = rollups()
+        assert [row[1:] for row in updated] == [(1, NO_EMPLOYEE, 'Pending', 1), (2, 10, 'Pending', 1)]
+        with db.engine.begin() as connection:
+            rebuild_booking_rollups(connection)
+        assert rollups() == updated
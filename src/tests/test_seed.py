@@ -0,0 +1,24 @@
+from init import db
+from main import create_app
+from models.user import User
+from models.user_type import UserType
+
+
+#a count that cannot be generated is a usage error of its option, and nothing is written
+def test_seed_rejects_bad_counts(database):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([UserType(id=1, name='Client'), UserType(id=2, name='Employee')])
+        db.session.commit()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['db', 'seed', '--clients', '-1'])
+    assert result.exit_code == 2
+    assert "Invalid value for '--clients'" in result.output
+
+    result = runner.invoke(args=['db', 'seed', '--clients', '3', '--bookings', '5'])
+    assert result.exit_code == 2
+    assert "Invalid value for '--bookings': There are no pets to book" in result.output
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(User)) == 0
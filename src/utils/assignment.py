@@ -0,0 +1,48 @@
+from collections import defaultdict
+from init import db
+from models.booking import Booking
+from models.employee import Employee
+from models.service import Service
+from utils.availability import build_interval_index, is_busy, to_minutes
+
+
+#assigned bookings on a day with their service duration, without the booking being updated
+def bookings_on(booking_date, exclude_booking_id=None, employee_id=None):
+    stmt = db.select(Booking.employee_id, Booking.date, Booking.time, Service.duration).join(Service).where(
+        Booking.employee_id.isnot(None), Booking.date == booking_date)
+    if exclude_booking_id:
+        stmt = stmt.where(Booking.id != exclude_booking_id)
+    if employee_id:
+        stmt = stmt.where(Booking.employee_id == employee_id)
+    return db.session.execute(stmt).all()
+
+#pick the least-loaded employee who is free for the whole service, None if nobody is free
+#the chosen employee's row stays locked until the transaction ends, so it must be followed by the commit
+def assign_employee(booking_date, booking_time, duration, exclude_booking_id=None):
+    start = to_minutes(booking_time)
+    end = start + round(duration * 60)
+
+    #busy intervals and booked minutes of every employee that day
+    rows = bookings_on(booking_date, exclude_booking_id)
+    index = build_interval_index(rows)
+    load = defaultdict(int)
+    for employee_id, _, _, booking_duration in rows:
+        load[employee_id] += round(booking_duration * 60)
+
+    employee_ids = db.session.scalars(db.select(Employee.id)).all()
+    candidates = [employee_id for employee_id in employee_ids
+                  if not is_busy(*index.get((employee_id, booking_date), ([], [])), start, end)]
+    candidates.sort(key=lambda employee_id: (load[employee_id], employee_id))
+
+    for employee_id in candidates:
+        #lock the employee, an employee locked by another request is skipped instead of waited for
+        lock_stmt = db.select(Employee.id).where(Employee.id == employee_id).with_for_update(skip_locked=True)
+        if db.session.scalar(lock_stmt) is None:
+            continue
+
+        #another request may have booked the employee and committed since the first query
+        entry = build_interval_index(bookings_on(booking_date, exclude_booking_id, employee_id)).get((employee_id, booking_date))
+        if not entry or not is_busy(*entry, start, end):
+            return employee_id
+
+    return None
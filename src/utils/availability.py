@@ -0,0 +1,49 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+
+#convert a time object to minutes since midnight
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+#convert minutes since midnight to 'HH:MM'
+def to_hhmm(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+#merge overlapping busy intervals (in minutes) into a sorted list of disjoint intervals
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+#interval index of the busy time of every employee on every day
+#rows are (employee_id, date, start time, duration in hours) of the existing bookings
+#returns {(employee_id, date): (sorted interval starts, merged intervals)}
+def build_interval_index(rows):
+    intervals = defaultdict(list)
+    for employee_id, booking_date, booking_time, duration in rows:
+        start = to_minutes(booking_time)
+        intervals[(employee_id, booking_date)].append((start, start + round(duration * 60)))
+
+    index = {}
+    for key, busy in intervals.items():
+        merged = merge_intervals(busy)
+        index[key] = ([interval[0] for interval in merged], merged)
+    return index
+
+#check if [start, end) overlaps a busy interval, with a binary search on the interval starts
+#the intervals are disjoint, so only the last one starting before 'end' can overlap
+def is_busy(starts, merged, start, end):
+    i = bisect_left(starts, end) - 1
+    return i >= 0 and merged[i][1] > start
+
+#every start time from 'first' to 'last' (in minutes, every 'step' minutes)
+#where a service of 'duration' minutes fits between the busy intervals
+def free_starts(entry, first, last, duration, step):
+    starts, merged = entry if entry else ([], [])
+    return [to_hhmm(start) for start in range(first, last + 1, step)
+            if not is_busy(starts, merged, start, start + duration)]
@@ -0,0 +1,67 @@
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from init import db
+
+
+#INSERT of a dialect, which can take an ON CONFLICT clause, None for a database without one
+def dialect_insert(model, dialect):
+    if dialect == 'postgresql':
+        return postgresql_insert(model)
+    if dialect == 'sqlite':
+        return sqlite_insert(model)
+    return None
+
+#insert one row, skipping it if it breaks a unique constraint, returns the result or None if it was skipped
+#'INSERT ... ON CONFLICT DO NOTHING' where the database has it, otherwise a plain INSERT in a savepoint
+def insert_ignoring_conflict(connection, model, row):
+    stmt = dialect_insert(model, connection.dialect.name)
+    if stmt is not None:
+        result = connection.execute(stmt.on_conflict_do_nothing().values(row))
+        return result if result.rowcount else None
+    try:
+        with connection.begin_nested():
+            return connection.execute(db.insert(model).values(row))
+    except IntegrityError:
+        return None
+
+#add rows to the rows with the same key_columns, or insert them, e.g. to add counts: add={'bookings': 2}
+#rows are dicts of the key columns and the columns in add, their values are added to the existing row's
+#'INSERT ... ON CONFLICT DO UPDATE' where the database has it, otherwise an UPDATE and an INSERT if no row was updated
+def upsert_adding(connection, model, key_columns, add_columns, rows):
+    stmt = dialect_insert(model, connection.dialect.name)
+    if stmt is not None:
+        set_ = {name: getattr(model, name) + stmt.excluded[name] for name in add_columns}
+        connection.execute(stmt.on_conflict_do_update(index_elements=key_columns, set_=set_), rows)
+        return
+
+    table = model.__table__
+    for row in rows:
+        update = table.update().where(*(table.c[name] == row[name] for name in key_columns)).values(
+            {name: table.c[name] + row[name] for name in add_columns})
+        if connection.execute(update).rowcount:
+            continue
+        #another transaction may insert the same row meanwhile, its row is updated then
+        if insert_ignoring_conflict(connection, model, row) is None:
+            connection.execute(update)
+
+#insert many rows in one multi-row INSERT, skipping the ones that break a unique constraint
+#rows is a list of dicts with the same keys
+#returns the values of the returning columns for the rows that were inserted
+def insert_many(model, rows, returning):
+    if not rows:
+        return []
+    connection = db.session.connection()
+    stmt = dialect_insert(model, connection.dialect.name)
+    if stmt is not None and connection.dialect.full_returning:
+        return db.session.execute(stmt.on_conflict_do_nothing().values(rows).returning(*returning)).all()
+
+    #without RETURNING (SQLite in development) or ON CONFLICT insert one row at a time
+    #the id of an inserted row comes from the result
+    inserted = []
+    for row in rows:
+        result = insert_ignoring_conflict(connection, model, row)
+        if result is not None:
+            id = result.inserted_primary_key[0]
+            inserted.append(tuple(id if column.primary_key else row[column.key] for column in returning))
+    return inserted
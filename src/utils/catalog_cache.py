@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import time
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from init import db
+from models.table_version import TableVersion
+from utils.instrumentation import increment
+
+#in-memory copy of the small reference tables (services, sizes, pet types, user types)
+#model -> {'version': int, 'rows': list of dicts or None, 'fingerprint': str, 'loaded_at': float,
+#          'stored_version': the table's version in table_versions when the rows were read}
+_catalogs = {}
+_lock = threading.Lock()
+
+
+#class decorator for models whose table is cached
+def cached_catalog(model):
+    _catalogs[model] = {'version': 0, 'rows': None, 'fingerprint': None, 'loaded_at': 0, 'stored_version': None}
+    return model
+
+#version of a cached table, it changes every time the table is changed in this process
+def catalog_version(model):
+    return _catalogs[model]['version']
+
+#the cached model of a table name, None if the table is not cached
+def catalog_model(table_name):
+    for model in _catalogs:
+        if model.__tablename__ == table_name:
+            return model
+    return None
+
+#drop the cached rows of a table and bump its version
+def invalidate_catalog(model):
+    with _lock:
+        catalog = _catalogs[model]
+        catalog['version'] += 1
+        catalog['rows'] = None
+
+#version of a cached table in table_versions, which every worker bumps when it commits a change to the table
+#read from the primary once per request, a lagging replica would keep the old version
+def stored_version(model):
+    versions = g.setdefault('catalog_versions', {}) if has_request_context() else {}
+    if model not in versions:
+        stmt = db.select(TableVersion.version).where(TableVersion.table_name == model.__tablename__)
+        versions[model] = db.session.scalar(stmt, bind_arguments={'bind': db.engine}) or 0
+    return versions[model]
+
+#all rows of a cached table as dicts of column values, ordered by id
+#the table is read again after a change in this process, when another worker changed it (its version in table_versions),
+#or after CATALOG_CACHE_TTL seconds (changes made without the app)
+def catalog_rows(model):
+    catalog = _catalogs[model]
+    rows = catalog['rows']
+    stored = stored_version(model)
+    fresh = time.monotonic() - catalog['loaded_at'] < current_app.config['CATALOG_CACHE_TTL']
+    if rows is not None and catalog['stored_version'] == stored and fresh:
+        increment('cache', ('catalog', 'hit'))
+        return rows
+    increment('cache', ('catalog', 'miss'))
+
+    #remember the versions before reading, so rows read before a concurrent change are not kept, or are read again
+    version = catalog['version']
+    columns = model.__table__.columns
+    stmt = db.select(model).order_by(model.id)
+    #read from the primary, rows read from a lagging replica would be kept for the whole TTL
+    records = db.session.scalars(stmt, bind_arguments={'bind': db.engine})
+    rows = [{column.key: getattr(record, column.key) for column in columns} for record in records]
+
+    with _lock:
+        if catalog['version'] == version:
+            catalog['rows'] = rows
+            catalog['fingerprint'] = hashlib.sha1(repr(rows).encode('utf8')).hexdigest()
+            catalog['loaded_at'] = time.monotonic()
+            catalog['stored_version'] = stored
+    return rows
+
+#hash of the cached rows, the same in every worker that has the same data
+def catalog_fingerprint(model):
+    rows = catalog_rows(model)
+    with _lock:
+        if _catalogs[model]['rows'] is rows:
+            return _catalogs[model]['fingerprint']
+    #rows were just read but not kept because of a concurrent change
+    return hashlib.sha1(repr(rows).encode('utf8')).hexdigest()
+
+#one row of a cached table by id, None if it does not exist
+def catalog_row(model, id):
+    for row in catalog_rows(model):
+        if row['id'] == id:
+            return row
+    return None
+
+#check if a cached table already has a row with this name, used by the uniqueness validators
+def catalog_name_exists(model, name):
+    return any(row['name'] == name for row in catalog_rows(model))
+
+#remember which cached tables were changed in the flush
+@event.listens_for(Session, 'after_flush')
+def record_catalog_changes(session, flush_context):
+    for record in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(record) in _catalogs:
+            session.info.setdefault('catalog_changes', set()).add(type(record))
+
+#the changes are visible to other sessions once committed, so invalidate the cache then
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_catalogs(session):
+    for model in session.info.pop('catalog_changes', ()):
+        invalidate_catalog(model)
+
+#changes that were rolled back never happened
+@event.listens_for(Session, 'after_rollback')
+def discard_catalog_changes(session):
+    session.info.pop('catalog_changes', None)
+
+#read every cached table, so the first requests do not have to
+def load_catalogs():
+    for model in _catalogs:
+        catalog_rows(model)
@@ -0,0 +1,138 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from flask import current_app, request, g
+from utils.instrumentation import increment
+
+#brotli is optional, without it responses are only gzipped
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#mimetypes worth compressing, images and the like are compressed already
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/csv'}
+GZIP_LEVEL = 6
+#brotli's top qualities are too slow for responses made on every request
+BROTLI_QUALITY = 5
+
+#compressed bodies of ETagged responses, (etag, encoding) -> (crc32 and length of the body, compressed body)
+#the same response served again is sent without compressing it again, the least recently used bodies are dropped
+#once they take more than COMPRESS_CACHE_SIZE bytes
+_bodies = OrderedDict()
+_bodies_size = 0
+_bodies_lock = threading.Lock()
+
+
+#encodings this process can produce, in order of preference
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+#an object with compress(data) and finish(), for one response
+def compressor(encoding):
+    if encoding == 'br':
+        return BrotliStream()
+    return GzipStream()
+
+class GzipStream:
+    def __init__(self):
+        #wbits 31 writes the gzip header and trailer
+        self.compressobj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    #the compressed bytes of a chunk, flushed so the client can decode everything sent so far
+    def compress(self, data):
+        return self.compressobj.compress(data) + self.compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressobj.flush(zlib.Z_FINISH)
+
+class BrotliStream:
+    def __init__(self):
+        self.compressobj = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self.compressobj.process(data) + self.compressobj.flush()
+
+    def finish(self):
+        return self.compressobj.finish()
+
+def compress_body(data, encoding):
+    stream = compressor(encoding)
+    return stream.compress(data) + stream.finish()
+
+#compressed body from the cache if this exact body was compressed before, compressed and cached otherwise
+def cached_compress(key, data):
+    global _bodies_size
+    fingerprint = (zlib.crc32(data), len(data))
+    with _bodies_lock:
+        entry = _bodies.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            _bodies.move_to_end(key)
+            increment('cache', ('compressed_body', 'hit'))
+            return entry[1]
+    increment('cache', ('compressed_body', 'miss'))
+
+    compressed = compress_body(data, key[1])
+    limit = current_app.config['COMPRESS_CACHE_SIZE']
+    if len(compressed) > limit:
+        return compressed
+    with _bodies_lock:
+        previous = _bodies.pop(key, None)
+        if previous is not None:
+            _bodies_size -= len(previous[1])
+        _bodies[key] = (fingerprint, compressed)
+        _bodies_size += len(compressed)
+        while _bodies_size > limit:
+            _, (_, dropped) = _bodies.popitem(last=False)
+            _bodies_size -= len(dropped)
+    return compressed
+
+#compress a streamed body chunk by chunk, so the rows still reach the client as they are read
+def compress_stream(chunks, encoding):
+    stream = compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf8')
+            data = stream.compress(chunk)
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        #closing the body closes the wrapped stream too, which releases its cursor
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+#after_request hook registered in create_app, after add_server_timing and before add_etag, so it runs between them
+#compresses the body with the best encoding the client accepts, streamed bodies as they are sent
+#bodies under COMPRESS_MIN_SIZE bytes are sent as they are, compressing them would save little or grow them
+def compress_response(response):
+    if (not current_app.config['COMPRESS'] or response.direct_passthrough or response.status_code < 200
+            or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    started = time.perf_counter()
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        etag = g.get('etag')
+        response.set_data(cached_compress((etag, encoding), data) if etag else compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    #the compressed body is another representation of the same content, so its ETag is weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    g.compress_time = time.perf_counter() - started
+    return response
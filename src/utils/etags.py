@@ -0,0 +1,91 @@
+import hashlib
+from flask import request, g, abort, Response
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from init import db
+from models.table_version import TableVersion
+from utils.loading import schema_tables
+from utils.catalog_cache import catalog_model, catalog_fingerprint
+
+
+#remember which tables were changed in the flush
+@event.listens_for(Session, 'after_flush')
+def record_changed_tables(session, flush_context):
+    for record in list(session.new) + list(session.dirty) + list(session.deleted):
+        table_name = getattr(record, '__tablename__', None)
+        if table_name and table_name != TableVersion.__tablename__:
+            session.info.setdefault('changed_tables', set()).add(table_name)
+
+#used by writes that do not go through the ORM unit of work (e.g. executemany inserts)
+def mark_tables_changed(session, table_names):
+    session.info.setdefault('changed_tables', set()).update(table_names)
+
+#bump the versions after the data is committed, in a short transaction of its own,
+#so the version row is never locked for the length of the request's transaction
+@event.listens_for(Session, 'after_commit')
+def bump_changed_tables(session):
+    table_names = session.info.pop('changed_tables', None)
+    if table_names:
+        bump_table_versions(session.get_bind(), sorted(table_names))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
+
+def bump_table_versions(engine, table_names):
+    versions = TableVersion.__table__
+    for table_name in table_names:
+        with engine.begin() as connection:
+            stmt = versions.update().where(versions.c.table_name == table_name).values(version = versions.c.version + 1)
+            if connection.execute(stmt).rowcount:
+                continue
+        #the first change to a table creates its row, another worker may have just done the same
+        try:
+            with engine.begin() as connection:
+                connection.execute(versions.insert().values(table_name = table_name, version = 1))
+        except IntegrityError:
+            with engine.begin() as connection:
+                connection.execute(stmt)
+
+#current versions of the tables, a table that was never changed is version 0
+def table_versions(table_names):
+    stmt = db.select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(table_names))
+    versions = dict(db.session.execute(stmt).all())
+    return [(table_name, versions.get(table_name, 0)) for table_name in sorted(table_names)]
+
+#responses that only dump cached tables use the cached rows' fingerprints, so they need no query
+def response_versions(model, schema, tables=()):
+    table_names = (schema_tables(model, schema) if schema is not None else {model.__tablename__}) | set(tables)
+    catalogs = [catalog_model(table_name) for table_name in sorted(table_names)]
+    if all(catalogs):
+        return [(catalog.__tablename__, catalog_fingerprint(catalog)) for catalog in catalogs]
+    return table_versions(table_names)
+
+#strong ETag of a GET response: the url and the versions of every table the schema dumps (the model's table without a schema),
+#and of the tables in tables, which the response depends on without dumping them (e.g. the table a search reads)
+#depends_on are any other values the response depends on, such as the time of day
+#call it after authorization and before the query
+#if the client's If-None-Match matches, abort with 304 Not Modified without querying or serializing
+def check_etag(model, schema, tables=(), depends_on=()):
+    versions = response_versions(model, schema, tables)
+    raw = request.full_path + repr(versions)
+    if depends_on:
+        raw += repr(tuple(depends_on))
+    etag = hashlib.sha1(raw.encode('utf8')).hexdigest()
+
+    #a compressed response's ETag is weak (see utils/compression.py), so it comes back weak
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=request.if_none_match.is_weak(etag))
+        abort(response)
+
+    #the header is added to the response in add_etag
+    g.etag = etag
+
+#after_request hook registered in create_app
+def add_etag(response):
+    etag = g.get('etag')
+    if etag and request.method == 'GET' and response.status_code == 200:
+        response.set_etag(etag)
+    return response
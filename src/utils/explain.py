@@ -0,0 +1,78 @@
+from datetime import date, time, timedelta
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from init import db
+from models.booking import Booking, BookingSchema
+from models.client import Client, ClientSchema
+from models.employee import Employee, EmployeeSchema
+from models.pet import Pet, PetSchema
+from models.service import Service
+from models.user import User, UserSchema
+from utils.loading import with_loader_plan
+from utils.pagination import page_query, DEFAULT_LIMIT
+from utils.reports import revenue_query, employee_hours_query, period_hours_query
+
+
+#'EXPLAIN <select>' as a statement that can be executed with its parameters
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement, analyze=False):
+        self.statement = statement
+        self.analyze = analyze
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kw):
+    if compiler.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif element.analyze:
+        prefix = 'EXPLAIN ANALYZE '
+    else:
+        prefix = 'EXPLAIN '
+    sql = prefix + compiler.process(element.statement, **kw)
+    #the rows are plan lines, not the select's columns, so drop the select's result types
+    compiler._result_columns = []
+    return sql
+
+#the plan of a select as lines of text
+def explain(stmt, analyze=False):
+    rows = db.session.execute(Explain(stmt, analyze)).all()
+    if db.session.get_bind().dialect.name == 'sqlite':
+        #(id, parent, notused, detail), the detail is the readable part
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+#the main query of each route, built the way the route builds it, with sample parameters
+#nested collections are loaded by a second 'WHERE <foreign key> IN (...)' query, those are listed too
+def route_queries():
+    today = date.today()
+    booking_order = [Booking.date, Booking.time, Booking.id]
+    return [
+        ('GET /bookings/', page_query(db.select(Booking), booking_order, BookingSchema(many=True), None, DEFAULT_LIMIT + 1)),
+        ('GET /bookings/?after=...', page_query(db.select(Booking), booking_order, BookingSchema(many=True), [today, time(10), 0], DEFAULT_LIMIT + 1)),
+        ('GET /bookings/<status>/', page_query(db.select(Booking).filter_by(status='Pending'), booking_order, BookingSchema(many=True), None, DEFAULT_LIMIT + 1)),
+        ('GET /bookings/query/?employee_id=&from=&to=&status=', page_query(db.select(Booking).where(
+            Booking.employee_id.in_([1]), Booking.date >= today, Booking.date <= today + timedelta(days=6),
+            Booking.status.in_(['Pending', 'In-progress'])), booking_order, BookingSchema(many=True), None, DEFAULT_LIMIT + 1)),
+        ('GET /bookings/query/?client_id=', page_query(db.select(Booking).where(
+            Booking.pet_id.in_(db.select(Pet.id).where(Pet.client_id.in_([1])))), booking_order, BookingSchema(many=True), None, DEFAULT_LIMIT + 1)),
+        ('GET /bookings/<booking_id>/', with_loader_plan(db.select(Booking).filter_by(id=1), BookingSchema())),
+        ('GET /bookings/availability/', db.select(Booking.employee_id, Booking.date, Booking.time, Service.duration).join(Service).where(
+            Booking.employee_id.isnot(None), Booking.date.between(today, today + timedelta(days=6)))),
+        ('POST /bookings/?assign=true', db.select(Booking.employee_id, Booking.date, Booking.time, Service.duration).join(Service).where(
+            Booking.employee_id == 1, Booking.date == today)),
+        ('POST /auth/login/', db.select(User).filter_by(personal_email='rachel.green@friends.com')),
+        ('GET /bookings/search/', db.select(User).filter_by(phone='300573')),
+        ('GET /clients/', page_query(db.select(Client), [Client.id], ClientSchema(many=True, exclude=['password']), None, DEFAULT_LIMIT + 1)),
+        ('GET /employees/', page_query(db.select(Employee), [Employee.id], EmployeeSchema(many=True, exclude=['password', 'bookings']), None, DEFAULT_LIMIT + 1)),
+        ('GET /pets/', page_query(db.select(Pet), [Pet.id], PetSchema(many=True), None, DEFAULT_LIMIT + 1)),
+        ('GET /users/', page_query(db.select(User), [User.id], UserSchema(many=True, exclude=['employee']), None, DEFAULT_LIMIT + 1)),
+        ('GET /reports/revenue/?by=month', revenue_query(date(today.year, 1, 1), date(today.year, 12, 31), 'month')),
+        ('GET /reports/revenue/?by=employee', revenue_query(today.replace(day=1), today, 'employee')),
+        ('GET /reports/utilisation/?by=employee', employee_hours_query(today.replace(day=1), today)),
+        ('GET /reports/utilisation/?by=day', period_hours_query(today.replace(day=1), today, 'day')),
+        ('pets of clients (nested in clients)', db.select(Pet).where(Pet.client_id.in_([1, 2, 3]))),
+        ('bookings of pets (nested in pets)', db.select(Booking).where(Booking.pet_id.in_([1, 2, 3]))),
+        ('bookings of an employee (nested in employees)', db.select(Booking).where(Booking.employee_id.in_([1]))),
+        ('bookings of a service (nested in services)', db.select(Booking).where(Booking.service_id.in_([1])))
+    ]
@@ -0,0 +1,56 @@
+from flask import request, abort
+from utils.loading import nested_schema
+
+
+#names of a comma separated query parameter
+def split_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+#check that a field name, dotted for the fields of a nested object (e.g. 'pet.name'), is dumped by the schema
+#returns True if it names a nested object
+def check_field(schema, name, full_name=None):
+    full_name = full_name or name
+    head, _, rest = name.partition('.')
+    field = schema.dump_fields.get(head)
+    if field is None:
+        abort(400, description=f"Invalid field '{full_name}'")
+    child_schema = nested_schema(field)
+    if rest:
+        if child_schema is None:
+            abort(400, description=f"Invalid field '{full_name}', '{head}' is not a nested object")
+        return check_field(child_schema, rest, full_name)
+    return child_schema is not None
+
+#the schema a GET route dumps with, narrowed by the ?fields= and ?include= query parameters
+#?fields=id,date,time,status keeps only those fields, dotted names keep some fields of a nested object (pet.name)
+#?include=pet,service keeps those nested objects, with ?fields= or on top of every field that is not nested
+#leaving a nested object out also leaves out its join or query (see utils/loading.py) and its serialization,
+#and only the columns of the fields that are kept are selected
+def sparse_schema(schema):
+    fields = request.args.get('fields')
+    include = request.args.get('include')
+    if fields is None and include is None:
+        return schema
+
+    names = split_names(fields or '')
+    for name in names:
+        check_field(schema, name)
+    for name in split_names(include or ''):
+        if not check_field(schema, name):
+            abort(400, description=f"Invalid include '{name}', only nested objects can be included")
+        if name not in names:
+            names.append(name)
+    if fields is None:
+        names = [name for name, field in schema.dump_fields.items() if nested_schema(field) is None] + names
+    if not names:
+        abort(400, description='No fields were asked for')
+
+    #the fields keep the schema's order, whatever order they were asked in
+    order = list(schema.dump_fields)
+    names.sort(key=lambda name: order.index(name.partition('.')[0]))
+    #only narrows the schema's own only and exclude, so excluded fields such as passwords stay out
+    sparse = type(schema)(many=schema.many, only=names, exclude=schema.exclude)
+    #a nested field that has an only option of its own can only be narrowed one level down (e.g. pet.client but not pet.client.user)
+    for name in names:
+        check_field(sparse, name)
+    return sparse
@@ -0,0 +1,201 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import current_app, request, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#upper bounds of the histogram buckets, the last bucket has no upper bound
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+#histogram name -> bucket bounds
+BUCKETS = {
+    'duration_ms': DURATION_BUCKETS_MS,
+    'db_ms': DURATION_BUCKETS_MS,
+    'serialize_ms': DURATION_BUCKETS_MS,
+    'queries': QUERY_BUCKETS,
+    'pool_wait_ms': DURATION_BUCKETS_MS
+}
+#longest statement shown in the Server-Timing header when SERVER_TIMING_SQL is on
+MAX_STATEMENT_LENGTH = 200
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.sum += other.sum
+
+    def snapshot(self):
+        labels = [str(bound) for bound in self.bounds] + ['+Inf']
+        return {'buckets': dict(zip(labels, self.counts)), 'sum': round(self.sum, 3)}
+
+#metrics are kept per thread and every thread only writes to its own shard, so recording takes no lock
+#a shard is {'counters': {(name, labels): number}, 'histograms': {(name, labels): Histogram}}
+#reading them merges the shards, the shards of threads that have ended are merged into _finished
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+
+def new_shard():
+    return {'counters': defaultdict(int), 'histograms': {}}
+
+_finished = new_shard()
+
+def current_shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = new_shard()
+        with _shards_lock:
+            collect_finished_shards()
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+#called with _shards_lock held
+def collect_finished_shards():
+    global _shards
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            merge_shard(_finished, shard)
+    _shards = alive
+
+#add a shard to another, the source may be written to by its thread meanwhile,
+#copying its dicts first keeps the iteration safe, a value written during the copy is counted at the next read
+def merge_shard(total, shard):
+    for key, value in shard['counters'].copy().items():
+        total['counters'][key] += value
+    for key, histogram in shard['histograms'].copy().items():
+        if key not in total['histograms']:
+            total['histograms'][key] = Histogram(histogram.bounds)
+        total['histograms'][key].merge(histogram)
+
+#every thread's metrics added together
+def merged_metrics():
+    total = new_shard()
+    with _shards_lock:
+        collect_finished_shards()
+        merge_shard(total, _finished)
+        for _, shard in _shards:
+            merge_shard(total, shard)
+    return total
+
+def increment(name, labels=(), value=1):
+    current_shard()['counters'][(name, labels)] += value
+
+def observe(name, labels, value):
+    histograms = current_shard()['histograms']
+    histogram = histograms.get((name, labels))
+    if histogram is None:
+        histogram = histograms[(name, labels)] = Histogram(BUCKETS[name])
+    histogram.observe(value)
+
+#every endpoint's histograms, for the timings route
+def timings_snapshot():
+    snapshot = {}
+    for (name, labels), histogram in sorted(merged_metrics()['histograms'].items()):
+        if name == 'pool_wait_ms' or not labels[1]:
+            continue
+        endpoint = labels[1]
+        timings = snapshot.setdefault(endpoint, {'requests': 0})
+        if name == 'duration_ms':
+            timings['requests'] = sum(histogram.counts)
+        timings[name] = histogram.snapshot()
+    return dict(sorted(snapshot.items()))
+
+#time every statement run while handling a request, on any engine
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timing(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timing(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context() and 'request_started' in g:
+        g.query_count += 1
+        g.db_time += duration
+        if duration > g.slowest_query[0]:
+            g.slowest_query = (duration, statement)
+
+#a statement that failed never reaches after_cursor_execute
+@event.listens_for(Engine, 'handle_error')
+def discard_query_timing(exception_context):
+    if exception_context.connection is not None and exception_context.connection.info.get('query_started'):
+        exception_context.connection.info['query_started'].pop()
+
+#time a schema dump, see utils/serializers.py dump, a dump made while timing one is part of it
+#the queries run while dumping are lazy loads, a high count means the route is missing an eager load
+@contextmanager
+def serialize_timing():
+    if not has_request_context() or 'request_started' not in g or g.dump_depth:
+        yield
+        return
+    g.dump_depth += 1
+    started = time.perf_counter()
+    queries = g.query_count
+    try:
+        yield
+    finally:
+        g.dump_depth -= 1
+        g.serialize_time += time.perf_counter() - started
+        g.serialize_queries += g.query_count - queries
+
+#before_request hook registered in create_app
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.query_count = 0
+    g.db_time = 0
+    g.slowest_query = (0, None)
+    g.serialize_time = 0
+    g.serialize_queries = 0
+    g.dump_depth = 0
+    g.compress_time = 0
+
+#quoted-string value of a Server-Timing description
+def timing_description(text):
+    text = ' '.join(text.split())[:MAX_STATEMENT_LENGTH]
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+#after_request hook registered in create_app, it has to be registered first so it runs last
+#adds the Server-Timing header and records the request in its endpoint's histograms
+def add_server_timing(response):
+    if 'request_started' not in g:
+        return response
+    duration = time.perf_counter() - g.request_started
+    slowest, statement = g.slowest_query
+
+    if current_app.config['SERVER_TIMING']:
+        metrics = [
+            f'db;dur={g.db_time * 1000:.2f};desc="{g.query_count} queries"',
+            f'db-slowest;dur={slowest * 1000:.2f}',
+            f'serialize;dur={g.serialize_time * 1000:.2f};desc="{g.serialize_queries} queries"',
+            f'compress;dur={g.compress_time * 1000:.2f}',
+            f'handler;dur={duration * 1000:.2f}'
+        ]
+        #the statement text shows the schema, so it is only sent when enabled
+        if statement and current_app.config['SERVER_TIMING_SQL']:
+            metrics[1] += f';desc={timing_description(statement)}'
+        response.headers['Server-Timing'] = ', '.join(metrics)
+
+    #requests that match no route are counted under no blueprint and no endpoint
+    labels = (request.blueprint or '', request.endpoint or '')
+    increment('requests', labels + (request.method, str(response.status_code)))
+    if response.status_code >= 500:
+        increment('errors', labels)
+    observe('duration_ms', labels, duration * 1000)
+    observe('db_ms', labels, g.db_time * 1000)
+    observe('serialize_ms', labels, g.serialize_time * 1000)
+    observe('queries', labels, g.query_count)
+    return response
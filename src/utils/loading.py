@@ -0,0 +1,80 @@
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload, load_only
+from utils.shape_cache import ShapeCache
+
+
+#return the nested schema of a field, or None if the field is not nested
+def nested_schema(field):
+    if isinstance(field, fields.List):
+        field = field.inner
+    if isinstance(field, fields.Nested):
+        return field.schema
+    return None
+
+#schema instances with the same class, only and exclude, in themselves and in their nested schemas, dump the same fields
+#only alone is not enough, a dotted only such as 'user.f_name' is moved to the nested schema and leaves 'user' in the parent's
+def schema_key(schema):
+    nested = tuple((name, schema_key(child)) for name, field in schema.dump_fields.items()
+                   if (child := nested_schema(field)) is not None)
+    return (type(schema), schema.only and frozenset(schema.only), frozenset(schema.exclude), nested)
+
+#the columns a schema dumps from a model, and the ones its nested relationships are loaded by
+def dumped_columns(model, schema):
+    mapper = inspect(model)
+    names = [name for name in schema.dump_fields if name in mapper.column_attrs]
+    for name, field in schema.dump_fields.items():
+        if nested_schema(field) is not None and name in mapper.relationships:
+            names.extend(local.key for local, _ in mapper.relationships[name].local_remote_pairs if local.key in mapper.column_attrs)
+    return [getattr(model, name) for name in dict.fromkeys(names)]
+
+#walk the fields the schema will dump and load every nested relationship eagerly
+#many-to-one relationships are joined in the same query,
+#collections are loaded with one extra 'SELECT ... WHERE id IN (...)' per relationship
+#only the columns of the dumped fields are loaded, the primary key always is
+def build_loader_options(model, schema, parent=None):
+    options = []
+    relationships = inspect(model).relationships
+    if parent is None:
+        options.append(load_only(*dumped_columns(model, schema)))
+
+    for name, field in schema.dump_fields.items():
+        child_schema = nested_schema(field)
+        if child_schema is None or name not in relationships:
+            continue
+
+        relationship = relationships[name]
+        attribute = getattr(model, name)
+        if parent is None:
+            loader = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+        else:
+            loader = parent.selectinload(attribute) if relationship.uselist else parent.joinedload(attribute)
+
+        options.append(loader.load_only(*dumped_columns(relationship.mapper.class_, child_schema)))
+        options.extend(build_loader_options(relationship.mapper.class_, child_schema, loader))
+
+    return options
+
+#plans are built once per model and schema options, then reused
+_plans = ShapeCache(build_loader_options)
+
+#the loader options a schema instance needs, depending on its only/exclude
+def loader_plan(model, schema):
+    return _plans.get((model,) + schema_key(schema), model, schema)
+
+#apply the schema's loader plan to a select statement on its first entity
+def with_loader_plan(stmt, schema):
+    model = stmt.column_descriptions[0]['entity']
+    return stmt.options(*loader_plan(model, schema))
+
+#names of every table a schema instance reads from when dumping a model
+def schema_tables(model, schema):
+    tables = {model.__tablename__}
+    relationships = inspect(model).relationships
+
+    for name, field in schema.fields.items():
+        child_schema = nested_schema(field)
+        if child_schema is not None and name in relationships:
+            tables |= schema_tables(relationships[name].mapper.class_, child_schema)
+
+    return tables
@@ -0,0 +1,126 @@
+import math
+import time
+from sqlalchemy.pool import QueuePool
+from init import db
+from utils.instrumentation import merged_metrics, observe
+from utils.passwords import pending_password_jobs, rejected_password_jobs
+from utils.replicas import replica_lags
+
+#Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+#histogram name -> (metric name, help, divisor from the recorded unit to the metric's unit)
+HISTOGRAMS = {
+    'duration_ms': ('http_request_duration_seconds', 'Time to handle a request', 1000),
+    'db_ms': ('http_request_db_seconds', 'Time spent in SQL statements while handling a request', 1000),
+    'serialize_ms': ('http_request_serialize_seconds', 'Time spent dumping schemas while handling a request', 1000),
+    'queries': ('http_request_queries', 'SQL statements run while handling a request', 1),
+    'pool_wait_ms': ('db_pool_wait_seconds', 'Time spent waiting for a connection from the pool', 1000)
+}
+REQUEST_LABELS = ('blueprint', 'endpoint')
+
+
+#connection pool that records how long every checkout waited, set as the poolclass in create_app
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            observe('pool_wait_ms', (), (time.perf_counter() - started) * 1000)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+#'{name="value",...}' of label names and values, '' without labels
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def header(lines, name, kind, help):
+    lines.append(f'# HELP {name} {help}')
+    lines.append(f'# TYPE {name} {kind}')
+
+#counter samples from the merged counters of one name
+def counter_lines(lines, counters, key, name, help, label_names):
+    header(lines, name, 'counter', help)
+    for (counter_name, labels), value in sorted(counters.items()):
+        if counter_name == key:
+            lines.append(f'{name}{format_labels(label_names, labels)} {value}')
+
+#the buckets are cumulative in Prometheus, and in the metric's unit
+def histogram_lines(lines, histograms, key):
+    name, help, divisor = HISTOGRAMS[key]
+    header(lines, name, 'histogram', help)
+    label_names = () if key == 'pool_wait_ms' else REQUEST_LABELS
+    for (histogram_name, labels), histogram in sorted(histograms.items()):
+        if histogram_name != key:
+            continue
+        bounds = [format_value(bound / divisor) for bound in histogram.bounds] + ['+Inf']
+        total = 0
+        for bound, count in zip(bounds, histogram.counts):
+            total += count
+            lines.append(f"{name}_bucket{format_labels(label_names + ('le',), labels + (bound,))} {total}")
+        lines.append(f'{name}_sum{format_labels(label_names, labels)} {format_value(histogram.sum / divisor)}')
+        lines.append(f'{name}_count{format_labels(label_names, labels)} {total}')
+
+#size, checked out, overflow and idle connections of every engine's pool, a pool without a queue (SQLite) has none
+def pool_lines(lines):
+    pools = [(bind or 'default', engine.pool) for bind, engine in db.engines.items() if isinstance(engine.pool, QueuePool)]
+    gauges = [
+        ('db_pool_size', 'Connections the pool keeps open', QueuePool.size),
+        ('db_pool_checked_out', 'Connections in use', QueuePool.checkedout),
+        ('db_pool_overflow', 'Connections open past the pool size, negative while the pool is not full', QueuePool.overflow),
+        ('db_pool_checked_in', 'Idle connections in the pool', QueuePool.checkedin)
+    ]
+    for name, help, read in gauges:
+        header(lines, name, 'gauge', help)
+        for bind, pool in pools:
+            lines.append(f"{name}{format_labels(('bind',), (bind,))} {read(pool)}")
+
+#seconds each replica was behind at its last check, +Inf when it could not be reached or its lag is not known yet
+def replica_lines(lines):
+    header(lines, 'db_replica_lag_seconds', 'gauge', 'Seconds a read replica was behind the primary at its last check')
+    for bind, lag in sorted(replica_lags().items()):
+        value = '+Inf' if lag is None or math.isinf(lag) else format_value(float(lag))
+        lines.append(f"db_replica_lag_seconds{format_labels(('bind',), (bind,))} {value}")
+
+#hit ratio of each cache since this worker started
+def cache_ratio_lines(lines, counters):
+    caches = {}
+    for (name, labels), value in counters.items():
+        if name == 'cache':
+            caches.setdefault(labels[0], {'hit': 0, 'miss': 0})[labels[1]] += value
+    header(lines, 'cache_hit_ratio', 'gauge', 'Share of cache lookups that were hits')
+    for cache, counts in sorted(caches.items()):
+        lookups = counts['hit'] + counts['miss']
+        lines.append(f"cache_hit_ratio{format_labels(('cache',), (cache,))} {format_value(counts['hit'] / lookups)}")
+
+#every metric of this worker in the Prometheus text format
+#the values are per process, a server with several workers is scraped once per worker or aggregated by the scraper
+def render_metrics():
+    metrics = merged_metrics()
+    counters = metrics['counters']
+    histograms = metrics['histograms']
+    lines = []
+
+    counter_lines(lines, counters, 'requests', 'http_requests_total', 'Requests handled',
+                  REQUEST_LABELS + ('method', 'status'))
+    counter_lines(lines, counters, 'errors', 'http_request_errors_total', 'Requests answered with a 5xx status', REQUEST_LABELS)
+    for key in HISTOGRAMS:
+        histogram_lines(lines, histograms, key)
+    pool_lines(lines)
+    replica_lines(lines)
+
+    header(lines, 'bcrypt_pending_jobs', 'gauge', 'Password hashes and checks waiting or running')
+    lines.append(f'bcrypt_pending_jobs {pending_password_jobs()}')
+    header(lines, 'bcrypt_rejected_total', 'counter', 'Password hashes and checks turned away because the queue was full')
+    lines.append(f'bcrypt_rejected_total {rejected_password_jobs()}')
+
+    counter_lines(lines, counters, 'cache', 'cache_lookups_total', 'Cache lookups', ('cache', 'result'))
+    cache_ratio_lines(lines, counters)
+    return '\n'.join(lines) + '\n'
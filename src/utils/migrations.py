@@ -0,0 +1,134 @@
+from datetime import datetime
+from sqlalchemy import inspect
+from init import db
+from models.schema_migration import SchemaMigration
+from utils.search import search_index_statements, rebuild_search_index
+from utils.rollups import rebuild_booking_rollups
+from models.booking_rollup import BookingRollup
+from models.table_version import TableVersion
+
+#version -> migration function, applied in order of version by 'flask db migrate'
+#a migration gets a connection in autocommit mode, every statement is committed on its own,
+#so a migration that is interrupted half way must be safe to run again
+_migrations = {}
+
+
+#function decorator that registers a migration under its version number
+def migration(version):
+    def register(function):
+        _migrations[version] = function
+        return function
+    return register
+
+#migrations that are not recorded in schema_migrations yet, as (version, function) ordered by version
+def pending_migrations(connection):
+    SchemaMigration.__table__.create(connection, checkfirst=True)
+    applied = set(connection.scalars(db.select(SchemaMigration.version)))
+    return [(version, function) for version, function in sorted(_migrations.items()) if version not in applied]
+
+def record_migration(connection, version, function):
+    stmt = db.insert(SchemaMigration).values(version=version, name=function.__name__, applied_at=datetime.now())
+    connection.execute(stmt)
+
+#run the pending migrations one by one, yields each one before it runs
+def apply_migrations(engine):
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for version, function in pending_migrations(connection):
+            yield version, function
+            function(connection)
+            record_migration(connection, version, function)
+
+#mark every migration as applied, for a database whose tables were just made by create_all from the models
+def stamp_migrations(engine):
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for version, function in pending_migrations(connection):
+            record_migration(connection, version, function)
+
+#'CREATE INDEX IF NOT EXISTS', built online on Postgres so the table stays writable while it is built
+def create_index(connection, name, table_name, columns):
+    quote = connection.dialect.identifier_preparer.quote
+    column_list = ', '.join(quote(column) for column in columns)
+
+    if connection.dialect.name == 'postgresql':
+        #a concurrent build that failed leaves an invalid index behind, which IF NOT EXISTS would keep
+        drop_invalid_index(connection, name)
+        connection.exec_driver_sql(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(name)} ON {quote(table_name)} ({column_list})')
+    else:
+        connection.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table_name)} ({column_list})')
+
+#'DROP INDEX IF EXISTS', online on Postgres
+def drop_index(connection, name):
+    quote = connection.dialect.identifier_preparer.quote
+    concurrently = 'CONCURRENTLY ' if connection.dialect.name == 'postgresql' else ''
+    connection.exec_driver_sql(f'DROP INDEX {concurrently}IF EXISTS {quote(name)}')
+
+#'ALTER TABLE ... ADD COLUMN' unless the table has the column already, definition is the column's type and constraints
+def add_column(connection, table_name, column_name, definition):
+    if any(column['name'] == column_name for column in inspect(connection).get_columns(table_name)):
+        return
+    quote = connection.dialect.identifier_preparer.quote
+    connection.exec_driver_sql(f'ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column_name)} {definition}')
+
+def drop_invalid_index(connection, name):
+    stmt = db.text('SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name')
+    if connection.scalar(stmt, {'name': name}):
+        quote = connection.dialect.identifier_preparer.quote
+        connection.exec_driver_sql(f'DROP INDEX CONCURRENTLY {quote(name)}')
+
+
+#the indexes declared in the models, for databases created before they were added
+#booking lists are filtered by status and ordered by (date, time, id) for keyset pagination,
+#availability and assignment read an employee's bookings on a date,
+#nested pets and services load their bookings by foreign key, login looks a user up by personal_email
+@migration(1)
+def add_query_indexes(connection):
+    create_index(connection, 'ix_bookings_date_time_id', 'bookings', ['date', 'time', 'id'])
+    create_index(connection, 'ix_bookings_status_date_time_id', 'bookings', ['status', 'date', 'time', 'id'])
+    create_index(connection, 'ix_bookings_employee_id_date', 'bookings', ['employee_id', 'date'])
+    create_index(connection, 'ix_bookings_service_id', 'bookings', ['service_id'])
+    create_index(connection, 'ix_pets_client_id', 'pets', ['client_id'])
+    create_index(connection, 'ix_users_personal_email', 'users', ['personal_email'])
+
+#name search of clients and pets (see utils/search.py)
+#Postgres: trigram indexes built online, SQLite: FTS5 tables filled with the names already there
+@migration(2)
+def add_search_indexes(connection):
+    for table_name in ('users', 'pets'):
+        if connection.dialect.name == 'postgresql':
+            drop_invalid_index(connection, f'ix_{table_name}_search')
+        for statement in search_index_statements(connection.dialect.name, table_name, concurrently=True):
+            connection.exec_driver_sql(statement)
+    rebuild_search_index(connection)
+
+#the booking query (GET /bookings/query/) filters by employee or service and pages in (date, time, id) order,
+#the wider indexes give the rows in that order, and still serve the lookups the old ones did by their first columns
+@migration(3)
+def widen_booking_indexes(connection):
+    create_index(connection, 'ix_bookings_employee_id_date_time_id', 'bookings', ['employee_id', 'date', 'time', 'id'])
+    create_index(connection, 'ix_bookings_service_id_date_time_id', 'bookings', ['service_id', 'date', 'time', 'id'])
+    drop_index(connection, 'ix_bookings_employee_id_date')
+    drop_index(connection, 'ix_bookings_service_id')
+
+#daily rollups of the bookings for the reports (see utils/rollups.py), filled with the bookings already there
+#bookings written by the previous release while this runs are not counted, run 'flask db rollups' once it is replaced
+@migration(4)
+def add_booking_rollups(connection):
+    BookingRollup.__table__.create(connection, checkfirst=True)
+    with connection.engine.begin() as transaction:
+        rebuild_booking_rollups(transaction)
+
+#token versions of the users (see utils/token_versions.py), every existing user starts at version 0
+@migration(5)
+def add_users_token_version(connection):
+    add_column(connection, 'users', 'token_version', 'INTEGER NOT NULL DEFAULT 0')
+
+#versions of the tables for the ETags (see utils/etags.py), with a row for every table so the first bumps only update
+@migration(6)
+def add_table_versions(connection):
+    TableVersion.__table__.create(connection, checkfirst=True)
+    #the rows of an interrupted run are there already
+    existing = set(connection.scalars(db.select(TableVersion.table_name)))
+    rows = [{'table_name': table_name, 'version': 0} for table_name in db.metadata.tables
+            if table_name not in existing and table_name != TableVersion.__tablename__]
+    if rows:
+        connection.execute(db.insert(TableVersion), rows)
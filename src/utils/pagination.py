@@ -0,0 +1,107 @@
+import base64
+import json
+from datetime import date, time
+from urllib.parse import urlencode
+from flask import request, abort
+from init import db
+from utils.loading import with_loader_plan
+from utils.streaming import stream_format, stream_rows
+from utils.serializers import dump
+from utils.read_models import statement_read_model
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+#turn the ordering values of the last row into an opaque string for the 'after' parameter
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if isinstance(value, (date, time)) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode('utf8')).decode('utf8').rstrip('=')
+
+#turn a cursor back into python values, using each ordering column's type
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw_values = json.loads(base64.urlsafe_b64decode(padded.encode('utf8')))
+
+        if not isinstance(raw_values, list) or len(raw_values) != len(columns):
+            raise ValueError
+
+        values = []
+        for column, raw in zip(columns, raw_values):
+            python_type = column.type.python_type
+            if python_type in (date, time):
+                values.append(python_type.fromisoformat(raw))
+            else:
+                values.append(python_type(raw))
+        return values
+    #any malformed cursor is the client's fault, respond with 400
+    except (ValueError, TypeError):
+        abort(400, description='Invalid cursor')
+
+#read the 'limit' query parameter, default to DEFAULT_LIMIT and never go above MAX_LIMIT
+def get_limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+#build the url of the next page from the current url, replacing 'after' with the new cursor
+def next_page_url(cursor):
+    args = request.args.to_dict()
+    args['after'] = cursor
+    return f'{request.base_url}?{urlencode(args)}'
+
+#the select of one page: the rows after the cursor values (all rows if None) in the ordering,
+#with the schema's relationships loaded eagerly
+def page_query(stmt, order_by, schema, values, limit):
+    return keyset(with_loader_plan(stmt, schema), order_by, values, limit)
+
+#order a select and keep the rows after the cursor values (all rows if None)
+def keyset(stmt, order_by, values, limit):
+    stmt = stmt.order_by(*order_by)
+    if values is not None:
+        stmt = stmt.where(db.tuple_(*order_by) > db.tuple_(*values))
+    return stmt.limit(limit)
+
+#keyset pagination shared by the list routes
+#stmt is the unordered select, order_by is a list of columns that is unique as a whole (ends with the primary key)
+#the response body stays a list, the next page is given in the 'Link' header
+#and the total number of rows in 'X-Total-Count' when ?count=true
+#nested relationships in the schema are loaded eagerly, so a page costs a fixed number of queries
+#?stream=json or ?stream=ndjson sends every row after the cursor in one streamed response instead of a page
+#read_model=True builds the page from result rows without ORM objects, see utils/read_models.py
+def paginate(stmt, order_by, schema, read_model=False):
+    cursor = request.args.get('after')
+    values = decode_cursor(cursor, order_by) if cursor else None
+
+    stream = stream_format()
+    if stream:
+        return stream_rows(stmt, order_by, schema, values, stream)
+
+    limit = get_limit()
+    model = statement_read_model(stmt, schema) if read_model else None
+
+    #fetch one extra row to know if there is a next page
+    if model is not None:
+        #the ordering columns come last in each row, for the cursor
+        rows = db.session.execute(keyset(model.select(stmt, order_by), order_by, values, limit + 1)).all()
+    else:
+        rows = db.session.scalars(page_query(stmt, order_by, schema, values, limit + 1)).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    headers = {}
+    if has_next:
+        last = rows[-1]
+        if model is not None:
+            cursor = encode_cursor(list(last[-len(order_by):]))
+        else:
+            cursor = encode_cursor([getattr(last, column.key) for column in order_by])
+        headers['Link'] = f'<{next_page_url(cursor)}>; rel="next"'
+
+    #counting is optional because it scans the whole result set
+    if request.args.get('count', '').lower() == 'true':
+        count_stmt = db.select(db.func.count()).select_from(stmt.order_by(None).subquery())
+        headers['X-Total-Count'] = str(db.session.scalar(count_stmt))
+
+    body = model.build_rows(rows) if model is not None else dump(schema, rows)
+    return body, 200, headers
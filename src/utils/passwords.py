@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import threading
+import bcrypt as bcrypt_lib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, abort
+
+#bcrypt hashing and checking run in a pool of processes, so a burst of logins cannot take every request thread's CPU
+#at most BCRYPT_MAX_PENDING jobs wait or run at once, a request that finds no place in BCRYPT_QUEUE_TIMEOUT seconds gets 503
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_pending = 0
+_rejected = 0
+_slots = threading.Condition()
+
+
+#the functions below run in the pool's processes, so they only use their arguments
+def _hash(password, rounds):
+    return bcrypt_lib.hashpw(password.encode('utf8'), bcrypt_lib.gensalt(rounds)).decode('utf8')
+
+def _check(pw_hash, password):
+    return bcrypt_lib.checkpw(password.encode('utf8'), pw_hash.encode('utf8'))
+
+#the pool of the current process, a forked web worker makes its own instead of using its parent's
+def get_pool(workers):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            #spawned processes do not inherit the web worker's threads, locks or database connections
+            #they import the main module again, so a script using the pool must guard its entry point with if __name__ == '__main__'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+#number of password jobs waiting or running in this process
+def pending_password_jobs():
+    return _pending
+
+#number of requests turned away with 503 by this process
+def rejected_password_jobs():
+    return _rejected
+
+def acquire_slot(limit, timeout):
+    global _pending, _rejected
+    with _slots:
+        if not _slots.wait_for(lambda: _pending < limit, timeout):
+            _rejected += 1
+            return False
+        _pending += 1
+        return True
+
+def release_slot():
+    global _pending
+    with _slots:
+        _pending -= 1
+        _slots.notify()
+
+#run a bcrypt function in the pool, or in the request thread when BCRYPT_WORKERS is 0
+def run_bcrypt(function, *args):
+    global _pool
+    config = current_app.config
+    if not acquire_slot(config['BCRYPT_MAX_PENDING'], config['BCRYPT_QUEUE_TIMEOUT']):
+        abort(503, description='Too many password checks in progress, try again shortly')
+    try:
+        if config['BCRYPT_WORKERS'] == 0:
+            return function(*args)
+        pool = get_pool(config['BCRYPT_WORKERS'])
+        try:
+            return pool.submit(function, *args).result()
+        except BrokenProcessPool:
+            #a pool process died, the next job starts a new pool
+            with _pool_lock:
+                if _pool is pool:
+                    _pool = None
+            raise
+    finally:
+        release_slot()
+
+#bcrypt hash of a password with the configured work factor, as a string
+def hash_password(password):
+    return run_bcrypt(_hash, password, current_app.config['BCRYPT_LOG_ROUNDS'])
+
+#hash many passwords in parallel, for the seed command
+#it runs outside of requests, so it does not wait for a place in the queue
+def hash_passwords(passwords):
+    rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+    workers = current_app.config['BCRYPT_WORKERS']
+    if workers == 0:
+        return [_hash(password, rounds) for password in passwords]
+    return list(get_pool(workers).map(_hash, passwords, [rounds] * len(passwords)))
+
+def check_password(pw_hash, password):
+    return run_bcrypt(_check, pw_hash, password)
+
+#True if a hash was made with another work factor than the configured one
+#a bcrypt hash looks like '$2b$12$...', where 12 is the work factor
+def needs_rehash(pw_hash):
+    try:
+        return int(pw_hash.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,63 @@
+import os
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from init import db
+from utils.catalog_cache import load_catalogs
+
+#application_name of the app's Postgres connections, so they can be told apart from others in pg_stat_activity
+APPLICATION_NAME = 'nice-and-dandy'
+
+
+#create_engine options of the connection pool, from the environment
+#every worker keeps at most DB_POOL_SIZE + DB_MAX_OVERFLOW connections open per database,
+#so a server opens at most workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) of them
+def pool_options():
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        #seconds a request waits for a connection before the pool raises TimeoutError
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        #seconds after which a connection is replaced, before a server or firewall times it out
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        #check a connection with a cheap round trip before handing it out, so a dropped one is replaced
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'connect_args': {'application_name': os.environ.get('DB_APPLICATION_NAME', APPLICATION_NAME)}
+    }
+
+#connections one worker may open to each database, None for a pool without a limit (SQLite)
+def worker_connection_limit(app):
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if 'pool_size' not in options:
+        return None
+    return options['pool_size'] + options['max_overflow']
+
+#called in the master process of a preloading server before it forks the workers
+#reads the cached tables, so every worker starts with them, then closes the connections that read them,
+#since a connection shared by two processes mixes up their statements
+def warm_up_master(app):
+    with app.app_context():
+        load_catalogs()
+        for engine in db.engines.values():
+            engine.dispose()
+
+#called in each worker right after the fork
+#drops any connection inherited from the master without closing it (the master owns its socket),
+#then opens the pool's connections, so the first requests do not wait for them
+def warm_up_worker(app):
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+            if not isinstance(engine.pool, QueuePool):
+                continue
+            connections = [engine.connect() for _ in range(engine.pool.size())]
+            for connection in connections:
+                connection.execute(text('SELECT 1'))
+                connection.close()
+
+#number of open connections to the database with the app's application_name, not counting the one asking, Postgres only
+def open_connections(engine):
+    application_name = pool_options()['connect_args']['application_name']
+    stmt = text('SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND application_name = :name '
+                'AND pid <> pg_backend_pid()')
+    with engine.connect() as connection:
+        return connection.scalar(stmt, {'name': application_name})
@@ -0,0 +1,161 @@
+from flask import current_app
+from marshmallow import fields
+from marshmallow.decorators import PRE_DUMP, POST_DUMP
+from sqlalchemy import inspect
+from sqlalchemy.orm import aliased, outerjoin
+from init import db
+from utils.instrumentation import serialize_timing
+from utils.loading import nested_schema, schema_key, with_loader_plan
+from utils.serializers import PLAIN_TYPES, ISO_TYPES, NotCompilable, dump
+from utils.shape_cache import ShapeCache
+
+#parent keys per query when loading a collection, as selectinload does
+COLLECTION_CHUNK_SIZE = 500
+
+
+#a read-only path that gives the same dicts as dumping ORM objects with a schema, without making the objects
+#one select has only the columns the schema dumps, with the nested many-to-one relationships outer joined,
+#and a generated function builds each response dict straight from a result row
+#collections of the top model are read with one more select per collection (and per 500 parents),
+#their own collections likewise, collections nested in a joined relationship are not supported
+class ReadModel:
+    def __init__(self, model, schema, group_by=None):
+        self.model = model
+        self.group_by = group_by
+        self.columns = []
+        self.from_clause = model
+        self.collections = []
+        self.namespace = {'PLAIN_TYPES': PLAIN_TYPES, 'ISO_TYPES': ISO_TYPES}
+
+        body = self.node(model, model, schema, True)
+        #the parent key of each row of a collection, to give the rows to their parents
+        self.group_index = self.add_column(group_by) if group_by is not None else None
+        source = f'def build(row):\n    return {body}'
+        exec(compile(source, f'<read model {model.__name__}>', 'exec'), self.namespace)
+        self.build = self.namespace['build']
+
+    #position of a column in the select, every column is labelled so none is dropped as a duplicate
+    def add_column(self, column):
+        self.columns.append(column.label(f'c{len(self.columns)}'))
+        return len(self.columns) - 1
+
+    #a name in the generated code for an object it uses, such as a field
+    def constant(self, value):
+        name = f'c{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    #expression of the value a field dumps from the column at a position, the same shortcuts as the compiled serializers
+    def value_code(self, field, attribute, index):
+        serialize = f'{self.constant(field)}._serialize(value, {attribute!r}, None)'
+        if type(field) is fields.Inferred:
+            return (f'(value if type(value := row[{index}]) in PLAIN_TYPES '
+                    f'else value.isoformat() if type(value) in ISO_TYPES else {serialize})')
+        if type(field) in (fields.String, fields.Float, fields.Integer):
+            python_type = {fields.String: 'str', fields.Float: 'float', fields.Integer: 'int'}[type(field)]
+            return f'(value if (value := row[{index}]) is None or type(value) is {python_type} else {serialize})'
+        return f'{self.constant(field)}.serialize({attribute!r}, {{{attribute!r}: row[{index}]}})'
+
+    #expression of the dict a schema dumps from the columns of entity (the model or an alias of it)
+    def node(self, entity, model, schema, top):
+        if schema._has_processors(PRE_DUMP) or schema._has_processors(POST_DUMP):
+            raise NotCompilable(type(schema).__name__)
+        mapper = inspect(model)
+        items = []
+
+        for field_name, field in schema.dump_fields.items():
+            attribute = field.attribute or field_name
+            key = repr(field.data_key or field_name)
+
+            if attribute in mapper.column_attrs:
+                items.append(f'{key}: {self.value_code(field, attribute, self.add_column(getattr(entity, attribute)))}')
+                continue
+            child_schema = nested_schema(field)
+            if attribute not in mapper.relationships or child_schema is None:
+                raise NotCompilable(f'{model.__name__}.{attribute}')
+
+            relationship = mapper.relationships[attribute]
+            child_model = relationship.mapper.class_
+            many = type(field) is fields.List or field.many or child_schema.many
+            if many != relationship.uselist:
+                raise NotCompilable(f'{model.__name__}.{attribute}')
+
+            if relationship.uselist:
+                if not top or relationship.secondary is not None or len(relationship.local_remote_pairs) != 1:
+                    raise NotCompilable(f'{model.__name__}.{attribute}')
+                local, remote = relationship.local_remote_pairs[0]
+                child = ReadModel(child_model, child_schema, group_by=getattr(child_model, remote.key))
+                self.collections.append((field.data_key or field_name, self.add_column(getattr(entity, local.key)), child))
+                #filled in by build_rows
+                items.append(f'{key}: None')
+            else:
+                alias = aliased(child_model)
+                self.from_clause = outerjoin(self.from_clause, alias, getattr(entity, attribute))
+                #a missing related row reads as NULL in its primary key
+                present = self.add_column(getattr(alias, inspect(child_model).primary_key[0].key))
+                items.append(f'{key}: None if row[{present}] is None else {self.node(alias, child_model, child_schema, False)}')
+
+        return '{' + ', '.join(items) + '}'
+
+    #the read select with the criteria of stmt, a select of the model, and extra columns at the end of each row
+    def select(self, stmt=None, extra=()):
+        read_stmt = db.select(*self.columns, *extra).select_from(self.from_clause)
+        if stmt is not None and stmt.whereclause is not None:
+            read_stmt = read_stmt.where(stmt.whereclause)
+        return read_stmt
+
+    #the response dicts of result rows, with their collections read
+    def build_rows(self, rows):
+        with serialize_timing():
+            results = [self.build(row) for row in rows]
+        for key, local_index, child in self.collections:
+            children = child.read_groups({row[local_index] for row in rows} - {None})
+            for row, result in zip(rows, results):
+                result[key] = children.get(row[local_index], [])
+        return results
+
+    #the dicts of a collection's rows, grouped by parent key
+    def read_groups(self, parent_keys):
+        groups = {}
+        parent_keys = list(parent_keys)
+        for start in range(0, len(parent_keys), COLLECTION_CHUNK_SIZE):
+            stmt = self.select().where(self.group_by.in_(parent_keys[start:start + COLLECTION_CHUNK_SIZE]))
+            rows = db.session.execute(stmt).all()
+            for row, result in zip(rows, self.build_rows(rows)):
+                groups.setdefault(row[self.group_index], []).append(result)
+        return groups
+
+def build_read_model(model, schema):
+    try:
+        return ReadModel(model, schema)
+    except NotCompilable:
+        return None
+
+#read models, (model,) + schema_key -> ReadModel, None if the schema cannot be read this way
+_read_models = ShapeCache(build_read_model)
+
+#the read model of a schema instance for a model, built the first time the schema's options are seen
+def read_model(model, schema):
+    return _read_models.get((model,) + schema_key(schema), model, schema)
+
+#the read model of stmt's model, None when the schema cannot be read without the ORM or CORE_READS is off
+def statement_read_model(stmt, schema):
+    if not current_app.config['CORE_READS']:
+        return None
+    return read_model(stmt.column_descriptions[0]['entity'], schema)
+
+#build the read models of the schemas the read-only routes dump, so no request pays for it
+def compile_read_models(*pairs):
+    for model, schema in pairs:
+        read_model(model, schema)
+
+#the response dict of the one row stmt selects, None if there is none
+def read_one(stmt, schema):
+    model = statement_read_model(stmt, schema)
+    if model is None:
+        obj = db.session.scalar(with_loader_plan(stmt, schema))
+        return None if obj is None else dump(schema, obj)
+    row = db.session.execute(model.select(stmt).limit(1)).first()
+    if row is None:
+        return None
+    return model.build_rows([row])[0]
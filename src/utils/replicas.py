@@ -0,0 +1,125 @@
+import math
+import random
+import threading
+import time
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+
+#bind keys of the replicas in SQLALCHEMY_BINDS, the primary is the default bind
+REPLICA_PREFIX = 'replica_'
+#cookie set after a write, until the time it holds the client's reads go to the primary
+STICKY_COOKIE = 'primary_until'
+#the table versions (see utils/etags.py) tell how far behind a replica is, they go up with every committed change
+VERSIONS_QUERY = text('SELECT table_name, version FROM table_versions')
+
+#bind key -> {'checked_at', 'healthy', 'lag', 'snapshots': [(time, primary versions), ...]}
+_health = {}
+_health_lock = threading.Lock()
+
+
+#SQLALCHEMY_BINDS of comma separated replica URIs, e.g. 'postgresql://replica-1/spa,postgresql://replica-2/spa'
+def replica_binds(uris):
+    return {f'{REPLICA_PREFIX}{index}': uri.strip() for index, uri in enumerate(uris.split(',')) if uri.strip()}
+
+def replica_keys(engines):
+    return [key for key in engines if key and key.startswith(REPLICA_PREFIX)]
+
+#session of db.session, reads made while handling a request go to a replica, everything else to the primary
+#a session that has written (a flush, an insert, update or delete statement or a SELECT ... FOR UPDATE)
+#reads from the primary for the rest of the request, so it sees its own writes,
+#and the client's next requests do too for REPLICA_STICKY_SECONDS (see stick_to_primary)
+#reads outside a request, such as CLI commands, go to the primary
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or isinstance(clause, UpdateBase)
+                             or getattr(clause, '_for_update_arg', None) is not None):
+            self.info['wrote'] = True
+        elif bind is None and (mapper is not None or clause is not None) and reads_from_replica(self):
+            if 'replica' not in self.info:
+                self.info['replica'] = pick_replica(self._db.engines)
+            if self.info['replica'] is not None:
+                return self._db.engines[self.info['replica']]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def reads_from_replica(session):
+    return has_request_context() and not session.info.get('wrote') and not sticky_request()
+
+#True if the client wrote less than REPLICA_STICKY_SECONDS ago
+#a cookie further in the future than that is ignored, so it cannot pin a client to the primary for good
+def sticky_request():
+    try:
+        until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    return now < until <= now + current_app.config['REPLICA_STICKY_SECONDS']
+
+#a healthy replica for a session, chosen at random to spread the reads, None if there is none
+def pick_replica(engines):
+    healthy = [key for key in replica_keys(engines) if replica_healthy(engines, key)]
+    return random.choice(healthy) if healthy else None
+
+#a replica is taken out of rotation while it is more than REPLICA_MAX_LAG seconds behind or cannot be reached
+#it is checked again every REPLICA_CHECK_INTERVAL seconds by the first request that asks
+def replica_healthy(engines, key):
+    now = time.monotonic()
+    with _health_lock:
+        state = _health.setdefault(key, {'checked_at': None, 'healthy': True, 'lag': 0, 'snapshots': []})
+        if state['checked_at'] is not None and now - state['checked_at'] < current_app.config['REPLICA_CHECK_INTERVAL']:
+            return state['healthy']
+        #the other requests keep using the last result while this one checks
+        state['checked_at'] = now
+
+    lag = replica_lag(engines, key, state, now)
+    with _health_lock:
+        state['lag'] = lag
+        state['healthy'] = lag is not None and lag <= current_app.config['REPLICA_MAX_LAG']
+        return state['healthy']
+
+def read_versions(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(VERSIONS_QUERY).all())
+
+def caught_up(replica, primary):
+    return all(replica.get(table_name, 0) >= version for table_name, version in primary.items())
+
+#seconds a replica is behind the primary, None if it cannot be reached
+#the primary's table versions are kept at every check, the replica is as recent as the latest of them it has reached,
+#so the lag is known to within REPLICA_CHECK_INTERVAL seconds and a replica that keeps up with constant writes is never behind
+def replica_lag(engines, key, state, now):
+    try:
+        primary = read_versions(engines[None])
+        replica = read_versions(engines[key])
+    except DBAPIError:
+        current_app.logger.warning('Replica %s cannot be reached, it is taken out of rotation', key)
+        return None
+
+    with _health_lock:
+        snapshots = state['snapshots']
+        snapshots.append((now, primary))
+        #older snapshots than twice the lag allowed cannot change the result
+        while now - snapshots[0][0] > 2 * current_app.config['REPLICA_MAX_LAG'] and len(snapshots) > 1:
+            snapshots.pop(0)
+        for taken_at, versions in reversed(snapshots):
+            if caught_up(replica, versions):
+                return now - taken_at
+        #behind every snapshot, by how much is not known, so it stays out until it catches up with one
+        return math.inf
+
+#seconds each replica was behind at its last check, None if it could not be reached, for /metrics
+def replica_lags():
+    with _health_lock:
+        return {key: state['lag'] for key, state in _health.items()}
+
+#after_request hook registered in create_app
+#a request that wrote sets a cookie that sends the client's reads to the primary until the replicas have its writes,
+#a replica is never more than REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL seconds behind while it is in rotation
+def stick_to_primary(response):
+    db = current_app.extensions['sqlalchemy']
+    if db.session.info.get('wrote') and replica_keys(db.engines):
+        seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(STICKY_COOKIE, str(time.time() + seconds), max_age=math.ceil(seconds), httponly=True, samesite='Lax')
+    return response
@@ -0,0 +1,71 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+from init import db
+from models.booking import VALID_STATUSES, OPENING_TIME, CLOSING_TIME
+from models.booking_rollup import BookingRollup
+from models.employee import Employee
+from models.service import Service
+from models.user import User
+
+#periods the reports group by, with their format in Python and in Postgres, SQLite's strftime takes the Python one
+PERIODS = {'day': ('%Y-%m-%d', 'YYYY-MM-DD'), 'month': ('%Y-%m', 'YYYY-MM'), 'year': ('%Y', 'YYYY')}
+COMPLETED = VALID_STATUSES[2]
+#hours an employee can be booked for each day, from opening to closing time
+WORKING_HOURS = (datetime.combine(date.min, CLOSING_TIME) - datetime.combine(date.min, OPENING_TIME)).seconds / 3600
+
+
+#the rollup date as its period, a string in the same format on every database
+def period_column(period):
+    python_format, postgresql_format = PERIODS[period]
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.func.to_char(BookingRollup.date, postgresql_format)
+    return db.func.strftime(python_format, BookingRollup.date)
+
+#days of the range in each of its periods, {period: days} in order
+def period_days(period, start, end):
+    days = Counter()
+    for offset in range((end - start).days + 1):
+        days[(start + timedelta(days=offset)).strftime(PERIODS[period][0])] += 1
+    return days
+
+#columns that name a report's groups, and the joins they need
+#bookings whose employee is missing or was deleted are reported together with employee_id null
+def group_columns(stmt, group):
+    if group == 'service':
+        return stmt, [Service.id.label('service_id'), Service.name.label('service')]
+    if group == 'employee':
+        stmt = stmt.outerjoin(Employee, Employee.id == BookingRollup.employee_id).outerjoin(User, User.id == Employee.id)
+        return stmt, [Employee.id.label('employee_id'), User.f_name.label('f_name'), User.l_name.label('l_name')]
+    return stmt, [period_column(group).label(group)]
+
+#bookings and revenue of each group of the rollups in the inclusive date range, of all bookings and of the completed ones
+#the revenue is at the services' current prices
+def revenue_query(start, end, group):
+    completed = db.case((BookingRollup.status == COMPLETED, BookingRollup.bookings), else_=0)
+    stmt = db.select(BookingRollup).join(Service, Service.id == BookingRollup.service_id)
+    stmt, columns = group_columns(stmt, group)
+    return stmt.with_only_columns(
+        *columns,
+        db.func.sum(BookingRollup.bookings).label('bookings'),
+        db.func.sum(BookingRollup.bookings * Service.price).label('revenue'),
+        db.func.sum(completed).label('completed_bookings'),
+        db.func.sum(completed * Service.price).label('completed_revenue')
+    ).where(BookingRollup.date.between(start, end)).group_by(*columns).having(db.func.sum(BookingRollup.bookings) > 0).order_by(*columns)
+
+def booked_hours():
+    return db.func.coalesce(db.func.sum(BookingRollup.bookings * Service.duration), 0).label('booked_hours')
+
+#hours of services booked with each employee in the range, every employee is listed, the ones without bookings too
+#the rollups of the range are summed first, so they are read by date from the primary key
+def employee_hours_query(start, end):
+    hours = db.select(BookingRollup.employee_id, booked_hours()).join(Service, Service.id == BookingRollup.service_id).where(
+        BookingRollup.date.between(start, end)).group_by(BookingRollup.employee_id).subquery()
+    return db.select(Employee.id.label('employee_id'), User.f_name.label('f_name'), User.l_name.label('l_name'),
+                     db.func.coalesce(hours.c.booked_hours, 0).label('booked_hours')).join(User, User.id == Employee.id).outerjoin(
+        hours, hours.c.employee_id == Employee.id).order_by(Employee.id)
+
+#hours of services booked with any employee in each period of the range that has bookings
+def period_hours_query(start, end, period):
+    column = period_column(period).label(period)
+    return db.select(column, booked_hours()).join(Service, Service.id == BookingRollup.service_id).join(
+        Employee, Employee.id == BookingRollup.employee_id).where(BookingRollup.date.between(start, end)).group_by(column)
@@ -0,0 +1,92 @@
+from collections import Counter
+from datetime import date
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from init import db
+from models.booking import Booking
+from models.booking_rollup import BookingRollup
+from utils.bulk import upsert_adding
+from utils.etags import mark_tables_changed
+from utils.validation import to_id
+
+#booking columns that pick a booking's rollup row, in the order of the row's key
+ROLLUP_COLUMNS = ('date', 'service_id', 'employee_id', 'status')
+#employee_id of the rollup rows of bookings without an employee
+NO_EMPLOYEE = 0
+
+
+#key of the rollup row a booking is counted in, from a dict or a function of the column name
+def rollup_key(value):
+    booking_date, service_id, employee_id, status = (value(name) for name in ROLLUP_COLUMNS)
+    #a route may set the date as its 'YYYY-MM-DD' string and the ids as strings, e.g. PATCH /bookings/<booking_id>/
+    #with {"service_id": "2"}, the keys are sorted so they must all be of the same types
+    if isinstance(booking_date, str):
+        booking_date = date.fromisoformat(booking_date)
+    return booking_date, to_id(service_id), to_id(employee_id) or NO_EMPLOYEE, status
+
+#rollup row of a booking as it is in the database, before the changes being flushed
+def committed_key(state):
+    def committed(name):
+        history = state.attrs[name].history
+        return (history.deleted or history.unchanged or history.added)[0]
+    return rollup_key(committed)
+
+#a column set while it is expired loads its old value first, so the flush knows which rollup row the booking leaves
+def keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+for name in ROLLUP_COLUMNS:
+    event.listen(getattr(Booking, name), 'set', keep_old_value, active_history=True)
+
+#add the changes, {rollup key: bookings to add (negative to remove)}, to the rollup rows in the session's transaction
+#one upsert per row in the order of the keys, so two transactions lock the rows in the same order
+def apply_rollup_changes(session, changes):
+    rows = [dict(zip(ROLLUP_COLUMNS, key), bookings=count) for key, count in sorted(changes.items()) if count]
+    if not rows:
+        return
+    upsert_adding(session.connection(), BookingRollup, ROLLUP_COLUMNS, ['bookings'], rows)
+    mark_tables_changed(session, [BookingRollup.__tablename__])
+
+#keep the rollups current with the bookings the session creates, changes or deletes,
+#whichever route does it (bookings, or the pets, clients, services and employees whose deletion changes their bookings)
+@event.listens_for(Session, 'after_flush')
+def update_rollups(session, flush_context):
+    changes = Counter()
+    for record in session.new:
+        if isinstance(record, Booking):
+            changes[rollup_key(lambda name: getattr(record, name))] += 1
+    for record in session.dirty:
+        if isinstance(record, Booking):
+            old, new = committed_key(inspect(record)), rollup_key(lambda name: getattr(record, name))
+            if old != new:
+                changes[old] -= 1
+                changes[new] += 1
+    for record in session.deleted:
+        if isinstance(record, Booking):
+            changes[committed_key(inspect(record))] -= 1
+    apply_rollup_changes(session, changes)
+
+#count bookings inserted without the unit of work (e.g. the multi-row insert of POST /bookings/bulk/), rows are dicts of their columns
+def add_to_rollups(session, rows):
+    apply_rollup_changes(session, Counter(rollup_key(row.get) for row in rows))
+
+#count every booking again, for a new rollup table or after bookings were written without the session
+#(e.g. 'flask db seed --bookings'), run it in a transaction
+def rebuild_booking_rollups(connection):
+    if connection.dialect.name == 'postgresql':
+        #writes to the bookings wait until the rollups are rebuilt, so none of them is missed or counted twice
+        connection.exec_driver_sql('LOCK TABLE bookings IN SHARE MODE')
+    connection.execute(db.delete(BookingRollup))
+    employee_id = db.func.coalesce(Booking.employee_id, NO_EMPLOYEE)
+    counts = db.select(Booking.date, Booking.service_id, employee_id, Booking.status, db.func.count()).group_by(
+        Booking.date, Booking.service_id, employee_id, Booking.status)
+    connection.execute(db.insert(BookingRollup).from_select(ROLLUP_COLUMNS + ('bookings',), counts))
+
+#delete bookings by id without loading them, e.g. the bookings a benchmark made, and count the rollups again,
+#in the session's transaction, which is committed, the ETags of both tables change
+def delete_bookings(session, booking_ids):
+    for start in range(0, len(booking_ids), 1000):
+        session.execute(db.delete(Booking).where(Booking.id.in_(booking_ids[start:start + 1000])))
+    rebuild_booking_rollups(session.connection())
+    mark_tables_changed(session, [Booking.__tablename__, BookingRollup.__tablename__])
+    session.commit()
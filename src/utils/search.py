@@ -0,0 +1,127 @@
+import re
+from flask import request, abort
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from init import db
+from models.user import User
+from models.pet import Pet
+from utils.loading import with_loader_plan
+from utils.pagination import decode_cursor, encode_cursor, get_limit, keyset, next_page_url
+from utils.serializers import dump
+
+#the text searched for each table, as an SQL expression of its columns ({0} is the table prefix of the columns, if any)
+#on Postgres a trigram index is built on the expression, on SQLite an FTS5 table holds its value for each row
+SEARCHED_NAMES = {
+    'users': "lower({0}f_name || ' ' || coalesce({0}l_name, ''))",
+    'pets': 'lower({0}name)'
+}
+#columns of the searched text, a change to one of them updates the row's entry in the FTS5 table
+SEARCHED_COLUMNS = {'users': ('f_name', 'l_name'), 'pets': ('name',)}
+#letters and digits a query needs at least, shorter prefixes match too much of the table to be useful
+MIN_QUERY_LENGTH = 2
+
+
+#the statements that create the search index of a table on a dialect
+#Postgres: a GIN trigram index on the searched text, which Postgres keeps current itself
+#SQLite: an FTS5 table of the searched text keyed by the row's id, kept current by update_search_index,
+#with prefix indexes so short prefixes such as 'Ra' are found without scanning the terms
+def search_index_statements(dialect_name, table_name, concurrently=False):
+    if dialect_name == 'postgresql':
+        return [
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS ix_{table_name}_search "
+            f"ON {table_name} USING gin (({SEARCHED_NAMES[table_name].format('')}) gin_trgm_ops)"
+        ]
+    if dialect_name == 'sqlite':
+        return [f"CREATE VIRTUAL TABLE IF NOT EXISTS {table_name}_search USING fts5(name, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"]
+    return []
+
+#create the search index with the table, so databases made by 'flask db create' have it
+def create_search_index(table, connection, **kwargs):
+    for statement in search_index_statements(connection.dialect.name, table.name):
+        connection.exec_driver_sql(statement)
+
+for model in (User, Pet):
+    event.listen(model.__table__, 'after_create', create_search_index)
+
+#write the searched text of every row into the FTS5 tables again, after rows were written without the session
+#(e.g. 'flask db seed --clients'), Postgres indexes need nothing
+def rebuild_search_index(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+    for table_name, name in SEARCHED_NAMES.items():
+        connection.exec_driver_sql(f'DELETE FROM {table_name}_search')
+        connection.exec_driver_sql(f"INSERT INTO {table_name}_search (rowid, name) SELECT id, {name.format('')} FROM {table_name}")
+
+#keep the FTS5 tables current with the users and pets the session creates, renames or deletes,
+#whichever route does it (clients, pets, employees or auth/register)
+@event.listens_for(Session, 'after_flush')
+def update_search_index(session, flush_context):
+    connection = None
+    for record in list(session.new) + list(session.dirty) + list(session.deleted):
+        table_name = getattr(record, '__tablename__', None)
+        if table_name not in SEARCHED_COLUMNS:
+            continue
+        state = inspect(record)
+        if record in session.dirty and not any(state.attrs[column].history.has_changes() for column in SEARCHED_COLUMNS[table_name]):
+            continue
+
+        connection = connection or session.connection()
+        if connection.dialect.name != 'sqlite':
+            return
+        connection.exec_driver_sql(f'DELETE FROM {table_name}_search WHERE rowid = ?', (record.id,))
+        if record not in session.deleted:
+            name = ' '.join(getattr(record, column) or '' for column in SEARCHED_COLUMNS[table_name]).lower()
+            connection.exec_driver_sql(f'INSERT INTO {table_name}_search (rowid, name) VALUES (?, ?)', (record.id, name))
+
+#the words of a query, 400 if it has too few letters and digits to search
+def query_words(query):
+    words = re.findall(r'\w+', (query or '').lower())
+    if sum(len(word) for word in words) < MIN_QUERY_LENGTH:
+        abort(400, description=f'The search query needs at least {MIN_QUERY_LENGTH} letters or digits')
+    return words
+
+#select of (id, rank) of the model's rows whose searched text matches the query and the criteria, and its ordering
+#a lower rank is a better match, so the ordering is ascending and ends with the id like the other keyset orderings
+#Postgres: word similarity of the query to the text, so 'Rach' finds 'Rachel Green' and a typo such as 'Rachle' still does
+#SQLite: every word of the query is a prefix of a word of the text, ranked by bm25
+def name_matches(model, query, *criteria):
+    words = query_words(query)
+    table_name = model.__tablename__
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        #the same expression as the index, so the index is used
+        name = db.literal_column(SEARCHED_NAMES[table_name].format(f'{table_name}.'))
+        text = ' '.join(words)
+        rank = (-db.func.word_similarity(text, name, type_=db.Float)).label('rank')
+        stmt = db.select(model.id, rank).where(db.literal(text).op('<%')(name), *criteria)
+        return stmt, [rank, model.id]
+
+    index = db.table(f'{table_name}_search', db.column('rowid', db.Integer), db.column('rank', db.Float), db.column('name'))
+    match = ' '.join(f'"{word}"*' for word in words)
+    stmt = db.select(index.c.rowid.label('id'), index.c.rank).where(index.c.name.op('MATCH')(match))
+    if criteria:
+        stmt = stmt.join(model, model.id == index.c.rowid).where(*criteria)
+    return stmt, [index.c.rank, index.c.rowid]
+
+#one page of a ranked search, as a list of the model's objects dumped with the schema, best match first
+#matches and order_by come from name_matches, the ids they select are the model's ids
+#pages follow each other with the 'after' cursor in the Link header, as in utils/pagination.py
+def search_page(model, matches, order_by, schema):
+    cursor = request.args.get('after')
+    values = decode_cursor(cursor, order_by) if cursor else None
+    limit = get_limit()
+
+    #fetch one extra row to know if there is a next page
+    rows = db.session.execute(keyset(matches, order_by, values, limit + 1)).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    ids = [row.id for row in rows]
+    stmt = with_loader_plan(db.select(model).where(model.id.in_(ids)), schema)
+    records = {record.id: record for record in db.session.scalars(stmt)}
+    headers = {}
+    if has_next:
+        headers['Link'] = f'<{next_page_url(encode_cursor([rows[-1].rank, rows[-1].id]))}>; rel="next"'
+    return dump(schema, [records[id] for id in ids if id in records]), 200, headers
@@ -0,0 +1,122 @@
+import datetime
+from collections.abc import Mapping
+from marshmallow import fields, missing
+from marshmallow.decorators import PRE_DUMP, POST_DUMP
+from utils.instrumentation import serialize_timing
+from utils.loading import schema_key
+from utils.shape_cache import ShapeCache
+
+#an inferred field writes values of these types as they are, and dates and times as ISO strings
+PLAIN_TYPES = frozenset([str, int, float, bool, type(None)])
+ISO_TYPES = frozenset([datetime.date, datetime.time, datetime.datetime])
+
+
+#a schema with pre_dump or post_dump hooks, in itself or a nested schema, is left to marshmallow
+class NotCompilable(Exception):
+    pass
+
+#writes the source of one function per nested schema, then runs it once to get the functions
+#each function builds the dict of one object with the fields' logic inlined,
+#so a dump makes no Field.serialize calls and no nested Schema.dump calls
+#values of a type the inlined logic does not handle go through the marshmallow field, so the output is always the same
+class SerializerCompiler:
+    def __init__(self):
+        self.namespace = {'missing': missing, 'Mapping': Mapping, 'PLAIN_TYPES': PLAIN_TYPES, 'ISO_TYPES': ISO_TYPES}
+        self.sources = []
+        self.functions = {}
+
+    #a name in the generated code for an object it uses, such as a field
+    def constant(self, value):
+        name = f'c{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    #name of the function that dumps one object with the schema, writing it first if needed
+    def function(self, schema):
+        key = schema_key(schema)
+        if key in self.functions:
+            return self.functions[key]
+        if schema._has_processors(PRE_DUMP) or schema._has_processors(POST_DUMP):
+            raise NotCompilable(type(schema).__name__)
+
+        name = f'dump_{type(schema).__name__}_{len(self.functions)}'
+        self.functions[key] = name
+        #objects are model instances or rows, or dicts such as the cached catalog rows (see utils/catalog_cache.py)
+        lines = [f'def {name}(obj):', '    data = {}', '    mapping = isinstance(obj, Mapping)']
+        for field_name, field in schema.dump_fields.items():
+            lines.extend('    ' + line for line in self.field_lines(field_name, field))
+        lines.append('    return data')
+        self.sources.append('\n'.join(lines))
+        return name
+
+    #the statements that put one field of obj into data
+    def field_lines(self, field_name, field):
+        attribute = field.attribute or field_name
+        key = repr(field.data_key or field_name)
+        serialize = f'{self.constant(field)}._serialize(value, {attribute!r}, obj)'
+        lines = [f'value = obj.get({attribute!r}, missing) if mapping else getattr(obj, {attribute!r}, missing)', 'if value is not missing:']
+
+        if type(field) is fields.Inferred:
+            lines += [
+                '    if type(value) in PLAIN_TYPES:',
+                f'        data[{key}] = value',
+                '    elif type(value) in ISO_TYPES:',
+                f'        data[{key}] = value.isoformat()',
+                '    else:',
+                f'        data[{key}] = {serialize}'
+            ]
+        elif type(field) in (fields.String, fields.Float, fields.Integer):
+            python_type = {fields.String: 'str', fields.Float: 'float', fields.Integer: 'int'}[type(field)]
+            lines.append(f'    data[{key}] = value if value is None or type(value) is {python_type} else {serialize}')
+        elif type(field) is fields.Nested:
+            function = self.function(field.schema)
+            if field.schema.many or field.many:
+                lines.append(f'    data[{key}] = None if value is None else [{function}(item) for item in value]')
+            else:
+                lines.append(f'    data[{key}] = None if value is None else {function}(value)')
+        elif type(field) is fields.List and type(field.inner) is fields.Nested and not field.inner.schema.many:
+            function = self.function(field.inner.schema)
+            lines.append(f'    data[{key}] = None if value is None else [None if item is None else {function}(item) for item in value]')
+        else:
+            #any other field is serialized by marshmallow, value may be missing there too
+            lines = [
+                f'value = {self.constant(field)}.serialize({attribute!r}, obj)',
+                'if value is not missing:',
+                f'    data[{key}] = value'
+            ]
+        return lines
+
+    def compile(self, schema):
+        name = self.function(schema)
+        exec(compile('\n\n'.join(self.sources), f'<serializer {type(schema).__name__}>', 'exec'), self.namespace)
+        return self.namespace[name]
+
+def compile_serializer(schema):
+    try:
+        return SerializerCompiler().compile(schema)
+    except NotCompilable:
+        return None
+
+#compiled dump functions, schema_key (see utils/loading.py) -> function of one object, None if the schema cannot be compiled
+_serializers = ShapeCache(compile_serializer)
+
+#the compiled dump function of a schema instance, compiled the first time the schema's options are seen
+def compiled_serializer(schema):
+    return _serializers.get(schema_key(schema), schema)
+
+#compile the serializers of the schemas the busiest routes dump, so no request pays for it
+def compile_serializers(*schemas):
+    for schema in schemas:
+        compiled_serializer(schema)
+
+#same result as schema.dump(obj, many=many), with the compiled function when there is one
+#the routes dump through here, so the time it takes is the serialize timing of the request
+def dump(schema, obj, many=None):
+    serializer = compiled_serializer(schema)
+    with serialize_timing():
+        if serializer is None:
+            return schema.dump(obj, many=many)
+        many = schema.many if many is None else many
+        if many and obj is not None:
+            return [serializer(item) for item in obj]
+        return serializer(obj)
@@ -0,0 +1,20 @@
+#values built once per schema shape and then reused: loader plans, compiled serializers and read models
+#?fields= makes a schema for every combination asked for, so only the latest shapes are kept, the oldest is dropped first
+MAX_SHAPES = 500
+
+
+class ShapeCache:
+    def __init__(self, build, size=MAX_SHAPES):
+        self.build = build
+        self.size = size
+        self.values = {}
+
+    #the value of a key, built with build(*args) the first time the key is seen, it may be None
+    #two threads may build the same value, either one is kept
+    def get(self, key, *args):
+        if key in self.values:
+            return self.values.get(key)
+        if len(self.values) >= self.size:
+            self.values.pop(next(iter(self.values), None), None)
+        value = self.values[key] = self.build(*args)
+        return value
@@ -0,0 +1,56 @@
+from flask import Response, request, abort, json, stream_with_context
+from init import db
+from utils.loading import with_loader_plan
+from utils.serializers import dump
+
+#rows fetched, dumped and written at once while streaming
+STREAM_CHUNK_SIZE = 1000
+#response format -> mimetype
+STREAM_FORMATS = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+
+#the streaming format asked for with ?stream=json or ?stream=ndjson, or an 'Accept: application/x-ndjson' header
+#None for a normal paginated response
+def stream_format():
+    stream = request.args.get('stream', '').lower()
+    if stream in STREAM_FORMATS:
+        return stream
+    if stream not in ('', 'false'):
+        abort(400, description=f"Invalid stream format '{stream}', use {' or '.join(STREAM_FORMATS)}")
+    if not stream and request.accept_mimetypes.best == STREAM_FORMATS['ndjson']:
+        return 'ndjson'
+    return None
+
+#the text of one chunk, rows are separated by commas in a JSON array and by new lines in NDJSON
+def encode_chunk(rows, stream, first):
+    if stream == 'ndjson':
+        return ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+    text = ','.join(json.dumps(row, separators=(',', ':')) for row in rows)
+    return text if first else ',' + text
+
+#every row of the select after the cursor values (all rows if None), in the ordering, written out as it is read
+#the rows are fetched STREAM_CHUNK_SIZE at a time with yield_per, a server-side cursor on Postgres,
+#and each chunk is dumped and sent before the next one is read, so the worker's memory does not grow with the table
+#the Server-Timing header only covers the work done before the first row is sent
+def stream_rows(stmt, order_by, schema, values, stream):
+    stream_stmt = with_loader_plan(stmt, schema).order_by(*order_by)
+    if values is not None:
+        stream_stmt = stream_stmt.where(db.tuple_(*order_by) > db.tuple_(*values))
+    result = db.session.execute(stream_stmt, execution_options={'yield_per': STREAM_CHUNK_SIZE})
+
+    def generate():
+        first = True
+        if stream == 'json':
+            yield '['
+        try:
+            for chunk in result.scalars().partitions():
+                yield encode_chunk(dump(schema, chunk), stream, first)
+                first = False
+        finally:
+            #a client that disconnects closes the generator, which releases the cursor
+            result.close()
+        if stream == 'json':
+            yield ']'
+
+    #the request context, and with it the session, stays open until the last chunk is sent
+    return Response(stream_with_context(generate()), mimetype=STREAM_FORMATS[stream])
@@ -0,0 +1,228 @@
+import csv
+import io
+import math
+from collections import defaultdict
+from datetime import date, time, timedelta
+from itertools import chain, islice
+from init import db
+from models.booking import Booking, VALID_STATUSES
+from models.client import Client
+from models.employee import Employee
+from models.pet import Pet
+from models.pet_type import PetType
+from models.service import Service
+from models.size import Size
+from models.user import User
+from utils.etags import bump_table_versions
+from utils.search import rebuild_search_index
+from utils.rollups import rebuild_booking_rollups
+
+#rows written and committed at once
+BATCH_SIZE = 50000
+#every generated client and employee logs in with this password, it is hashed once for all of them
+SEED_PASSWORD = 'Seed123!'
+#bookings are spread from DAYS_BEFORE days ago to DAYS_AFTER days ahead,
+#starting on the half hour from 10:00 to 19:30
+DAYS_BEFORE = 365
+DAYS_AFTER = 90
+SLOTS_PER_DAY = 20
+
+FIRST_NAMES = ['Olivia', 'Noah', 'Charlotte', 'Oliver', 'Amelia', 'Jack', 'Isla', 'William', 'Mia', 'Leo',
+               'Ava', 'Henry', 'Grace', 'Lucas', 'Chloe', 'Thomas', 'Zoe', 'James', 'Ella', 'Ethan',
+               'Ruby', 'Mason', 'Harper', 'Lachlan', 'Sophie', 'Liam', 'Evie', 'Hudson', 'Lily', 'Archie']
+LAST_NAMES = ['Smith', 'Jones', 'Williams', 'Brown', 'Wilson', 'Taylor', 'Johnson', 'White', 'Martin', 'Anderson',
+              'Thompson', 'Nguyen', 'Thomas', 'Walker', 'Harris', 'Lee', 'Ryan', 'Robinson', 'Kelly', 'King',
+              'Davis', 'Wright', 'Evans', 'Roberts', 'Green', 'Hall', 'Wood', 'Jackson', 'Clarke', 'Patel']
+PET_NAMES = ['Bella', 'Max', 'Luna', 'Charlie', 'Coco', 'Buddy', 'Daisy', 'Milo', 'Rosie', 'Teddy',
+             'Molly', 'Oscar', 'Ruby', 'Archie', 'Lola', 'Bailey', 'Willow', 'Ollie', 'Pepper', 'Toby',
+             'Maggie', 'Jasper', 'Honey', 'Ziggy', 'Nala', 'Rocky', 'Biscuit', 'Mocha', 'Pippa', 'Winston']
+BREEDS = ['Unknown', 'Labrador', 'Poodle', 'Beagle', 'Cocker Spaniel', 'Border Collie', 'Kelpie',
+          'Staffordshire Terrier', 'Short-haired', 'Long-haired', 'Ragdoll', 'Burmese', 'Mixed']
+
+
+#the first id after the ones in the table
+def next_id(connection, model):
+    return (connection.scalar(db.select(db.func.max(model.id))) or 0) + 1
+
+#split an iterable of rows into lists of BATCH_SIZE rows
+def batches(rows):
+    rows = iter(rows)
+    while batch := list(islice(rows, BATCH_SIZE)):
+        yield batch
+
+#COPY on Postgres, a multi-row executemany insert elsewhere
+def write_rows(connection, model, columns, rows):
+    table = model.__table__
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        #an empty unquoted csv field is NULL
+        sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+    else:
+        connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+#write rows from a generator, committing every BATCH_SIZE rows, returns the number of rows
+def write_batches(engine, model, columns, rows):
+    count = 0
+    for batch in batches(rows):
+        with engine.begin() as connection:
+            write_rows(connection, model, columns, batch)
+        count += len(batch)
+    return count
+
+#the ids were given explicitly, so move Postgres' id sequences past them
+def reset_sequences(engine, models):
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as connection:
+        for model in models:
+            table_name = model.__tablename__
+            connection.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), (SELECT MAX(id) FROM {table_name}))"))
+
+USER_COLUMNS = ('id', 'f_name', 'l_name', 'phone', 'personal_email', 'date_created', 'type_id', 'token_version')
+
+#clients have a personal email, employees a work email made from the same name
+#the phone number comes from the id, so it is unique
+def generate_users(rng, first_id, count, type_id):
+    today = date.today()
+    for id in range(first_id, first_id + count):
+        f_name = rng.choice(FIRST_NAMES)
+        l_name = rng.choice(LAST_NAMES)
+        personal_email = f'{f_name.lower()}.{l_name.lower()}.{id}@example.com' if type_id == 1 else None
+        date_created = today - timedelta(days=rng.randint(0, 2 * DAYS_BEFORE))
+        yield (id, f_name, l_name, f'04{id:08d}', personal_email, date_created, type_id, 0)
+
+#each client gets pets_per_client pets with different names
+def generate_pets(rng, first_id, client_ids, pets_per_client, type_ids, size_ids):
+    id = first_id
+    this_year = date.today().year
+    for client_id in client_ids:
+        if pets_per_client <= len(PET_NAMES):
+            names = rng.sample(PET_NAMES, pets_per_client)
+        else:
+            names = [f'{rng.choice(PET_NAMES)} {number}' for number in range(1, pets_per_client + 1)]
+        for name in names:
+            yield (id, name, rng.choice(BREEDS), rng.randint(this_year - 15, this_year), rng.choice(type_ids), rng.choice(size_ids), client_id)
+            id += 1
+
+#raise ValueError if count bookings cannot be generated for the pets, past half of the calendar
+#finding a free time would take too many tries
+def check_booking_count(count, pet_count):
+    if not pet_count:
+        raise ValueError('There are no pets to book')
+    if count > pet_count * (DAYS_BEFORE + DAYS_AFTER + 1) * SLOTS_PER_DAY // 2:
+        raise ValueError('Too many bookings for the number of pets')
+
+#a pet is never booked twice at the same time, and an employee never has two bookings that overlap
+#a booking whose employee is busy after a few tries is left unassigned, as bookings made without an employee are
+#existing is (pet_id, employee_id, date, time, duration) of the bookings already in the table
+def generate_bookings(rng, first_id, count, pet_ids, employee_ids, services, existing):
+    today = date.today()
+    days = DAYS_BEFORE + DAYS_AFTER + 1
+    check_booking_count(count, len(pet_ids))
+
+    #the pets' taken times as ints, and each employee's busy half hours on a day as the bits of an int,
+    #so a million bookings fit in little memory
+    taken = set()
+    busy = defaultdict(int)
+
+    def take(pet_id, day, slot):
+        key = (pet_id * days + day) * SLOTS_PER_DAY + slot
+        if key in taken:
+            return False
+        taken.add(key)
+        return True
+
+    def book(employee_id, day, slot, duration):
+        key = employee_id * days + day
+        mask = ((1 << math.ceil(duration * 2)) - 1) << slot
+        if busy[key] & mask:
+            return False
+        busy[key] |= mask
+        return True
+
+    for pet_id, employee_id, booking_date, booking_time, duration in existing:
+        day = (booking_date - today).days + DAYS_BEFORE
+        minutes = booking_time.hour * 60 + booking_time.minute - 10 * 60
+        if 0 <= day < days and minutes % 30 == 0 and 0 <= minutes // 30 < SLOTS_PER_DAY:
+            take(pet_id, day, minutes // 30)
+            if employee_id:
+                book(employee_id, day, minutes // 30, duration)
+
+    id = first_id
+    while id < first_id + count:
+        pet_id = rng.choice(pet_ids)
+        day = rng.randrange(days)
+        slot = rng.randrange(SLOTS_PER_DAY)
+        if not take(pet_id, day, slot):
+            continue
+
+        service_id, duration = rng.choice(services)
+        employee_id = None
+        for _ in range(3 if employee_ids else 0):
+            candidate = rng.choice(employee_ids)
+            if book(candidate, day, slot, duration):
+                employee_id = candidate
+                break
+
+        booking_date = today + timedelta(days=day - DAYS_BEFORE)
+        status = VALID_STATUSES[2] if booking_date < today else VALID_STATUSES[0]
+        booking_time = time(10 + slot // 2, 30 * (slot % 2))
+        date_created = booking_date - timedelta(days=rng.randint(0, 60))
+        yield (id, pet_id, employee_id, service_id, booking_date, booking_time, status, date_created)
+        id += 1
+
+#add generated clients, employees, pets and bookings to a database that has the user types, pet types, sizes and services
+#returns the number of rows written to each table
+def seed_synthetic(engine, rng, password_hash, clients, employees, pets_per_client, bookings):
+    with engine.connect() as connection:
+        first_user_id = next_id(connection, User)
+        first_pet_id = next_id(connection, Pet)
+        first_booking_id = next_id(connection, Booking)
+        type_ids = connection.scalars(db.select(PetType.id)).all()
+        size_ids = connection.scalars(db.select(Size.id)).all()
+        services = connection.execute(db.select(Service.id, Service.duration)).all()
+        #the bookings are checked before any row is written, so a bad count leaves the database as it was
+        if bookings:
+            pet_count = connection.scalar(db.select(db.func.count()).select_from(Pet))
+            check_booking_count(bookings, pet_count + clients * pets_per_client)
+
+    client_ids = range(first_user_id, first_user_id + clients)
+    employee_ids = range(first_user_id + clients, first_user_id + clients + employees)
+    counts = {}
+
+    #the clients are generated as they are written, the few employees are kept for their work emails
+    employee_users = list(generate_users(rng, employee_ids.start, employees, 2))
+    counts['users'] = write_batches(engine, User, USER_COLUMNS, chain(generate_users(rng, client_ids.start, clients, 1), employee_users))
+    counts['clients'] = write_batches(engine, Client, ('id', 'password'), ((id, password_hash) for id in client_ids))
+    employee_rows = ((row[0], f'{row[1].lower()}.{row[2].lower()}.{row[0]}@dogspa.com', password_hash, False) for row in employee_users)
+    counts['employees'] = write_batches(engine, Employee, ('id', 'email', 'password', 'is_admin'), employee_rows)
+
+    if pets_per_client and client_ids:
+        pet_rows = generate_pets(rng, first_pet_id, client_ids, pets_per_client, type_ids, size_ids)
+        counts['pets'] = write_batches(engine, Pet, ('id', 'name', 'breed', 'year', 'type_id', 'size_id', 'client_id'), pet_rows)
+
+    if bookings:
+        #the bookings go to every pet and employee, the generated ones and the ones that were there
+        with engine.connect() as connection:
+            pet_ids = connection.scalars(db.select(Pet.id)).all()
+            all_employee_ids = connection.scalars(db.select(Employee.id)).all()
+            existing = connection.execute(db.select(Booking.pet_id, Booking.employee_id, Booking.date, Booking.time, Service.duration).join(Service)).all()
+        booking_rows = generate_bookings(rng, first_booking_id, bookings, pet_ids, all_employee_ids, services, existing)
+        counts['bookings'] = write_batches(engine, Booking, ('id', 'pet_id', 'employee_id', 'service_id', 'date', 'time', 'status', 'date_created'), booking_rows)
+
+    reset_sequences(engine, [User, Pet, Booking])
+    #the rows did not go through the session either, so their names are not in the search index yet
+    with engine.begin() as connection:
+        rebuild_search_index(connection)
+    #nor in the rollups of the reports
+    if counts.get('bookings'):
+        with engine.begin() as connection:
+            rebuild_booking_rollups(connection)
+    #the rows did not go through the session, so tell the ETags that these tables changed
+    counts = {table_name: count for table_name, count in counts.items() if count}
+    bump_table_versions(engine, sorted(counts) + (['booking_rollups'] if 'bookings' in counts else []))
+    return counts
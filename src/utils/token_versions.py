@@ -0,0 +1,45 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from init import db
+from models.user import User
+from utils.instrumentation import increment
+
+#user id -> (token version, time it was read), least recently read first
+#an expired version is dropped when it is read, and the least recently read ones once there are MAX_CACHED_VERSIONS
+_versions = OrderedDict()
+_versions_lock = threading.Lock()
+MAX_CACHED_VERSIONS = 10000
+
+
+#current token version of a user, read from the database at most once every JWT_VERSION_TTL seconds
+#returns None if the user no longer exists
+def current_token_version(user_id):
+    with _versions_lock:
+        cached = _versions.get(user_id)
+        if cached and time.monotonic() - cached[1] < current_app.config['JWT_VERSION_TTL']:
+            _versions.move_to_end(user_id)
+            increment('cache', ('token_version', 'hit'))
+            return cached[0]
+        _versions.pop(user_id, None)
+    increment('cache', ('token_version', 'miss'))
+
+    #read from the primary, a version read from a lagging replica would accept revoked tokens for the whole TTL
+    stmt = db.select(User.token_version).filter_by(id = user_id)
+    version = db.session.scalar(stmt, bind_arguments={'bind': db.engine})
+    with _versions_lock:
+        _versions[user_id] = (version, time.monotonic())
+        while len(_versions) > MAX_CACHED_VERSIONS:
+            _versions.popitem(last=False)
+    return version
+
+#invalidate every token issued to the user so far
+def bump_token_version(user):
+    user.token_version = (user.token_version or 0) + 1
+    forget_token_version(user.id)
+
+#forget the cached version of a deleted user
+def forget_token_version(user_id):
+    with _versions_lock:
+        _versions.pop(user_id, None)
@@ -0,0 +1,51 @@
+from marshmallow.exceptions import ValidationError
+from init import db
+from utils.catalog_cache import catalog_model, catalog_rows
+
+
+#convert an id from the request to an integer, None if it is not a valid id
+def to_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+#check the foreign keys of one or many payloads with one 'IN' query per table
+#references maps a field to its model and error message, e.g. {'pet_id': (Pet, 'Pet does not exist')}
+#returns the loaded objects by field and id, and the errors by payload index
+def load_references(payloads, references):
+    loaded = {}
+    for field, (model, message) in references.items():
+        #gather every id of this field so the table is only queried once
+        ids = {to_id(payload[field]) for payload in payloads if field in payload}
+        ids.discard(None)
+
+        loaded[field] = {}
+        if ids and catalog_model(model.__tablename__):
+            #a cached table's rows come from the cache, as dicts (see utils/catalog_cache.py)
+            loaded[field] = {row['id']: row for row in catalog_rows(model) if row['id'] in ids}
+        elif ids:
+            stmt = db.select(model).where(model.id.in_(ids))
+            loaded[field] = {record.id: record for record in db.session.scalars(stmt)}
+
+    #any id that was not found is an error for that payload
+    errors = {}
+    for index, payload in enumerate(payloads):
+        for field, (model, message) in references.items():
+            if field in payload and to_id(payload[field]) not in loaded[field]:
+                errors.setdefault(index, {})[field] = [message]
+
+    return loaded, errors
+
+#used by a schema's validates_schema(pass_many=True) method
+#the loaded objects are kept in schema.references so the route does not select them again
+def check_references(schema, data, many, references):
+    payloads = data if many else [data]
+    schema.references, errors = load_references(payloads, references)
+
+    if errors:
+        raise ValidationError(errors if many else errors[0])
+
+#get an object that was loaded while validating, e.g. referenced(schema, 'pet_id', data), a dict for a cached table
+def referenced(schema, field, data):
+    return schema.references[field].get(to_id(data[field]))
@@ -0,0 +1,9 @@
+#Production entry point, served by gunicorn with the settings in gunicorn.conf.py:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#the app is created once in the master process and the workers are forked from it (preload_app),
+#so the schemas compiled in create_app and the cached tables read here are shared by every worker
+from main import create_app
+from utils.pooling import warm_up_master
+
+app = create_app()
+warm_up_master(app)